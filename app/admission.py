@@ -0,0 +1,248 @@
+"""
+Admission control for the chat endpoints.
+
+At most ``max_concurrent`` workflow runs execute per worker. Further requests
+wait in a FIFO queue of at most ``max_queue`` entries for up to
+``queue_timeout`` seconds. Requests arriving at a full queue, or still waiting
+when the timeout expires, are shed with ``Overloaded`` (HTTP 503 with a
+``Retry-After`` header). Everything runs on the event loop, so no locks are
+needed.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Admission wait times kept for the percentile metrics
+WAIT_SAMPLES = 1000
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed because the queue is full or the wait timed out."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """A request's place in the admission queue, or its execution slot once admitted."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._enqueued_at = time.monotonic()
+        self.admitted = False
+        self.released = False
+
+    @property
+    def position(self) -> int:
+        """1-based position in the wait queue (0 once admitted)."""
+        if self.admitted:
+            return 0
+        return self._controller._waiters.index(self) + 1
+
+    async def wait(self) -> AsyncIterator[int]:
+        """Yield the queue position whenever it changes, until the request is admitted.
+
+        Raises:
+            Overloaded: If the request is not admitted within the queue timeout
+        """
+        controller = self._controller
+        deadline = self._enqueued_at + controller.queue_timeout
+        last_position = None
+        while not self.admitted:
+            position = self.position
+            if position != last_position:
+                last_position = position
+                yield position
+                continue
+            changed = controller._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                if self.admitted:
+                    break
+                controller.timed_out += 1
+                self.release()
+                raise Overloaded(
+                    f"Request waited {controller.queue_timeout:g}s without a free slot",
+                    controller.retry_after,
+                )
+
+    async def acquire(self) -> None:
+        """Wait until admitted without reporting positions."""
+        async for _ in self.wait():
+            pass
+
+    def release(self) -> None:
+        """Free the execution slot, or leave the queue if not admitted yet. Idempotent."""
+        if self.released:
+            return
+        self.released = True
+        self._controller._release(self)
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded, timed FIFO wait queue."""
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 32, queue_timeout: float = 30.0, retry_after: int = 10):
+        """Initialize the admission controller.
+
+        Args:
+            max_concurrent: Workflow runs executing at the same time
+            max_queue: Requests allowed to wait for a slot (0 sheds whenever all slots are busy)
+            queue_timeout: Seconds a request may wait before it is shed
+            retry_after: Seconds sent in the Retry-After header of shed requests
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._active = 0
+        self._waiters: Deque[Admission] = deque()
+        # Set and replaced whenever the queue moves, waking the waiters to re-check their position
+        self._changed = asyncio.Event()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def enter(self) -> Admission:
+        """Take a free slot, or a place in the queue.
+
+        Returns:
+            An Admission that is either admitted or must be waited on with ``wait()``/``acquire()``;
+            the caller must ``release()`` it when done
+
+        Raises:
+            Overloaded: If all slots are busy and the queue is full
+        """
+        admission = Admission(self)
+        if self._active < self.max_concurrent and not self._waiters:
+            self._admit(admission)
+        elif len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(
+                f"Server busy: {self._active} requests running, {len(self._waiters)} queued",
+                self.retry_after,
+            )
+        else:
+            self._waiters.append(admission)
+        return admission
+
+    def _admit(self, admission: Admission) -> None:
+        admission.admitted = True
+        self._active += 1
+        self.admitted += 1
+        self._waits.append(time.monotonic() - admission._enqueued_at)
+
+    def _release(self, admission: Admission) -> None:
+        if admission.admitted:
+            self._active -= 1
+        else:
+            self._waiters.remove(admission)
+        while self._waiters and self._active < self.max_concurrent:
+            self._admit(self._waiters.popleft())
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring."""
+        waits = sorted(self._waits)
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms_avg": 1000 * sum(waits) / len(waits) if waits else 0.0,
+            "wait_ms_p95": 1000 * waits[min(int(len(waits) * 0.95), len(waits) - 1)] if waits else 0.0,
+            "wait_ms_max": 1000 * waits[-1] if waits else 0.0,
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying admission control to ``POST`` requests on the given paths.
+
+    The slot is held until the response body has been sent, so streamed
+    responses count as running for their whole duration.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths: tuple = ("/api/chat",)):
+        self.app = app
+        self.controller = controller
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            admission = self.controller.enter()
+        except Overloaded as e:
+            await _send_overloaded(send, e)
+            return
+        try:
+            try:
+                await admission.acquire()
+            except Overloaded as e:
+                await _send_overloaded(send, e)
+                return
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
+
+
+async def _send_overloaded(send, error: Overloaded) -> None:
+    body = json.dumps({"detail": str(error)}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(error.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """Return the worker's admission controller.
+
+    Configured by the CHAT_MAX_CONCURRENCY, CHAT_QUEUE_SIZE, CHAT_QUEUE_TIMEOUT
+    (seconds) and CHAT_RETRY_AFTER (seconds) environment variables.
+
+    Returns:
+        The shared AdmissionController, or None if CHAT_MAX_CONCURRENCY is 0
+    """
+    global _controller
+
+    max_concurrent = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+    if max_concurrent <= 0:
+        return None
+
+    if _controller is None:
+        _controller = AdmissionController(
+            max_concurrent=max_concurrent,
+            max_queue=int(os.getenv("CHAT_QUEUE_SIZE", "32")),
+            queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT", "30")),
+            retry_after=int(os.getenv("CHAT_RETRY_AFTER", "10")),
+        )
+        logger.info(
+            f"Admission control enabled: {max_concurrent} concurrent runs, "
+            f"queue of {_controller.max_queue}, timeout {_controller.queue_timeout:g}s"
+        )
+    return _controller
@@ -0,0 +1,200 @@
+"""
+Semantic cache of knowledge-base answers.
+
+Answers of ``query_with_citations`` are stored with the embedding of the
+question that produced them. A later question whose embedding is close enough
+(cosine similarity above a threshold) gets the stored answer and citations
+without retrieval or an LLM synthesis call. Every entry belongs to an index
+version, so the cache empties itself when `generate` updates the index, and
+answers still being produced from an older index are not stored.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.citations import CitedAnswer
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """Fixed-capacity LRU cache of answers looked up by question embedding."""
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 24 * 3600, max_entries: int = 1000):
+        """Initialize the answer cache.
+
+        Args:
+            threshold: Minimum cosine similarity between questions to reuse an answer
+            ttl: Seconds an answer stays valid
+            max_entries: Maximum number of cached answers
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # One row per slot; normalized so a dot product is the cosine similarity
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._answers: List[Optional[CitedAnswer]] = [None] * max_entries
+        self._created: List[float] = [0.0] * max_entries
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._version: Optional[Any] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _check_version(self, version: Any) -> None:
+        """Drop every answer if they were produced by another index version."""
+        if version != self._version:
+            if self._lru:
+                self.invalidations += len(self._lru)
+                logger.info(f"Index changed, dropped {len(self._lru)} cached answers")
+            self._valid[:] = False
+            self._answers = [None] * self.max_entries
+            self._lru.clear()
+            self._version = version
+
+    def _drop(self, slot: int) -> None:
+        self._valid[slot] = False
+        self._answers[slot] = None
+        self._lru.pop(slot, None)
+
+    def get(self, embedding: List[float], version: Any) -> Optional[CitedAnswer]:
+        """Return the answer cached for the most similar question, if similar enough.
+
+        Args:
+            embedding: Embedding of the question
+            version: Version of the index the answer must come from
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            if not self._lru or self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            scores = self._vectors @ query
+            scores[~self._valid] = -np.inf
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                self.misses += 1
+                return None
+            if time.time() - self._created[slot] > self.ttl:
+                self._drop(slot)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return self._answers[slot]
+
+    def put(self, embedding: List[float], version: Any, answer: CitedAnswer) -> None:
+        """Cache the answer to a question, evicting the least recently used one if full.
+
+        Answers from another index version than the one last looked up are
+        dropped: they were produced by an index that has since been replaced.
+        """
+        if self.max_entries <= 0:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._version is None:
+                self._version = version
+            elif version != self._version:
+                self.stale_puts += 1
+                return
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._lru.clear()
+
+            if len(self._lru) < self.max_entries:
+                slot = int(np.argmin(self._valid))
+            else:
+                slot = next(iter(self._lru))
+                self._drop(slot)
+                self.evictions += 1
+
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._answers[slot] = answer
+            self._created[slot] = time.time()
+            self._lru[slot] = None
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._valid[:] = False
+            self._answers = [None] * self.max_entries
+            self._lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Return the process-wide answer cache.
+
+    Configured by the ANSWER_CACHE (on/off), ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL (seconds) and ANSWER_CACHE_SIZE environment variables.
+
+    Returns:
+        The shared SemanticAnswerCache, or None if caching is disabled
+    """
+    global _answer_cache
+
+    if os.getenv("ANSWER_CACHE", "true").lower() not in ("1", "true", "yes"):
+        return None
+    max_entries = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    if max_entries <= 0:
+        return None
+
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(
+                threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+                ttl=float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600))),
+                max_entries=max_entries,
+            )
+            logger.info(
+                f"Answer cache enabled: {max_entries} entries, "
+                f"similarity >= {_answer_cache.threshold}, ttl {_answer_cache.ttl:.0f}s"
+            )
+        return _answer_cache
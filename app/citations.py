@@ -0,0 +1,76 @@
+"""
+Citation data of knowledge-base answers.
+
+``query_with_citations`` returns a ``CitedAnswer``. The function tool puts it in
+``ToolOutput.raw_output`` while the LLM only sees ``str(answer)``, the answer
+text. As soon as retrieval completes, before the answer is synthesized, the
+tool also writes a ``CitationsEvent`` to the workflow stream; the streaming
+layer sends citations from that event (or, failing that, from the
+``ToolCallResult``), so they are never serialized into the answer and parsed
+back out.
+
+Citations carry only a short snippet of each chunk; clients fetch the full
+text on demand from ``/api/citations/{node_id}`` (see ``citation_content``).
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore
+from llama_index.core.workflow import Event
+
+UNKNOWN_FILENAME = "未知文档"
+
+# Characters of chunk text sent with each citation; the UI previews 150.
+SNIPPET_CHARS = 150
+
+# "Source N:" header CitationQueryEngine puts in front of each citation chunk
+_SOURCE_HEADER = re.compile(r"^Source \d+:\s*")
+
+
+@dataclass
+class CitedAnswer:
+    """Answer text with the citations of its source nodes, keyed by node id."""
+
+    text: str
+    citations: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Read by llama_index.server's SourceNodesFromToolCall for the /api/chat sources annotation
+    source_nodes: List[NodeWithScore] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class CitationsEvent(Event):
+    """Citations of the nodes a query retrieved, streamed before its answer is synthesized."""
+
+    citations: Dict[str, Dict[str, Any]]
+
+
+def _filename(metadata: Optional[Dict[str, Any]]) -> str:
+    metadata = metadata or {}
+    return metadata.get("file_name", metadata.get("filename", metadata.get("source", UNKNOWN_FILENAME)))
+
+
+def citations_from_nodes(source_nodes: List[NodeWithScore]) -> Dict[str, Dict[str, Any]]:
+    """Citation entries (rank, filename, similarity score, snippet) of the source nodes, in rank order."""
+    citations = {}
+    for i, node in enumerate(source_nodes):
+        text = _SOURCE_HEADER.sub("", node.get_content(), count=1)
+        citations[node.node_id] = {
+            "node_id": node.node_id,
+            "rank": i + 1,
+            "filename": _filename(node.metadata),
+            "similarity_score": float(node.score) if node.score is not None else 0.0,
+            "snippet": text[:SNIPPET_CHARS],
+        }
+    return citations
+
+
+def citation_content(node: BaseNode) -> Dict[str, Any]:
+    """Full text of a cited chunk, as served by the citation content endpoint."""
+    return {
+        "node_id": node.node_id,
+        "filename": _filename(node.metadata),
+        "content": node.get_content(metadata_mode=MetadataMode.NONE),
+    }
@@ -0,0 +1,251 @@
+"""
+Persistent, content-addressed cache of embeddings.
+
+Vectors are stored as packed float32 arrays in a SQLite database next to
+``docstore.db``, keyed by a hash of model name, dimensions and text. The
+``CachedEmbedding`` wrapper serves ``Settings.embed_model`` lookups from the
+cache and only sends misses to the wrapped model, both during ingestion and
+for repeated user questions.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from array import array
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from app.sqlite_pool import SQLITE_MAX_VARIABLES, get_connection_pool, run_in_io_thread
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join("storage", "embedding_cache.db")
+
+# last_used is only refreshed on a hit when older than this, to keep reads write-free.
+LAST_USED_RESOLUTION = 3600
+
+# After eviction the cache is trimmed to this fraction of its byte limit.
+EVICTION_TARGET = 0.9
+
+
+class EmbeddingCache:
+    """SQLite table of packed embedding vectors with size-based LRU eviction."""
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH, max_bytes: int = 1024 * 1024 * 1024):
+        """Initialize the embedding cache.
+
+        Args:
+            db_path: Path to SQLite database file
+            max_bytes: Maximum total size of stored vectors before old entries are evicted
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._pool = get_connection_pool(db_path)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._init_db()
+        self._bytes = self._pool.connection().execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def _init_db(self):
+        """Initialize database tables."""
+        with self._pool.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dimensions INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+
+    @staticmethod
+    def make_key(model: str, dimensions: Optional[int], text: str) -> str:
+        """Content address of an embedding: model, requested dimensions and text."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{dimensions or 0}:{digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, Embedding]:
+        """Return the cached vectors for those keys that are present."""
+        found: Dict[str, Embedding] = {}
+        stale: List[str] = []
+        now = time.time()
+        conn = self._pool.connection()
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), SQLITE_MAX_VARIABLES):
+            chunk = unique_keys[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            for key, vector, last_used in conn.execute(
+                f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", chunk
+            ):
+                found[key] = array("f", vector).tolist()
+                if now - last_used > LAST_USED_RESOLUTION:
+                    stale.append(key)
+
+        if stale:
+            with self._pool.transaction() as conn:
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in stale]
+                )
+        with self._lock:
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, model: str, dimensions: Optional[int], entries: Dict[str, Embedding]) -> None:
+        """Store vectors by key, evicting least recently used entries if over the size limit."""
+        if not entries:
+            return
+        now = time.time()
+        rows = [
+            (key, model, dimensions or 0, array("f", vector).tobytes(), now)
+            for key, vector in entries.items()
+        ]
+        with self._pool.transaction() as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        with self._lock:
+            self._bytes += sum(len(row[3]) for row in rows)
+            over_limit = self._bytes > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used vectors until the cache is below its target size."""
+        conn = self._pool.connection()
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        target = int(self.max_bytes * EVICTION_TARGET)
+        if total <= target or count == 0:
+            with self._lock:
+                self._bytes = total
+            return
+
+        to_delete = int((total - target) / (total / count)) + 1
+        with self._pool.transaction() as conn:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (to_delete,),
+            )
+        remaining = conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        with self._lock:
+            self._bytes = remaining
+            self.evictions += to_delete
+        logger.info(f"Evicted {to_delete} embeddings from {self.db_path}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that serves repeated texts from an EmbeddingCache.
+
+    Query and text embeddings share cache entries, which holds for OpenAI's
+    text-embedding-3 models where both use the same model.
+    """
+
+    embed_model: BaseEmbedding
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, **kwargs: Any):
+        super().__init__(
+            embed_model=embed_model,
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=embed_model.callback_manager,
+            **kwargs,
+        )
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return embedding cache counters for monitoring."""
+        return self._cache.stats()
+
+    @property
+    def _dimensions(self) -> Optional[int]:
+        return getattr(self.embed_model, "dimensions", None)
+
+    def _keys(self, texts: List[str]) -> List[str]:
+        return [EmbeddingCache.make_key(self.model_name, self._dimensions, text) for text in texts]
+
+    def _lookup(self, texts: List[str]):
+        keys = self._keys(texts)
+        found = self._cache.get_many(keys)
+        missing = [(key, text) for key, text in zip(keys, texts) if key not in found]
+        # Embed each distinct missing text once
+        missing = list(dict(missing).items())
+        return keys, found, missing
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            vectors = self.embed_model._get_text_embeddings([text for _, text in missing])
+            new_entries = {key: vector for (key, _), vector in zip(missing, vectors)}
+            self._cache.put_many(self.model_name, self._dimensions, new_entries)
+            found.update(new_entries)
+        return [found[key] for key in keys]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, found, missing = await run_in_io_thread(self._lookup, texts)
+        if missing:
+            vectors = await self.embed_model._aget_text_embeddings([text for _, text in missing])
+            new_entries = {key: vector for (key, _), vector in zip(missing, vectors)}
+            await run_in_io_thread(self._cache.put_many, self.model_name, self._dimensions, new_entries)
+            found.update(new_entries)
+        return [found[key] for key in keys]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = self._keys([query])[0]
+        found = self._cache.get_many([key])
+        if key not in found:
+            found[key] = self.embed_model._get_query_embedding(query)
+            self._cache.put_many(self.model_name, self._dimensions, {key: found[key]})
+        return found[key]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = self._keys([query])[0]
+        found = await run_in_io_thread(self._cache.get_many, [key])
+        if key not in found:
+            found[key] = await self.embed_model._aget_query_embedding(query)
+            await run_in_io_thread(self._cache.put_many, self.model_name, self._dimensions, {key: found[key]})
+        return found[key]
@@ -0,0 +1,67 @@
+"""
+CJK-aware term preparation for the SQLite FTS5 index of the document store.
+
+FTS5's ``unicode61`` tokenizer treats a run of Chinese characters as one
+token, so "发票" would never match inside "电子发票丢失". Runs of CJK
+characters are therefore rewritten as overlapping character bigrams before
+indexing and querying ("电子发票" -> "电子 子发 发票"); other text is left
+for ``unicode61`` to split and case-fold. A CJK phrase query is then a
+sequence of adjacent bigrams, which matches exactly where the original
+substring occurs.
+
+A single CJK character is matched as a term prefix ("税" -> ``"税"*``), which
+finds it at the start of any bigram. The last character of each run starts
+no bigram, so indexed text also lists those characters once at its end.
+"""
+import re
+from typing import List, Optional
+
+# Han (incl. extension A and compatibility), kana and hangul.
+_CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]+")
+
+# FTS5 table definition; ``terms`` holds the output of ``index_terms``.
+FTS_TABLE_SQL = "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(terms, tokenize='unicode61')"
+
+# Bumped whenever ``index_terms`` changes, so stores rebuild their index
+TERMS_VERSION = "2"
+
+
+def _bigrams(run: str) -> str:
+    if len(run) == 1:
+        return run
+    return " ".join(run[i:i + 2] for i in range(len(run) - 1))
+
+
+def to_terms(text: str) -> str:
+    """Rewrite text for matching: CJK runs become space-separated bigrams."""
+    return _CJK_RUN.sub(lambda match: f" {_bigrams(match.group(0))} ", text)
+
+
+def index_terms(text: str) -> str:
+    """Rewrite text for indexing: ``to_terms`` followed by the last character of each multi-character CJK run."""
+    run_ends = dict.fromkeys(run[-1] for run in _CJK_RUN.findall(text) if len(run) > 1)
+    terms = to_terms(text)
+    return f"{terms} {' '.join(run_ends)}" if run_ends else terms
+
+
+def _quote(term: str) -> str:
+    quoted = '"' + term.replace('"', '""') + '"'
+    # A lone CJK character is matched at the start of bigrams
+    return quoted + "*" if len(term) == 1 and _CJK_RUN.match(term) else quoted
+
+
+def query_terms(query: str) -> List[str]:
+    """Split a query into the terms that can match the index."""
+    return [term for term in to_terms(query).split() if any(ch.isalnum() for ch in term)]
+
+
+def match_any(query: str) -> Optional[str]:
+    """FTS5 MATCH expression matching rows that contain any query term, or None if there is none."""
+    terms = query_terms(query)
+    return " OR ".join(_quote(term) for term in terms) if terms else None
+
+
+def match_phrase(query: str) -> Optional[str]:
+    """FTS5 MATCH expression matching rows that contain the query verbatim, or None if there are no terms."""
+    terms = query_terms(query)
+    return _quote(" ".join(terms)) if terms else None
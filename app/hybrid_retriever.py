@@ -0,0 +1,161 @@
+"""
+Hybrid retrieval over the vector store and the docstore's FTS5 index.
+
+Results of both retrievers are combined with reciprocal-rank fusion (RRF).
+Short keyword-style queries that occur verbatim in the corpus and are
+selective enough to rank on their own (form numbers, terms like 红冲, but not
+words found in a large share of the nodes) are answered from the full-text
+index alone, which skips the query embedding call and the vector search.
+
+``NodeWithScore.score`` keeps the vector similarity, since citations show it
+as the similarity score; nodes found by full-text search only get their BM25
+score mapped into [0, 1) instead. The RRF or BM25 score the results are ranked
+by is put in a copy of the node's metadata as ``retrieval_score``.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core.indices import VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from app import fts
+from app.sqlite_pool import run_in_io_thread
+from app.sqlite_stores import SQLiteDocumentStore
+
+logger = logging.getLogger(__name__)
+
+# Standard RRF damping constant from Cormack et al.
+RRF_K = 60
+
+# Node metadata key holding the fused (RRF) or full-text (BM25) ranking score
+RETRIEVAL_SCORE_KEY = "retrieval_score"
+
+# Minimum BM25 score of the best verbatim match for the lexical fast path. Terms
+# occurring in a third or more of the nodes score far below it.
+LEXICAL_FAST_PATH_MIN_SCORE = 0.5
+
+
+def bm25_similarity(score: float) -> float:
+    """Map a BM25 score (higher is better, unbounded) into [0, 1) for display next to vector similarities."""
+    score = max(score, 0.0)
+    return score / (score + 1.0)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists into one ranking scored by ``sum(1 / (k + rank))``."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _with_key(excluded_keys: List[str]) -> List[str]:
+    """Copy of a node's excluded metadata keys that also hides the retrieval score."""
+    return excluded_keys if RETRIEVAL_SCORE_KEY in excluded_keys else [*excluded_keys, RETRIEVAL_SCORE_KEY]
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever fusing vector search and SQLite full-text search."""
+
+    def __init__(
+        self,
+        index: VectorStoreIndex,
+        docstore: SQLiteDocumentStore,
+        similarity_top_k: int = 3,
+        candidate_k: Optional[int] = None,
+        lexical_fast_path_terms: int = 4,
+        lexical_fast_path_min_score: float = LEXICAL_FAST_PATH_MIN_SCORE,
+    ):
+        """Initialize the hybrid retriever.
+
+        Args:
+            index: Vector index used for semantic search
+            docstore: Document store holding the full-text index and the nodes
+            similarity_top_k: Number of nodes returned
+            candidate_k: Results taken from each retriever before fusion (defaults to 4 * similarity_top_k)
+            lexical_fast_path_terms: Queries with at most this many terms that occur verbatim
+                in some node skip vector search (0 disables the fast path)
+            lexical_fast_path_min_score: BM25 score the best verbatim match needs for the
+                fast path; weaker matches (common terms) go through hybrid search
+        """
+        super().__init__()
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+        self._candidate_k = candidate_k or 4 * similarity_top_k
+        self._lexical_fast_path_terms = lexical_fast_path_terms
+        self._lexical_fast_path_min_score = lexical_fast_path_min_score
+        self._vector_retriever = index.as_retriever(similarity_top_k=self._candidate_k)
+
+    def _lexical_fast_path(self, query: str) -> List[Tuple[str, float]]:
+        """Return strong verbatim full-text matches of a short query, or [] if vector search is needed."""
+        if len(fts.query_terms(query)) > self._lexical_fast_path_terms:
+            return []
+        results = self._docstore.search_text(query, top_k=self._similarity_top_k, phrase=True)
+        if not results or results[0][1] < self._lexical_fast_path_min_score:
+            return []
+        return results
+
+    def _load(
+        self,
+        scored_ids: List[Tuple[str, float]],
+        known: Dict[str, NodeWithScore],
+        lexical: Dict[str, float],
+    ) -> List[NodeWithScore]:
+        """Build NodeWithScore results, loading nodes not returned by the vector store from the docstore.
+
+        Results keep the vector similarity of ``known`` nodes as their score, and
+        the mapped BM25 score from ``lexical`` for the others. The ranking score is
+        stored in copies of the nodes, so nodes shared with the vector store or
+        the docstore cache are never modified.
+        """
+        missing = [node_id for node_id, _ in scored_ids if node_id not in known]
+        loaded = {node.node_id: node for node in self._docstore.get_nodes(missing, raise_error=False)}
+        results = []
+        for node_id, retrieval_score in scored_ids:
+            node = known[node_id].node if node_id in known else loaded.get(node_id)
+            if node is None:
+                continue
+            node = node.model_copy()
+            node.metadata = {**node.metadata, RETRIEVAL_SCORE_KEY: retrieval_score}
+            node.excluded_llm_metadata_keys = _with_key(node.excluded_llm_metadata_keys)
+            node.excluded_embed_metadata_keys = _with_key(node.excluded_embed_metadata_keys)
+            if node_id in known:
+                score = known[node_id].score
+            else:
+                score = bm25_similarity(lexical[node_id]) if node_id in lexical else None
+            results.append(NodeWithScore(node=node, score=score))
+        return results
+
+    def _fuse(
+        self, vector_results: List[NodeWithScore], lexical_results: List[Tuple[str, float]]
+    ) -> List[NodeWithScore]:
+        fused = reciprocal_rank_fusion([
+            [result.node.node_id for result in vector_results],
+            [node_id for node_id, _ in lexical_results],
+        ])
+        known = {result.node.node_id: result for result in vector_results}
+        return self._load(fused[:self._similarity_top_k], known, dict(lexical_results))
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        fast = self._lexical_fast_path(query_bundle.query_str)
+        if fast:
+            logger.debug(f"Lexical fast path for {query_bundle.query_str!r}: {len(fast)} nodes")
+            return self._load(fast, {}, dict(fast))
+
+        lexical_results = self._docstore.search_text(query_bundle.query_str, top_k=self._candidate_k)
+        vector_results = self._vector_retriever.retrieve(query_bundle)
+        return self._fuse(vector_results, lexical_results)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        fast = await run_in_io_thread(self._lexical_fast_path, query_bundle.query_str)
+        if fast:
+            return await run_in_io_thread(self._load, fast, {}, dict(fast))
+
+        lexical_results, vector_results = await asyncio.gather(
+            self._docstore.asearch_text(query_bundle.query_str, top_k=self._candidate_k),
+            self._vector_retriever.aretrieve(query_bundle),
+        )
+        return await run_in_io_thread(self._fuse, vector_results, lexical_results)
@@ -1,17 +1,49 @@
+import asyncio
 import logging
 import os
+import threading
 from typing import Optional
 
+from llama_index.core.data_structs import IndexDict
 from llama_index.core.indices import VectorStoreIndex
 from llama_index.server.api.models import ChatRequest
-from app.storage_config import load_storage_context
+from app.sqlite_pool import run_in_io_thread
+from app.storage_config import close_storage_context, load_storage_context
 
 logger = logging.getLogger("uvicorn")
 
 STORAGE_DIR = "storage"
 
+# Touched by `generate` after every index update; workers reload when its mtime changes.
+INDEX_VERSION_FILE = "index_version"
 
-def get_index(chat_request: Optional[ChatRequest] = None):
+_index: Optional[VectorStoreIndex] = None
+_index_version: Optional[int] = None
+_index_lock = threading.Lock()
+
+
+def _storage_version() -> int:
+    """Return the current version of the on-disk index (0 if it was never marked)."""
+    try:
+        return os.stat(os.path.join(STORAGE_DIR, INDEX_VERSION_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def mark_index_updated(storage_dir: str = STORAGE_DIR) -> None:
+    """Record that the index in ``storage_dir`` changed so running workers reload it."""
+    path = os.path.join(storage_dir, INDEX_VERSION_FILE)
+    with open(path, "a"):
+        pass
+    os.utime(path)
+
+
+def get_index_version() -> Optional[int]:
+    """Return the version of the index currently loaded in this process."""
+    return _index_version
+
+
+def _load_index() -> Optional[VectorStoreIndex]:
     # check if storage already exists
     if not os.path.exists(STORAGE_DIR):
         return None
@@ -25,14 +57,76 @@ def get_index(chat_request: Optional[ChatRequest] = None):
         return None
 
     try:
-        # Load VectorStoreIndex from vector store directly
-        # This is the correct approach for VectorStoreIndex with custom storage
-        index = VectorStoreIndex.from_vector_store(
-            storage_context.vector_store,
-            storage_context=storage_context
-        )
+        # Build the index over the loaded stores. from_vector_store would drop the
+        # storage context and fall back to an empty in-memory docstore, leaving the
+        # SQLite stores (full-text search, citation lookups) unused and unreleased.
+        if not storage_context.vector_store.stores_text:
+            raise ValueError("Cannot load an index from a vector store that does not store text")
+        index_struct = storage_context.index_store.get_index_struct()
+        if not isinstance(index_struct, IndexDict):
+            index_struct = IndexDict()
+        index = VectorStoreIndex(index_struct=index_struct, storage_context=storage_context)
         logger.info(f"Successfully loaded index from {STORAGE_DIR}")
         return index
     except Exception as e:
         logger.error(f"Failed to load index from storage: {e}")
+        close_storage_context(storage_context)
         return None
+
+
+def get_index(chat_request: Optional[ChatRequest] = None):
+    """
+    Return the index shared by all requests of this worker process.
+
+    The index and its storage context are loaded once and reused. When
+    `generate` marks the storage as updated, the next call loads a fresh
+    index and swaps it in; requests already holding the old one finish with it.
+    The old stores release their pool references once the new ones hold theirs,
+    so the shared SQLite pools stay open for those requests.
+
+    Loading blocks on disk I/O; async handlers should use ``aget_index``.
+    """
+    global _index, _index_version
+
+    version = _storage_version()
+    if _index is not None and version == _index_version:
+        return _index
+
+    with _index_lock:
+        if _index is None or version != _index_version:
+            index = _load_index()
+            if index is not None:
+                previous = _index
+                _index, _index_version = index, version
+                if previous is not None:
+                    logger.info(f"Index in {STORAGE_DIR} changed, reloaded it")
+                    close_storage_context(previous.storage_context)
+            elif _index is not None:
+                # Don't retry on every request; the next `generate` run marks a new version
+                logger.warning("Reloading the index failed, keeping the previously loaded one")
+                _index_version = version
+        return _index
+
+
+async def aget_index(chat_request: Optional[ChatRequest] = None):
+    """Async version of get_index: (re)loads the index on the I/O executor, off the event loop."""
+    if _index is not None and _storage_version() == _index_version:
+        return _index
+    return await run_in_io_thread(get_index, chat_request)
+
+
+async def watch_index(interval: float) -> None:
+    """Reload the index in the background whenever `generate` marks it as updated.
+
+    Keeps reloads off the request path for callers that can only use the
+    synchronous get_index (e.g. the workflow factory behind /api/chat).
+
+    Args:
+        interval: Seconds between checks of the index version file
+    """
+    while True:
+        try:
+            await aget_index()
+        except Exception as e:
+            logger.error(f"Background index reload failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,162 @@
+"""
+Document loading and node parsing for `generate`, optionally across processes.
+
+Worker functions live at module level so they can be pickled by a process
+pool; a single pool reads and splits each file in one task. Node ids are derived from the source document id and the split index,
+so the same corpus yields the same node ids whatever the number of workers.
+"""
+import os
+import uuid
+import logging
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.readers import SimpleDirectoryReader
+from llama_index.core.schema import BaseNode, Document
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def node_id_func(i: int, document: BaseNode) -> str:
+    """Deterministic node id for the i-th split of a document."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document.node_id}:{i}"))
+
+
+def list_data_files(data_dir: str) -> List[str]:
+    """Return the files SimpleDirectoryReader would load from a directory, in a stable order."""
+    reader = SimpleDirectoryReader(data_dir, recursive=True, filename_as_id=True)
+    return sorted(str(path) for path in reader.input_files)
+
+
+def load_file(file_path: str) -> List[Document]:
+    """Load one file (a PDF yields one document per page) with file-based document ids."""
+    reader = SimpleDirectoryReader(input_files=[file_path], filename_as_id=True)
+    return reader.load_data()
+
+
+def split_documents(documents: List[Document]) -> List[BaseNode]:
+    """Split documents into nodes with deterministic ids."""
+    parser = SentenceSplitter(id_func=node_id_func)
+    return parser.get_nodes_from_documents(documents)
+
+
+# (doc_id, doc_hash, nodes) of a loaded document; nodes is None if its hash is unchanged
+LoadedDocument = Tuple[str, Optional[str], Optional[List[BaseNode]]]
+
+# Recorded hashes of already indexed documents, set in each worker by _set_known_hashes
+_known_hashes: Dict[str, Optional[str]] = {}
+
+
+def _set_known_hashes(known_hashes: Dict[str, Optional[str]]) -> None:
+    global _known_hashes
+    _known_hashes = known_hashes
+
+
+def load_and_split(file_path: str) -> List[LoadedDocument]:
+    """Load one file and split those of its documents whose hash is not already known."""
+    loaded: List[LoadedDocument] = []
+    for document in load_file(file_path):
+        if _known_hashes.get(document.doc_id) == document.hash:
+            loaded.append((document.doc_id, document.hash, None))
+        else:
+            loaded.append((document.doc_id, document.hash, split_documents([document])))
+    return loaded
+
+
+def _bounded_map(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    max_in_flight: int,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: tuple = (),
+) -> Iterator[R]:
+    """Lazily map ``fn`` over ``items`` in order, in a process pool when ``workers`` > 1.
+
+    At most ``max_in_flight`` tasks are submitted ahead of the consumer, so a slow
+    consumer (e.g. embedding) applies backpressure to reading and splitting.
+    ``initializer(*initargs)`` runs once per worker process, or once in this
+    process when mapping inline.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(fn, items)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending: Deque[Future] = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_documents(
+    file_paths: Iterable[str],
+    workers: int = 1,
+    max_in_flight: Optional[int] = None,
+    known_hashes: Optional[Dict[str, Optional[str]]] = None,
+) -> Iterator[LoadedDocument]:
+    """Load and split files, yielding ``(doc_id, doc_hash, nodes)`` per document in file order.
+
+    Each file is read and split in the same task, so documents never travel
+    between processes; only their nodes come back. Documents whose hash matches
+    ``known_hashes`` are not split and come back with ``nodes`` None.
+
+    Args:
+        file_paths: Files to load
+        workers: Number of worker processes
+        max_in_flight: Files loaded and split ahead of the consumer (defaults to 2 * workers)
+        known_hashes: Recorded hash of each already indexed document id
+    """
+    max_in_flight = max_in_flight or 2 * workers
+    for documents in _bounded_map(
+        load_and_split,
+        file_paths,
+        workers,
+        max_in_flight,
+        initializer=_set_known_hashes,
+        initargs=(known_hashes or {},),
+    ):
+        yield from documents
+
+
+def iter_node_batches(
+    documents: Iterable[LoadedDocument],
+    batch_size: int = 256,
+) -> Iterator[Tuple[List[BaseNode], List[LoadedDocument]]]:
+    """Regroup the nodes of split documents into batches of ``batch_size``.
+
+    Args:
+        documents: ``(doc_id, doc_hash, nodes)`` of split documents, e.g. from ``iter_documents``
+        batch_size: Nodes per yielded batch
+
+    Yields:
+        ``(nodes, completed)`` where ``completed`` lists the documents whose last
+        node is in this batch, i.e. documents that are fully written once the
+        batch has been stored
+    """
+    batch: List[BaseNode] = []
+    completed: List[LoadedDocument] = []
+    for document in documents:
+        for node in document[2] or []:
+            batch.append(node)
+            if len(batch) >= batch_size:
+                yield batch, completed
+                batch, completed = [], []
+        completed.append(document)
+    if batch or completed:
+        yield batch, completed
+
+
+def default_workers() -> int:
+    """Default worker count: the INGEST_WORKERS environment variable, else 1."""
+    return int(os.getenv("INGEST_WORKERS", "1"))
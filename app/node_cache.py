@@ -0,0 +1,168 @@
+"""
+In-process LRU cache of deserialized nodes for the SQLite document store.
+
+Entries remember the ``doc_hash`` and ``updated_at`` of the row they were
+loaded from. The store checks those against the database before serving a
+cached node, so writes from other processes invalidate it as well.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from llama_index.core.schema import BaseNode
+
+logger = logging.getLogger(__name__)
+
+Version = Tuple[Optional[str], Optional[str]]
+
+
+class NodeCache:
+    """LRU cache bounded by both entry count and approximate byte size."""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        """Initialize the node cache.
+
+        Args:
+            max_entries: Maximum number of cached nodes
+            max_bytes: Maximum total size of cached nodes, measured by their stored row size
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[BaseNode, Version, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def versions(self, doc_ids: Iterable[str]) -> Dict[str, Version]:
+        """Return the cached (doc_hash, updated_at) of those ids that are cached."""
+        with self._lock:
+            return {
+                doc_id: self._entries[doc_id][1]
+                for doc_id in doc_ids
+                if doc_id in self._entries
+            }
+
+    def get(self, doc_id: str, version: Optional[Version]) -> Optional[BaseNode]:
+        """Return a copy of the cached node if its version still matches the database.
+
+        Args:
+            doc_id: Node id
+            version: Current (doc_hash, updated_at) of the row, or None if the row is gone
+
+        Returns:
+            The cached node, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            node, cached_version, _ = entry
+            if cached_version != version:
+                self._drop(doc_id)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(doc_id)
+            self.hits += 1
+        # Callers may mutate returned nodes (metadata, relationships), so hand out a deep copy
+        return node.model_copy(deep=True)
+
+    def put(self, doc_id: str, node: BaseNode, version: Version, size: int) -> None:
+        """Cache a freshly loaded node, evicting least recently used entries as needed."""
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if doc_id in self._entries:
+                self._drop(doc_id)
+            self._entries[doc_id] = (node.model_copy(deep=True), version, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted_id = next(iter(self._entries))
+                self._drop(evicted_id)
+                self.evictions += 1
+
+    def invalidate(self, doc_ids: Iterable[str]) -> None:
+        """Drop the given ids from the cache."""
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id in self._entries:
+                    self._drop(doc_id)
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop every cached node."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, doc_id: str) -> None:
+        _, _, size = self._entries.pop(doc_id)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_caches: Dict[str, NodeCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_node_cache(
+    db_path: str,
+    max_entries: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> Optional[NodeCache]:
+    """Return the process-wide node cache for a document store database.
+
+    Sizes default to the DOCSTORE_CACHE_ENTRIES and DOCSTORE_CACHE_MB environment
+    variables. A size of 0 disables caching and returns None.
+
+    Args:
+        db_path: Path to the document store database
+        max_entries: Maximum number of cached nodes
+        max_bytes: Maximum total size of cached nodes in bytes
+
+    Returns:
+        A shared NodeCache, or None if caching is disabled
+    """
+    if max_entries is None:
+        max_entries = int(os.getenv("DOCSTORE_CACHE_ENTRIES", "10000"))
+    if max_bytes is None:
+        max_bytes = int(float(os.getenv("DOCSTORE_CACHE_MB", "64")) * 1024 * 1024)
+    if max_entries <= 0 or max_bytes <= 0:
+        return None
+
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = NodeCache(max_entries=max_entries, max_bytes=max_bytes)
+            _caches[key] = cache
+            logger.info(f"Node cache enabled for {db_path}: {max_entries} entries, {max_bytes // (1024 * 1024)} MB")
+        return cache
+
+
+def node_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the counters of every node cache in the process, keyed by database path."""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {db_path: cache.stats() for db_path, cache in caches.items()}
@@ -0,0 +1,75 @@
+"""
+Encoding of serialized nodes stored in the SQLite document store.
+
+Every row in ``documents`` records the format it was written with, so a
+database can switch formats without rewriting old rows, and rows are always
+decoded with the codec they were encoded with.
+"""
+import json
+import zlib
+from typing import Any, Dict, Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional
+    msgpack = None
+
+# Format ids stored in documents.format. Never renumber existing entries.
+FORMAT_JSON = 0
+FORMAT_JSON_ZLIB = 1
+FORMAT_MSGPACK_ZLIB = 2
+
+FORMAT_IDS = {
+    "json": FORMAT_JSON,
+    "json+zlib": FORMAT_JSON_ZLIB,
+    "msgpack+zlib": FORMAT_MSGPACK_ZLIB,
+}
+FORMAT_NAMES = {format_id: name for name, format_id in FORMAT_IDS.items()}
+
+ZLIB_LEVEL = 6
+
+
+def format_id(name: str) -> int:
+    """Return the numeric id of a storage format name.
+
+    Args:
+        name: One of ``FORMAT_IDS``
+
+    Returns:
+        The format id stored alongside each row
+    """
+    if name not in FORMAT_IDS:
+        raise ValueError(
+            f"Unknown storage format {name!r}, expected one of {', '.join(FORMAT_IDS)}"
+        )
+    if FORMAT_IDS[name] == FORMAT_MSGPACK_ZLIB and msgpack is None:
+        raise ImportError("Storage format 'msgpack+zlib' requires the msgpack package")
+    return FORMAT_IDS[name]
+
+
+def encode(data: Dict[str, Any], fmt: int) -> Union[str, bytes]:
+    """Encode a node dict for storage."""
+    if fmt == FORMAT_JSON:
+        return json.dumps(data, ensure_ascii=False)
+    if fmt == FORMAT_JSON_ZLIB:
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return zlib.compress(raw, ZLIB_LEVEL)
+    if fmt == FORMAT_MSGPACK_ZLIB:
+        return zlib.compress(msgpack.packb(data, use_bin_type=True), ZLIB_LEVEL)
+    raise ValueError(f"Unknown storage format id {fmt}")
+
+
+def decode(blob: Union[str, bytes], fmt: int) -> Dict[str, Any]:
+    """Decode a stored node back into a dict."""
+    if fmt == FORMAT_JSON:
+        return json.loads(blob)
+    # Compressed formats are always stored as BLOBs
+    if isinstance(blob, str):
+        raise ValueError(f"Storage format id {fmt} expects binary data, got text")
+    if fmt == FORMAT_JSON_ZLIB:
+        return json.loads(zlib.decompress(blob))
+    if fmt == FORMAT_MSGPACK_ZLIB:
+        if msgpack is None:
+            raise ImportError("Reading 'msgpack+zlib' rows requires the msgpack package")
+        return msgpack.unpackb(zlib.decompress(blob), raw=False)
+    raise ValueError(f"Unknown storage format id {fmt}")
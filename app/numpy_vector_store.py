@@ -0,0 +1,638 @@
+"""
+In-process vector store backed by a memory-mapped NumPy matrix.
+
+Layout of the store directory:
+
+- ``vectors.npy``: (rows, dim) search matrix of L2-normalized embeddings in
+  float32, float16 or int8, opened read-only with ``mmap_mode="r"`` so every
+  uvicorn worker shares the same pages through the OS page cache
+- ``scales.npy``: per-row scale of int8 vectors (``vector ~= row * scale``)
+- ``vectors_full.npy``: float32 copy kept for quantized and prefix stores; only
+  the rows of the best candidates are read, to rescore them at full precision
+- ``ids.jsonl``: one ``[node_id, ref_doc_id, metadata]`` line per matrix row;
+  the node metadata is kept in memory to evaluate ``MetadataFilters``
+- ``deleted.npy``: boolean tombstones; deleted rows are skipped by queries
+  until ``compact()`` rewrites the files without them
+
+New rows are appended in place: the ``.npy`` files are written with a
+fixed-size header whose shape is updated after the rows, ``vectors.npy``
+last, so readers never see a half-written matrix. Queries are batched dot
+products (cosine similarity) with a top-k selection; quantized stores take
+``rescore_factor * k`` candidates and rerank them with the float32 copy.
+
+With ``prefix_dims`` set, the search matrix holds only the first dimensions of
+each embedding, renormalized (Matryoshka truncation, supported by OpenAI's
+text-embedding-3 models), and the full vectors are used for the rerank.
+Node text is not duplicated here; result
+nodes are loaded from the SQLite document store. A single writer (``generate``)
+is assumed; server workers pick up changes when the index is reloaded.
+"""
+import os
+import json
+import struct
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from app.sqlite_pool import run_in_io_thread
+from app.sqlite_stores import SQLiteDocumentStore
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+FULL_FILE = "vectors_full.npy"
+IDS_FILE = "ids.jsonl"
+DELETED_FILE = "deleted.npy"
+
+# Row-aligned matrix files, in the order their headers are committed (vectors.npy last).
+_ROW_FILES = (FULL_FILE, SCALES_FILE, VECTORS_FILE)
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+# Quantized stores rescore this many candidates per requested result.
+DEFAULT_RESCORE_FACTOR = 4
+
+# Prefix (Matryoshka) stores need a wider candidate set than quantized full-width ones.
+DEFAULT_PREFIX_RESCORE_FACTOR = 10
+
+# Size of the .npy header of the row files; fixed so the shape can be rewritten in place.
+_NPY_HEADER_SIZE = 128
+
+# Rows scored per matrix product. Quantized blocks are upcast to float32 first;
+# blocks this small stay in cache during the upcast (1024 x 3072 floats = 12 MB).
+QUERY_BLOCK_ROWS = 1024
+
+# compact() runs on persist() once this fraction of rows is deleted.
+COMPACT_THRESHOLD = 0.25
+
+
+def _npy_header(dtype: np.dtype, shape: Tuple[int, ...]) -> bytes:
+    """Version 1.0 .npy header padded to ``_NPY_HEADER_SIZE`` bytes."""
+    header = repr({
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": shape,
+    })
+    magic = b"\x93NUMPY\x01\x00"
+    header_len = _NPY_HEADER_SIZE - len(magic) - 2
+    return magic + struct.pack("<H", header_len) + (header.ljust(header_len - 1) + "\n").encode("latin1")
+
+
+def _read_npy_header(path: str) -> Tuple[Tuple[int, ...], np.dtype]:
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version != (1, 0):
+            raise ValueError(f"Unsupported .npy version {version} in {path}")
+        shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+    return shape, dtype
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so a dot product is the cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: returns ``(rows, scales)`` with ``vectors ~= rows * scales[:, None]``."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    rows = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return rows, scales.astype(np.float32)
+
+
+_OPERATORS: Dict[FilterOperator, Callable[[Any, Any], bool]] = {
+    FilterOperator.EQ: lambda value, expected: value == expected,
+    FilterOperator.NE: lambda value, expected: value != expected,
+    FilterOperator.GT: lambda value, expected: value > expected,
+    FilterOperator.GTE: lambda value, expected: value >= expected,
+    FilterOperator.LT: lambda value, expected: value < expected,
+    FilterOperator.LTE: lambda value, expected: value <= expected,
+    FilterOperator.IN: lambda value, expected: value in expected,
+    FilterOperator.NIN: lambda value, expected: value not in expected,
+    FilterOperator.CONTAINS: lambda value, expected: expected in value,
+    FilterOperator.ANY: lambda value, expected: any(item in value for item in expected),
+    FilterOperator.ALL: lambda value, expected: all(item in value for item in expected),
+    FilterOperator.TEXT_MATCH: lambda value, expected: expected in value,
+    FilterOperator.TEXT_MATCH_INSENSITIVE: lambda value, expected: expected.lower() in value.lower(),
+}
+
+
+def _metadata_filter_fn(filters: MetadataFilters) -> Callable[[Dict[str, Any]], bool]:
+    """Compile (possibly nested) ``MetadataFilters`` into a predicate over a node's metadata.
+
+    Semantics follow llama_index's SimpleVectorStore: a missing key or a value of
+    the wrong type never matches, except for ``IS_EMPTY``.
+    """
+    def compile_filter(metadata_filter: MetadataFilter) -> Callable[[Dict[str, Any]], bool]:
+        key, expected = metadata_filter.key, metadata_filter.value
+        if metadata_filter.operator == FilterOperator.IS_EMPTY:
+            return lambda metadata: metadata.get(key) in (None, "", [])
+        if metadata_filter.operator not in _OPERATORS:
+            raise ValueError(f"Unsupported metadata filter operator {metadata_filter.operator!r}")
+        operator = _OPERATORS[metadata_filter.operator]
+
+        def matches(metadata: Dict[str, Any]) -> bool:
+            value = metadata.get(key)
+            if value is None:
+                return False
+            try:
+                return bool(operator(value, expected))
+            except TypeError:
+                return False
+        return matches
+
+    predicates = [
+        _metadata_filter_fn(item) if isinstance(item, MetadataFilters) else compile_filter(item)
+        for item in filters.filters
+    ]
+    if filters.condition == FilterCondition.OR:
+        return lambda metadata: any(predicate(metadata) for predicate in predicates)
+    if filters.condition == FilterCondition.NOT:
+        return lambda metadata: not any(predicate(metadata) for predicate in predicates)
+    return lambda metadata: all(predicate(metadata) for predicate in predicates)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def _ids_line(node_id: str, ref_doc_id: str, metadata: Dict[str, Any]) -> str:
+    return json.dumps([node_id, ref_doc_id, metadata], ensure_ascii=False, default=str) + "\n"
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """Exact-search vector store over a memory-mapped ``.npy`` matrix."""
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    persist_dir: str
+    dtype: str = "float32"
+    rescore_factor: int = DEFAULT_RESCORE_FACTOR
+    prefix_dims: int = 0
+
+    _docstore: SQLiteDocumentStore = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _maps: Dict[str, Optional[np.ndarray]] = PrivateAttr()
+    _ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[str] = PrivateAttr()
+    _metadata: List[Dict[str, Any]] = PrivateAttr()
+    _row_by_id: Dict[str, int] = PrivateAttr()
+    _rows_by_ref_doc: Dict[str, List[int]] = PrivateAttr()
+    _deleted: np.ndarray = PrivateAttr()
+    # ids.jsonl has lines past the committed rows (an interrupted or in-progress append)
+    _uncommitted_ids: bool = PrivateAttr(default=False)
+
+    def __init__(
+        self,
+        persist_dir: str,
+        docstore: SQLiteDocumentStore,
+        dtype: Optional[str] = None,
+        rescore_factor: Optional[int] = None,
+        prefix_dims: Optional[int] = None,
+        **kwargs: Any,
+    ):
+        """Open or create a vector store.
+
+        Args:
+            persist_dir: Directory holding the store files
+            docstore: Document store the result nodes are loaded from
+            dtype: Search precision for a new store, "float32", "float16" or "int8" (defaults
+                to the NUMPY_VECTOR_DTYPE environment variable, else float32). An existing
+                store keeps the precision it was created with.
+            rescore_factor: Candidates per result rescored at full precision in quantized or
+                prefix stores (defaults to NUMPY_VECTOR_RESCORE, else 4, or 10 with prefix_dims;
+                0 disables rescoring)
+            prefix_dims: Search a new store on the first ``prefix_dims`` dimensions only
+                (defaults to NUMPY_VECTOR_PREFIX_DIMS, else 0 for full vectors). An existing
+                store keeps the layout it was created with.
+        """
+        dtype = dtype or os.getenv("NUMPY_VECTOR_DTYPE", "float32")
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {SUPPORTED_DTYPES}")
+        if prefix_dims is None:
+            prefix_dims = int(os.getenv("NUMPY_VECTOR_PREFIX_DIMS", "0"))
+        super().__init__(
+            persist_dir=persist_dir,
+            dtype=dtype,
+            rescore_factor=rescore_factor or 0,
+            prefix_dims=prefix_dims,
+            **kwargs,
+        )
+        os.makedirs(persist_dir, exist_ok=True)
+        self._docstore = docstore
+        self._lock = threading.Lock()
+        self._load()
+        if rescore_factor is None:
+            # Resolved after loading, which may have found a prefix layout on disk
+            default_factor = DEFAULT_PREFIX_RESCORE_FACTOR if self.prefix_dims else DEFAULT_RESCORE_FACTOR
+            self.rescore_factor = int(os.getenv("NUMPY_VECTOR_RESCORE", str(default_factor)))
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_dir, name)
+
+    def _load(self) -> None:
+        """Read ids and tombstones; the matrices are mapped lazily on first query."""
+        self._maps = {}
+        self._ids, self._ref_doc_ids, self._metadata = [], [], []
+        if os.path.exists(self._path(IDS_FILE)):
+            with open(self._path(IDS_FILE), encoding="utf-8") as f:
+                for line in f:
+                    # Stores written before metadata filtering have no metadata column
+                    node_id, ref_doc_id, *metadata = json.loads(line)
+                    self._ids.append(node_id)
+                    self._ref_doc_ids.append(ref_doc_id)
+                    self._metadata.append(metadata[0] if metadata else {})
+
+        rows = 0
+        if os.path.exists(self._path(VECTORS_FILE)):
+            shape, dtype = _read_npy_header(self._path(VECTORS_FILE))
+            rows = shape[0]
+            self.dtype = dtype.name
+            self.prefix_dims = 0
+            if os.path.exists(self._path(FULL_FILE)):
+                full_shape, _ = _read_npy_header(self._path(FULL_FILE))
+                if shape[1] < full_shape[1]:
+                    self.prefix_dims = shape[1]
+        # An interrupted append, or one still running in another process, may leave
+        # ids without a committed matrix row. They are ignored here and only cut
+        # from the file by this store's next append, never by a reader.
+        self._uncommitted_ids = len(self._ids) > rows
+        if self._uncommitted_ids:
+            del self._ids[rows:], self._ref_doc_ids[rows:], self._metadata[rows:]
+
+        deleted = np.zeros(len(self._ids), dtype=bool)
+        if os.path.exists(self._path(DELETED_FILE)):
+            stored = np.load(self._path(DELETED_FILE))
+            deleted[:min(len(stored), len(deleted))] = stored[:len(deleted)]
+        self._deleted = deleted
+        self._row_by_id = {node_id: row for row, node_id in enumerate(self._ids) if not deleted[row]}
+        self._rows_by_ref_doc = {}
+        for row in self._row_by_id.values():
+            self._rows_by_ref_doc.setdefault(self._ref_doc_ids[row], []).append(row)
+        layout = f"{self.dtype}, {self.prefix_dims}-dim prefix" if self.prefix_dims else self.dtype
+        logger.info(f"Loaded numpy vector store {self.persist_dir}: {len(self._row_by_id)} vectors ({layout})")
+
+    def _write_ids(self, path: str, rows) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(_ids_line(self._ids[row], self._ref_doc_ids[row], self._metadata[row]))
+
+    def _map(self, name: str) -> Optional[np.ndarray]:
+        """Return the read-only memory map of a row file, or None if the store has no such file."""
+        if name not in self._maps:
+            path = self._path(name)
+            if not self._ids or not os.path.exists(path):
+                self._maps[name] = None
+            else:
+                self._maps[name] = np.load(path, mmap_mode="r")[:len(self._ids)]
+        return self._maps[name]
+
+    def _matrix(self) -> np.ndarray:
+        """Return the search matrix."""
+        vectors = self._map(VECTORS_FILE)
+        return vectors if vectors is not None else np.empty((0, 0), dtype=self.dtype)
+
+    def _search_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """Vectors as stored in the search matrix: the renormalized prefix in prefix stores."""
+        if 0 < self.prefix_dims < vectors.shape[1]:
+            return normalize_rows(vectors[:, :self.prefix_dims])
+        return vectors
+
+    def _encode(self, vectors: np.ndarray) -> Dict[str, np.ndarray]:
+        """Rows to append to each row file for normalized float32 vectors."""
+        search = self._search_vectors(vectors)
+        encoded = {FULL_FILE: vectors} if search is not vectors or self.dtype != "float32" else {}
+        if self.dtype == "float32":
+            encoded[VECTORS_FILE] = search
+        elif self.dtype == "float16":
+            encoded[VECTORS_FILE] = search.astype(np.float16)
+        else:
+            encoded[VECTORS_FILE], encoded[SCALES_FILE] = quantize_int8(search)
+        return encoded
+
+    def _dimensions(self) -> int:
+        """Dimension of the stored embeddings (not of the prefix)."""
+        full = self._map(FULL_FILE)
+        return (full if full is not None else self._matrix()).shape[1]
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Bytes of the search structures (mapped on every query) and of the rescoring copy (read sparsely)."""
+        def size(name: str) -> int:
+            array = self._map(name)
+            return int(array.nbytes) if array is not None else 0
+        return {
+            "dtype": self.dtype,
+            "prefix_dims": self.prefix_dims,
+            "vectors": self.vector_count(),
+            "search_bytes": size(VECTORS_FILE) + size(SCALES_FILE),
+            "rescore_bytes": size(FULL_FILE),
+        }
+
+    def _save_deleted(self) -> None:
+        tmp_path = self._path(DELETED_FILE + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, self._deleted)
+        os.replace(tmp_path, self._path(DELETED_FILE))
+
+    def vector_count(self) -> int:
+        """Number of live (not deleted) vectors."""
+        return len(self._row_by_id)
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Append the embeddings of ``nodes``, replacing vectors of ids already stored."""
+        if not nodes:
+            return []
+        self.add_vectors(
+            [node.node_id for node in nodes],
+            [node.ref_doc_id or "" for node in nodes],
+            np.asarray([node.get_embedding() for node in nodes], dtype=np.float32),
+            [node.metadata for node in nodes],
+        )
+        return [node.node_id for node in nodes]
+
+    def add_vectors(
+        self,
+        node_ids: List[str],
+        ref_doc_ids: List[str],
+        vectors: np.ndarray,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Append a (len(node_ids), dim) matrix of embeddings, replacing vectors of ids already stored.
+
+        Args:
+            node_ids: Node id of each row
+            ref_doc_ids: Source document id of each row
+            vectors: Embeddings, one row per node
+            metadata: Node metadata of each row, matched by ``MetadataFilters``
+        """
+        metadata = metadata or [{} for _ in node_ids]
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        encoded = self._encode(vectors)
+
+        with self._lock:
+            rows = len(self._ids)
+            if rows and vectors.shape[1] != self._dimensions():
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match the store ({self._dimensions()})"
+                )
+            if rows == 0:
+                for name, array in encoded.items():
+                    with open(self._path(name), "wb") as f:
+                        f.write(_npy_header(array.dtype, (0,) + array.shape[1:]))
+                open(self._path(IDS_FILE), "w").close()
+            elif self._uncommitted_ids:
+                tmp_ids = self._path(IDS_FILE + ".tmp")
+                self._write_ids(tmp_ids, range(rows))
+                os.replace(tmp_ids, self._path(IDS_FILE))
+            self._uncommitted_ids = False
+
+            # Rows first, then ids, then the headers that make them visible
+            for name, array in encoded.items():
+                with open(self._path(name), "r+b") as f:
+                    f.seek(_NPY_HEADER_SIZE + rows * array[0].nbytes)
+                    f.write(array.tobytes())
+                    f.truncate()
+            with open(self._path(IDS_FILE), "a", encoding="utf-8") as f:
+                for node_id, ref_doc_id, node_metadata in zip(node_ids, ref_doc_ids, metadata):
+                    f.write(_ids_line(node_id, ref_doc_id, node_metadata))
+            for name in _ROW_FILES:
+                if name in encoded:
+                    with open(self._path(name), "r+b") as f:
+                        f.write(_npy_header(encoded[name].dtype, (rows + len(node_ids),) + encoded[name].shape[1:]))
+
+            replaced = [self._row_by_id[node_id] for node_id in node_ids if node_id in self._row_by_id]
+            self._deleted = np.concatenate([self._deleted, np.zeros(len(node_ids), dtype=bool)])
+            self._deleted[replaced] = True
+            self._unindex_ref_docs(replaced)
+            for offset, (node_id, ref_doc_id, node_metadata) in enumerate(zip(node_ids, ref_doc_ids, metadata)):
+                self._ids.append(node_id)
+                self._ref_doc_ids.append(ref_doc_id)
+                self._metadata.append(node_metadata)
+                self._row_by_id[node_id] = rows + offset
+                self._rows_by_ref_doc.setdefault(ref_doc_id, []).append(rows + offset)
+            if replaced:
+                self._save_deleted()
+            self._maps = {}
+
+    def _unindex_ref_docs(self, rows: List[int]) -> None:
+        """Drop deleted rows from the ref_doc_id -> rows index."""
+        for row in rows:
+            ref_rows = self._rows_by_ref_doc.get(self._ref_doc_ids[row])
+            if ref_rows is not None and row in ref_rows:
+                ref_rows.remove(row)
+                if not ref_rows:
+                    del self._rows_by_ref_doc[self._ref_doc_ids[row]]
+
+    def _tombstone(self, rows: List[int]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            self._deleted[rows] = True
+            for row in rows:
+                self._row_by_id.pop(self._ids[row], None)
+            self._unindex_ref_docs(rows)
+            self._save_deleted()
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete the vectors of all nodes of a source document."""
+        self._tombstone(list(self._rows_by_ref_doc.get(ref_doc_id, [])))
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        """Delete vectors by node id and/or metadata filters (both must match when both are given)."""
+        mask = self._candidate_mask(VectorStoreQuery(node_ids=node_ids, filters=filters))
+        if mask is None:
+            return
+        self._tombstone([int(row) for row in np.flatnonzero(mask & ~self._deleted)])
+
+    def clear(self) -> None:
+        """Delete every vector."""
+        with self._lock:
+            for name in _ROW_FILES + (IDS_FILE, DELETED_FILE):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._load()
+
+    def compact(self) -> int:
+        """Rewrite the store files without deleted rows.
+
+        Files are replaced atomically, so readers that mapped the old files keep
+        working until they reload.
+
+        Returns:
+            Number of rows removed
+        """
+        with self._lock:
+            removed = int(self._deleted.sum())
+            if not removed:
+                return 0
+            keep = np.flatnonzero(~self._deleted)
+
+            replaced = []
+            for name in _ROW_FILES:
+                array = self._map(name)
+                if array is None:
+                    continue
+                tmp_path = self._path(name + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(_npy_header(array.dtype, (len(keep),) + array.shape[1:]))
+                    for start in range(0, len(keep), QUERY_BLOCK_ROWS):
+                        f.write(np.ascontiguousarray(array[keep[start:start + QUERY_BLOCK_ROWS]]).tobytes())
+                replaced.append(name)
+            tmp_ids = self._path(IDS_FILE + ".tmp")
+            self._write_ids(tmp_ids, keep)
+
+            self._maps = {}
+            os.replace(tmp_ids, self._path(IDS_FILE))
+            for name in replaced:
+                os.replace(self._path(name + ".tmp"), self._path(name))
+            if os.path.exists(self._path(DELETED_FILE)):
+                os.remove(self._path(DELETED_FILE))
+            self._load()
+        logger.info(f"Compacted numpy vector store {self.persist_dir}: removed {removed} deleted rows")
+        return removed
+
+    def persist(self, persist_path: str = "", fs: Optional[Any] = None) -> None:
+        """Compact the store if enough rows are deleted; everything else is already on disk."""
+        if len(self._ids) and self._deleted.sum() / len(self._ids) >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def _candidate_mask(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        """Boolean mask of rows allowed by the query's node/doc id restrictions and metadata filters.
+
+        Node and doc ids select rows by index lookups; metadata filters are
+        evaluated on the metadata of every live row.
+
+        Returns:
+            The mask, or None if the query does not restrict the rows
+        """
+        mask = None
+        # VectorStoreIndex passes an empty node_ids list when it does not track nodes
+        if query.node_ids or query.doc_ids:
+            mask = np.zeros(len(self._ids), dtype=bool)
+            if query.node_ids:
+                mask[[self._row_by_id[node_id] for node_id in query.node_ids if node_id in self._row_by_id]] = True
+            for doc_id in query.doc_ids or []:
+                mask[self._rows_by_ref_doc.get(doc_id, [])] = True
+        if query.filters is not None and query.filters.filters:
+            matches = _metadata_filter_fn(query.filters)
+            filter_mask = np.zeros(len(self._ids), dtype=bool)
+            live_rows = [row for row in self._row_by_id.values() if matches(self._metadata[row])]
+            filter_mask[live_rows] = True
+            mask = filter_mask if mask is None else mask & filter_mask
+        return mask
+
+    def _search(self, query_embedding: List[float], k: int, mask: Optional[np.ndarray]) -> List[Tuple[int, float]]:
+        """Top-k rows by cosine similarity, scoring the matrix in blocks.
+
+        Quantized and prefix matrices yield ``rescore_factor * k`` candidates whose
+        scores are recomputed from the full float32 vectors before the final top-k.
+        """
+        vectors = self._matrix()
+        scales = self._map(SCALES_FILE)
+        full = self._map(FULL_FILE)
+        full_query = normalize_rows(np.asarray([query_embedding], dtype=np.float32))
+        query = self._search_vectors(full_query)[0]
+        full_query = full_query[0]
+        rescore = full is not None and self.rescore_factor > 0
+        candidate_k = k * self.rescore_factor if rescore else k
+
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, vectors.shape[0], QUERY_BLOCK_ROWS):
+            scores = vectors[start:start + QUERY_BLOCK_ROWS].astype(np.float32, copy=False) @ query
+            if scales is not None:
+                scores *= scales[start:start + len(scores)]
+            excluded = self._deleted[start:start + len(scores)]
+            if mask is not None:
+                excluded = excluded | ~mask[start:start + len(scores)]
+            scores[excluded] = -np.inf
+            block_best = top_k_indices(scores, candidate_k)
+            best_rows = np.concatenate([best_rows, block_best + start])
+            best_scores = np.concatenate([best_scores, scores[block_best]])
+
+        order = top_k_indices(best_scores, candidate_k)
+        best_rows, best_scores = best_rows[order], best_scores[order]
+        best_rows = best_rows[np.isfinite(best_scores)]
+        if rescore and len(best_rows):
+            # Sorted row order keeps the reads from the mapped file sequential
+            rows = np.sort(best_rows)
+            best_rows, best_scores = rows, np.asarray(full[rows], dtype=np.float32) @ full_query
+        else:
+            best_scores = best_scores[:len(best_rows)]
+        order = top_k_indices(best_scores, k)
+        return [(int(best_rows[i]), float(best_scores[i])) for i in order]
+
+    def search(
+        self, query_embedding: List[float], top_k: int, node_ids: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """Return ``(node_id, similarity)`` of the ``top_k`` nearest vectors, best first.
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results
+            node_ids: Only consider these nodes
+        """
+        mask = self._candidate_mask(VectorStoreQuery(node_ids=node_ids))
+        return [(self._ids[row], score) for row, score in self._search(query_embedding, top_k, mask)]
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Return the ``similarity_top_k`` most similar nodes, loaded from the document store."""
+        if query.query_embedding is None or not self._row_by_id:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        hits = self._search(query.query_embedding, query.similarity_top_k, self._candidate_mask(query))
+        nodes_by_id = {
+            node.node_id: node
+            for node in self._docstore.get_nodes([self._ids[row] for row, _ in hits], raise_error=False)
+        }
+        nodes, similarities, ids = [], [], []
+        for row, score in hits:
+            node = nodes_by_id.get(self._ids[row])
+            if node is None:
+                logger.warning(f"Vector {self._ids[row]} has no node in the document store")
+                continue
+            nodes.append(node)
+            similarities.append(score)
+            ids.append(node.node_id)
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        # NumPy releases the GIL during the matrix product
+        return await run_in_io_thread(self.query, query, **kwargs)
+
+    async def async_add(self, nodes: Sequence[BaseNode], **kwargs: Any) -> List[str]:
+        return await run_in_io_thread(self.add, nodes, **kwargs)
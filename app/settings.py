@@ -4,9 +4,20 @@ from llama_index.core import Settings
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms.openai import OpenAI
 
+from app.embedding_cache import DEFAULT_CACHE_PATH, CachedEmbedding, EmbeddingCache
+
 
 def init_settings():
     if os.getenv("OPENAI_API_KEY") is None:
         raise RuntimeError("OPENAI_API_KEY is missing in environment variables")
     Settings.llm = OpenAI(model="gpt-4o-mini")
-    Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
+    embed_model = OpenAIEmbedding(model="text-embedding-3-large")
+
+    # Serve repeated texts (unchanged chunks, repeated questions) from the persistent cache
+    if os.getenv("EMBEDDING_CACHE", "true").lower() in ("1", "true", "yes"):
+        cache = EmbeddingCache(
+            os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+            max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MB", "1024")) * 1024 * 1024),
+        )
+        embed_model = CachedEmbedding(embed_model, cache)
+    Settings.embed_model = embed_model
@@ -0,0 +1,233 @@
+"""
+SQLite connection management shared by the SQLite document and index stores.
+
+Each thread gets its own long-lived connection per database file, configured
+with WAL journaling and tuned pragmas, instead of paying for a fresh
+``sqlite3.connect`` on every store call.
+"""
+import os
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Conservative bound on bound parameters per statement; SQLite builds before
+# 3.32 default SQLITE_MAX_VARIABLE_NUMBER to 999.
+SQLITE_MAX_VARIABLES = 900
+
+
+@dataclass(frozen=True)
+class SQLiteConfig:
+    """Connection settings applied to every pooled SQLite connection.
+
+    Attributes:
+        journal_mode: SQLite journal mode; WAL lets readers run alongside a writer
+        synchronous: fsync policy; NORMAL is durable enough under WAL
+        cache_size: Page cache size (negative values are KiB, positive are pages)
+        mmap_size: Bytes of the database file to memory-map for reads
+        busy_timeout: Milliseconds to wait on a locked database before failing
+        temp_store: Where temporary tables and indices are kept
+    """
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -64000
+    mmap_size: int = 256 * 1024 * 1024
+    busy_timeout: int = 5000
+    temp_store: str = "MEMORY"
+
+
+class SQLiteConnectionPool:
+    """Thread-local SQLite connections for a single database file."""
+
+    def __init__(self, db_path: str, config: Optional[SQLiteConfig] = None):
+        """Initialize the connection pool.
+
+        Args:
+            db_path: Path to SQLite database file
+            config: Pragma settings for new connections (defaults to SQLiteConfig())
+        """
+        self.db_path = db_path
+        self.config = config or SQLiteConfig()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+        self._pid = os.getpid()
+        self._closed = False
+        # Stores holding this pool; see get_connection_pool / release_connection_pool
+        self._refs = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply the configured pragmas."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.config.busy_timeout / 1000,
+            check_same_thread=False,
+        )
+        conn.execute(f"PRAGMA journal_mode={self.config.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.config.synchronous}")
+        conn.execute(f"PRAGMA cache_size={int(self.config.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.config.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.config.busy_timeout)}")
+        conn.execute(f"PRAGMA temp_store={self.config.temp_store}")
+        return conn
+
+    def _reset_after_fork(self) -> None:
+        """Drop connections inherited from a parent process (e.g. uvicorn workers)."""
+        self._local = threading.local()
+        self._connections = []
+        self._pid = os.getpid()
+
+    def _prune_dead_threads(self) -> None:
+        """Close connections owned by threads that have exited."""
+        alive = []
+        for thread, conn in self._connections:
+            if thread.is_alive():
+                alive.append((thread, conn))
+            else:
+                conn.close()
+        self._connections = alive
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_path} is closed")
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset_after_fork()
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._prune_dead_threads()
+                self._connections.append((threading.current_thread(), conn))
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Yield the thread's connection and commit on success, roll back on error."""
+        conn = self.connection()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def close(self) -> None:
+        """Close every connection opened by this pool."""
+        with self._lock:
+            for _, conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to close connection to {self.db_path}: {e}")
+            self._connections = []
+            self._local = threading.local()
+            self._closed = True
+
+
+_pools: Dict[Tuple[str, SQLiteConfig], SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+# Threads dedicated to SQLite I/O for the async store methods. Each of them gets
+# its own pooled connection, so the event loop never touches the database.
+SQLITE_IO_WORKERS = int(os.getenv("SQLITE_IO_WORKERS", "4"))
+_io_executor: Optional[ThreadPoolExecutor] = None
+_io_executor_pid: Optional[int] = None
+
+
+def _get_io_executor() -> ThreadPoolExecutor:
+    """Return the process-wide SQLite I/O executor, creating it if needed."""
+    global _io_executor, _io_executor_pid
+    with _pools_lock:
+        if _io_executor is None or _io_executor_pid != os.getpid():
+            _io_executor = ThreadPoolExecutor(
+                max_workers=SQLITE_IO_WORKERS,
+                thread_name_prefix="sqlite-io",
+            )
+            _io_executor_pid = os.getpid()
+        return _io_executor
+
+
+async def run_in_io_thread(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking store call on the SQLite I/O executor without blocking the event loop.
+
+    Args:
+        fn: Synchronous function to call
+        *args: Positional arguments for ``fn``
+        **kwargs: Keyword arguments for ``fn``
+
+    Returns:
+        The return value of ``fn``
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_executor(), partial(fn, *args, **kwargs))
+
+
+def get_connection_pool(
+    db_path: str, config: Optional[SQLiteConfig] = None
+) -> SQLiteConnectionPool:
+    """Return the process-wide pool for a database file, creating it if needed.
+
+    Every call takes a reference that must be given back with
+    ``release_connection_pool``; the pool is closed when the last one is released.
+
+    Args:
+        db_path: Path to SQLite database file
+        config: Pragma settings for the pool
+
+    Returns:
+        A shared SQLiteConnectionPool
+    """
+    key = (os.path.abspath(db_path), config or SQLiteConfig())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = SQLiteConnectionPool(db_path, key[1])
+            _pools[key] = pool
+        pool._refs += 1
+        return pool
+
+
+def release_connection_pool(pool: SQLiteConnectionPool) -> None:
+    """Give back a reference taken by ``get_connection_pool``, closing the pool after the last one.
+
+    Args:
+        pool: Pool returned by ``get_connection_pool``
+    """
+    with _pools_lock:
+        pool._refs -= 1
+        if pool._refs > 0:
+            return
+        key = (os.path.abspath(pool.db_path), pool.config)
+        if _pools.get(key) is pool:
+            del _pools[key]
+    pool.close()
+
+
+def close_all_pools() -> None:
+    """Close all shared connection pools and the I/O executor. Intended as an application shutdown hook."""
+    global _io_executor
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        executor, _io_executor = _io_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    for pool in pools:
+        pool.close()
+    if pools:
+        logger.info(f"Closed {len(pools)} SQLite connection pool(s)")
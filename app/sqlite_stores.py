@@ -1,31 +1,188 @@
-import sqlite3
 import json
 import logging
-from typing import Dict, List, Optional, Any
+from collections import deque
+from collections.abc import ItemsView, Mapping, ValuesView
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Any, Tuple
 from llama_index.core.storage.docstore.types import BaseDocumentStore
 from llama_index.core.storage.index_store.types import BaseIndexStore
-from llama_index.core.schema import BaseNode, Document, TextNode
+from llama_index.core.schema import BaseNode, Document, MetadataMode, TextNode
 from llama_index.core.data_structs.data_structs import IndexStruct
+from app import fts, node_codec
+from app.node_cache import get_node_cache
+from app.sqlite_pool import (
+    SQLITE_MAX_VARIABLES,
+    SQLiteConfig,
+    SQLiteConnectionPool,
+    get_connection_pool,
+    release_connection_pool,
+    run_in_io_thread,
+)
 
 logger = logging.getLogger(__name__)
 
+# Nodes written per transaction by SQLiteDocumentStore.add_documents.
+DEFAULT_WRITE_BATCH_SIZE = 1000
+
+# ref_doc_info columns with node_ids assembled from the normalized ref_doc_nodes table.
+_REF_DOC_INFO_COLUMNS = (
+    "(SELECT json_group_array(node_id) FROM ref_doc_nodes"
+    " WHERE ref_doc_nodes.ref_doc_id = ref_doc_info.ref_doc_id), metadata"
+)
+
+# (doc_id, doc_hash, data, format) rows, (ref_doc_id, node_id, metadata_json) rows
+# and (terms, node_id) full-text rows.
+SerializedBatch = Tuple[
+    List[Tuple[str, Optional[str], Any, int]], List[Tuple[str, str, str]], List[Tuple[str, str]]
+]
+
+# Rows fetched per query when iterating a whole table.
+DEFAULT_READ_BATCH_SIZE = 500
+
+
+class _LazyItemsView(ItemsView):
+    def __init__(self, view: "SQLiteMappingView") -> None:
+        super().__init__(view)
+        self._view = view
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        return self._view.iter_items()
+
+
+class _LazyValuesView(ValuesView):
+    def __init__(self, view: "SQLiteMappingView") -> None:
+        super().__init__(view)
+        self._view = view
+
+    def __iter__(self) -> Iterator[Any]:
+        for _, value in self._view.iter_items():
+            yield value
+
+
+class SQLiteMappingView(Mapping):
+    """Read-only Mapping over a SQLite table that loads values on demand.
+
+    ``len`` runs a COUNT, lookups are point queries, and iteration pages
+    through the table by rowid in batches, so no full copy of the table is
+    ever held in memory. Rows whose loader returns None are skipped during
+    iteration and raise KeyError on lookup.
+    """
+
+    def __init__(
+        self,
+        pool: SQLiteConnectionPool,
+        table: str,
+        key_column: str,
+        value_columns: str,
+        load_value: Callable[..., Any],
+        batch_size: int = DEFAULT_READ_BATCH_SIZE,
+    ):
+        """Initialize the view.
+
+        Args:
+            pool: Connection pool of the database holding the table
+            table: Table name
+            key_column: Column used as the mapping key
+            value_columns: Comma-separated columns passed to ``load_value``
+            load_value: Builds the mapping value from the selected value columns
+            batch_size: Rows fetched per query while iterating
+        """
+        self._pool = pool
+        self._table = table
+        self._key_column = key_column
+        self._value_columns = value_columns
+        self._load_value = load_value
+        self._batch_size = batch_size
+
+    def __len__(self) -> int:
+        row = self._pool.connection().execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()
+        return row[0]
+
+    def __getitem__(self, key: str) -> Any:
+        row = self._pool.connection().execute(
+            f"SELECT {self._value_columns} FROM {self._table} WHERE {self._key_column} = ?",
+            (key,),
+        ).fetchone()
+        value = self._load_value(*row) if row is not None else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        row = self._pool.connection().execute(
+            f"SELECT 1 FROM {self._table} WHERE {self._key_column} = ? LIMIT 1",
+            (key,),
+        ).fetchone()
+        return row is not None
+
+    def _iter_rows(self, columns: str) -> Iterator[tuple]:
+        """Page through the table by rowid, yielding rows without the rowid."""
+        conn = self._pool.connection()
+        last_rowid = 0
+        while True:
+            rows = conn.execute(
+                f"SELECT rowid, {columns} FROM {self._table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, self._batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            for row in rows:
+                yield row[1:]
+
+    def __iter__(self) -> Iterator[str]:
+        for (key,) in self._iter_rows(self._key_column):
+            yield key
+
+    def iter_items(self) -> Iterator[Tuple[str, Any]]:
+        """Yield (key, value) pairs, loading values in batches."""
+        for key, *values in self._iter_rows(f"{self._key_column}, {self._value_columns}"):
+            value = self._load_value(*values)
+            if value is not None:
+                yield key, value
+
+    def items(self) -> ItemsView:
+        return _LazyItemsView(self)
+
+    def values(self) -> ValuesView:
+        return _LazyValuesView(self)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self._table} ({len(self)} rows)>"
+
 
 class SQLiteDocumentStore(BaseDocumentStore):
     """SQLite-based document store for better performance and concurrency."""
     
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        config: Optional[SQLiteConfig] = None,
+        storage_format: Optional[str] = None,
+        use_cache: bool = True,
+    ):
         """Initialize SQLite document store.
 
         Args:
             db_path: Path to SQLite database file
+            config: Connection pragmas (WAL, cache size, ...) for the shared pool
+            storage_format: Encoding for newly written nodes (see ``node_codec.FORMAT_IDS``).
+                It is recorded in the database; when omitted, the recorded format is used.
+            use_cache: Serve repeated reads from the process-wide LRU node cache, sized by
+                DOCSTORE_CACHE_ENTRIES / DOCSTORE_CACHE_MB (a size of 0 disables it)
         """
         self.db_path = db_path
+        self._pool = get_connection_pool(db_path, config)
+        self._closed = False
+        self._cache = get_node_cache(db_path) if use_cache else None
         logger.info(f"🔥 Initializing SQLiteDocumentStore at {db_path}")
         self._init_db()
+        self._format = self._resolve_format(storage_format)
     
     def _init_db(self):
         """Initialize database tables."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.transaction() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS documents (
                     doc_id TEXT PRIMARY KEY,
@@ -46,10 +203,111 @@ class SQLiteDocumentStore(BaseDocumentStore):
                 )
             """)
 
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+
+            # Normalized ref_doc_id -> node_id mapping; ref_doc_info.node_ids is legacy
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ref_doc_nodes (
+                    node_id TEXT PRIMARY KEY,
+                    ref_doc_id TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ref_doc_nodes_ref_doc_id ON ref_doc_nodes(ref_doc_id)")
+            self._migrate_ref_doc_node_ids(conn)
+
+            # Source documents deleted here whose vectors still have to be deleted from the vector store
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_vector_deletes (
+                    ref_doc_id TEXT PRIMARY KEY
+                )
+            """)
+
+            # Hash of the source document the nodes were parsed from, for incremental indexing
+            ref_doc_columns = {row[1] for row in conn.execute("PRAGMA table_info(ref_doc_info)")}
+            if "doc_hash" not in ref_doc_columns:
+                conn.execute("ALTER TABLE ref_doc_info ADD COLUMN doc_hash TEXT")
+
+            # Databases created before format versioning store plain JSON rows
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "format" not in columns:
+                conn.execute(
+                    f"ALTER TABLE documents ADD COLUMN format INTEGER NOT NULL DEFAULT {node_codec.FORMAT_JSON}"
+                )
+
             # Create indexes for better performance
             conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_hash ON documents(doc_hash)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_updated_at ON documents(updated_at)")
-            conn.commit()
+
+            # Full-text index of node text; fts_nodes gives every node a stable FTS rowid
+            has_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'"
+            ).fetchone() is not None
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fts_nodes (
+                    rowid INTEGER PRIMARY KEY,
+                    node_id TEXT NOT NULL UNIQUE
+                )
+            """)
+            conn.execute(fts.FTS_TABLE_SQL)
+
+        # Databases created before full-text search, or indexed with older terms, get their index rebuilt once
+        conn = self._pool.connection()
+        terms_version = conn.execute("SELECT value FROM store_meta WHERE key = 'fts_terms_version'").fetchone()
+        if (not has_fts or terms_version != (fts.TERMS_VERSION,)) and conn.execute(
+            "SELECT 1 FROM documents LIMIT 1"
+        ).fetchone():
+            self.rebuild_fts_index()
+        if terms_version != (fts.TERMS_VERSION,):
+            with self._pool.transaction() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('fts_terms_version', ?)",
+                    (fts.TERMS_VERSION,),
+                )
+
+    @staticmethod
+    def _migrate_ref_doc_node_ids(conn) -> None:
+        """Populate ref_doc_nodes from the JSON node_ids arrays of older databases."""
+        if conn.execute("SELECT 1 FROM ref_doc_nodes LIMIT 1").fetchone() is not None:
+            return
+        rows = conn.execute("SELECT ref_doc_id, node_ids FROM ref_doc_info WHERE node_ids != '[]'").fetchall()
+        for ref_doc_id, node_ids_json in rows:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ref_doc_nodes (node_id, ref_doc_id) VALUES (?, ?)",
+                [(node_id, ref_doc_id) for node_id in json.loads(node_ids_json)],
+            )
+            conn.execute("UPDATE ref_doc_info SET node_ids = '[]' WHERE ref_doc_id = ?", (ref_doc_id,))
+        if rows:
+            logger.info(f"Migrated node ids of {len(rows)} reference documents to ref_doc_nodes")
+
+    def _resolve_format(self, storage_format: Optional[str]) -> int:
+        """Return the format id for new rows, recording an explicit choice in the database."""
+        if storage_format is not None:
+            fmt = node_codec.format_id(storage_format)
+            with self._pool.transaction() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('storage_format', ?)",
+                    (storage_format,),
+                )
+            return fmt
+
+        row = self._pool.connection().execute(
+            "SELECT value FROM store_meta WHERE key = 'storage_format'"
+        ).fetchone()
+        return node_codec.format_id(row[0]) if row else node_codec.FORMAT_JSON
+
+    @property
+    def storage_format(self) -> str:
+        """Name of the encoding used for newly written nodes."""
+        return node_codec.FORMAT_NAMES[self._format]
+
+    def _load_node(self, data: Any, fmt: int) -> BaseNode:
+        """Decode a stored row with its recorded format and deserialize it."""
+        return self._deserialize_node(node_codec.decode(data, fmt))
 
     def _deserialize_node(self, node_data: dict) -> BaseNode:
         """Deserialize node data back to the correct node type."""
@@ -76,231 +334,692 @@ class SQLiteDocumentStore(BaseDocumentStore):
             # Fallback to TextNode if deserialization fails
             return TextNode.from_dict(node_data)
     
-    def add_documents(self, nodes: List[BaseNode], allow_update: bool = True) -> None:
-        """Add documents to the store."""
-        logger.info(f"🔥 SQLiteDocumentStore.add_documents called with {len(nodes)} nodes")
-        with sqlite3.connect(self.db_path) as conn:
-            for node in nodes:
-                doc_data = node.to_dict()
-                doc_json = json.dumps(doc_data)
-                doc_hash = getattr(node, 'hash', None)
-
-                logger.debug(f"Adding node {node.node_id} with hash {doc_hash}")
-
-                if allow_update:
-                    conn.execute("""
-                        INSERT OR REPLACE INTO documents (doc_id, doc_hash, data, updated_at)
-                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                    """, (node.node_id, doc_hash, doc_json))
-                else:
-                    conn.execute("""
-                        INSERT OR IGNORE INTO documents (doc_id, doc_hash, data)
-                        VALUES (?, ?, ?)
-                    """, (node.node_id, doc_hash, doc_json))
-            conn.commit()
-        logger.info(f"✅ Successfully added {len(nodes)} documents to SQLite store")
+    def _serialize_batch(self, nodes: List[BaseNode]) -> "SerializedBatch":
+        """Serialize a batch of nodes into document rows and ref doc rows.
+
+        Returns:
+            ``(doc_rows, ref_doc_rows, fts_rows)`` where doc_rows are (doc_id, doc_hash, data, format),
+            ref_doc_rows are (ref_doc_id, node_id, metadata_json) and fts_rows are (terms, node_id)
+        """
+        fmt = self._format
+        doc_rows = []
+        ref_doc_rows = []
+        fts_rows = []
+        for node in nodes:
+            doc_rows.append(
+                (node.node_id, getattr(node, 'hash', None), node_codec.encode(node.to_dict(), fmt), fmt)
+            )
+            fts_rows.append((fts.index_terms(node.get_content(metadata_mode=MetadataMode.NONE)), node.node_id))
+            source = node.source_node
+            if source is not None and source.node_id != node.node_id:
+                ref_doc_rows.append(
+                    (source.node_id, node.node_id, json.dumps(source.metadata or {}, ensure_ascii=False))
+                )
+        return doc_rows, ref_doc_rows, fts_rows
+
+    def _iter_serialized_batches(
+        self,
+        nodes: Iterable[BaseNode],
+        batch_size: int,
+        num_workers: int,
+    ) -> Iterator["SerializedBatch"]:
+        """Yield serialized batches, preparing upcoming batches ahead of the writer.
+
+        With ``num_workers`` > 0 batches are serialized in a thread pool while the
+        current batch is being written; at most ``num_workers + 1`` batches are in
+        flight so memory stays bounded for large inputs.
+        """
+        node_iter = iter(nodes)
+        batches = iter(lambda: list(islice(node_iter, batch_size)), [])
+
+        if num_workers <= 0:
+            for batch in batches:
+                yield self._serialize_batch(batch)
+            return
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            pending: Deque[Future] = deque()
+            for batch in batches:
+                pending.append(executor.submit(self._serialize_batch, batch))
+                if len(pending) > num_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def add_documents(
+        self,
+        nodes: Iterable[BaseNode],
+        allow_update: bool = True,
+        batch_size: Optional[int] = None,
+        store_text: bool = True,
+        num_workers: int = 0,
+        progress_callback: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """Add documents to the store.
+
+        Nodes are serialized before the write transaction is opened and written
+        with ``executemany`` in batches of ``batch_size``, committing after each
+        batch so the write lock is only held briefly.
+
+        Args:
+            nodes: Nodes to store; any iterable, consumed lazily batch by batch
+            allow_update: Replace existing rows with the same doc_id if True
+            batch_size: Nodes per transaction (defaults to DEFAULT_WRITE_BATCH_SIZE)
+            store_text: Accepted for BaseDocumentStore compatibility; text is always stored
+            num_workers: Threads used to serialize upcoming batches (0 serializes inline)
+            progress_callback: Called with the running total of written nodes after each batch
+        """
+        batch_size = batch_size or DEFAULT_WRITE_BATCH_SIZE
+        if allow_update:
+            sql = """
+                INSERT OR REPLACE INTO documents (doc_id, doc_hash, data, format, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """
+        else:
+            sql = """
+                INSERT OR IGNORE INTO documents (doc_id, doc_hash, data, format)
+                VALUES (?, ?, ?, ?)
+            """
+
+        total = 0
+        for rows, ref_doc_rows, fts_rows in self._iter_serialized_batches(nodes, batch_size, num_workers):
+            with self._pool.transaction() as conn:
+                if not allow_update:
+                    # Skipped nodes keep their existing ref doc links and full-text entries
+                    rows, ref_doc_rows, fts_rows = self._drop_existing(rows, ref_doc_rows, fts_rows)
+                conn.executemany(sql, rows)
+                self._write_ref_doc_rows(conn, ref_doc_rows)
+                self._write_fts_rows(conn, fts_rows, replace=allow_update)
+            if self._cache is not None:
+                self._cache.invalidate(row[0] for row in rows)
+            total += len(rows)
+            logger.debug(f"Wrote batch of {len(rows)} nodes ({total} total)")
+            if progress_callback is not None:
+                progress_callback(total)
+        logger.info(f"✅ Successfully added {total} documents to SQLite store")
     
-    def get_document(self, doc_id: str, raise_error: bool = True) -> Optional[BaseNode]:
-        """Get document by ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT data FROM documents WHERE doc_id = ?", (doc_id,))
-            row = cursor.fetchone()
+    def _drop_existing(
+        self,
+        rows: List[tuple],
+        ref_doc_rows: List[Tuple[str, str, str]],
+        fts_rows: List[Tuple[str, str]],
+    ) -> "SerializedBatch":
+        """Filter a serialized batch down to the first occurrence of each node not yet stored."""
+        existing = {
+            doc_id for (doc_id,) in self._query_ids(
+                "SELECT doc_id FROM documents WHERE doc_id IN ({})", list({row[0] for row in rows})
+            )
+        }
+        new_rows = []
+        for row in rows:
+            if row[0] not in existing:
+                existing.add(row[0])
+                new_rows.append(row)
+        new_ids = {row[0] for row in new_rows}
+        first_ref: Dict[str, Tuple[str, str, str]] = {}
+        for row in ref_doc_rows:
+            first_ref.setdefault(row[1], row)
+        first_fts: Dict[str, Tuple[str, str]] = {}
+        for row in fts_rows:
+            first_fts.setdefault(row[1], row)
+        return (
+            new_rows,
+            [row for node_id, row in first_ref.items() if node_id in new_ids],
+            [row for node_id, row in first_fts.items() if node_id in new_ids],
+        )
 
-            if row is None:
-                if raise_error:
-                    raise ValueError(f"Document {doc_id} not found")
-                return None
+    @staticmethod
+    def _write_fts_rows(conn, fts_rows: List[Tuple[str, str]], replace: bool = True) -> None:
+        """Index node text for full-text search, replacing existing entries if ``replace``."""
+        if replace:
+            conn.executemany(
+                "DELETE FROM documents_fts WHERE rowid = (SELECT rowid FROM fts_nodes WHERE node_id = ?)",
+                [(node_id,) for _, node_id in fts_rows],
+            )
+        conn.executemany(
+            "INSERT OR IGNORE INTO fts_nodes (node_id) VALUES (?)", [(node_id,) for _, node_id in fts_rows]
+        )
+        conn.executemany(
+            """
+            INSERT INTO documents_fts (rowid, terms)
+            SELECT rowid, ? FROM fts_nodes WHERE node_id = ?
+            AND NOT EXISTS (SELECT 1 FROM documents_fts WHERE documents_fts.rowid = fts_nodes.rowid)
+            """,
+            fts_rows,
+        )
+
+    @staticmethod
+    def _delete_fts_rows(conn, node_id_sql: str, params: tuple) -> None:
+        """Remove the full-text entries of the node ids selected by ``node_id_sql``."""
+        conn.execute(
+            f"DELETE FROM documents_fts WHERE rowid IN (SELECT rowid FROM fts_nodes WHERE node_id IN ({node_id_sql}))",
+            params,
+        )
+        conn.execute(f"DELETE FROM fts_nodes WHERE node_id IN ({node_id_sql})", params)
+
+    def rebuild_fts_index(self, batch_size: int = DEFAULT_READ_BATCH_SIZE) -> int:
+        """Rebuild the full-text index from the stored nodes.
 
-            doc_data = json.loads(row[0])
-            return self._deserialize_node(doc_data)
+        Args:
+            batch_size: Nodes indexed per transaction
+
+        Returns:
+            Number of indexed nodes
+        """
+        with self._pool.transaction() as conn:
+            conn.execute("DELETE FROM documents_fts")
+            conn.execute("DELETE FROM fts_nodes")
+
+        total = 0
+        batch: List[Tuple[str, str]] = []
+        for node in self.iter_documents(batch_size=batch_size):
+            batch.append((fts.index_terms(node.get_content(metadata_mode=MetadataMode.NONE)), node.node_id))
+            if len(batch) >= batch_size:
+                with self._pool.transaction() as conn:
+                    self._write_fts_rows(conn, batch, replace=False)
+                total += len(batch)
+                batch = []
+        if batch:
+            with self._pool.transaction() as conn:
+                self._write_fts_rows(conn, batch, replace=False)
+            total += len(batch)
+        logger.info(f"Built full-text index of {total} nodes in {self.db_path}")
+        return total
+
+    def search_text(self, query: str, top_k: int = 10, phrase: bool = False) -> List[Tuple[str, float]]:
+        """Full-text search over node text, ranked by BM25.
+
+        Args:
+            query: Search text; CJK text is matched by character bigrams
+            top_k: Maximum number of results
+            phrase: Only match nodes containing the query verbatim instead of any of its terms
+
+        Returns:
+            ``(node_id, score)`` pairs, best first; higher scores are better
+        """
+        match = fts.match_phrase(query) if phrase else fts.match_any(query)
+        if match is None:
+            return []
+        rows = self._pool.connection().execute(
+            """
+            SELECT fts_nodes.node_id, bm25(documents_fts) AS rank
+            FROM documents_fts JOIN fts_nodes ON fts_nodes.rowid = documents_fts.rowid
+            WHERE documents_fts MATCH ?
+            ORDER BY rank LIMIT ?
+            """,
+            (match, top_k),
+        ).fetchall()
+        # bm25() is lower-is-better
+        return [(node_id, -rank) for node_id, rank in rows]
+
+    def _query_ids(self, sql: str, doc_ids: List[str]) -> Iterator[tuple]:
+        """Run ``sql`` with its ``{}`` placeholder filled per chunk of ``SQLITE_MAX_VARIABLES`` ids."""
+        conn = self._pool.connection()
+        for start in range(0, len(doc_ids), SQLITE_MAX_VARIABLES):
+            chunk = doc_ids[start:start + SQLITE_MAX_VARIABLES]
+            yield from conn.execute(sql.format(",".join("?" * len(chunk))), chunk)
+
+    def _fetch_nodes(self, doc_ids: List[str]) -> Dict[str, BaseNode]:
+        """Load the given distinct ids, serving still-valid cached nodes from the cache."""
+        nodes: Dict[str, BaseNode] = {}
+        pending = doc_ids
+        if self._cache is not None:
+            cached_ids = list(self._cache.versions(doc_ids))
+            current_versions = {
+                doc_id: (doc_hash, updated_at)
+                for doc_id, doc_hash, updated_at in self._query_ids(
+                    "SELECT doc_id, doc_hash, updated_at FROM documents WHERE doc_id IN ({})",
+                    cached_ids,
+                )
+            }
+            for doc_id in doc_ids:
+                node = self._cache.get(doc_id, current_versions.get(doc_id))
+                if node is not None:
+                    nodes[doc_id] = node
+            pending = [doc_id for doc_id in doc_ids if doc_id not in nodes]
+
+        for doc_id, data, fmt, doc_hash, updated_at in self._query_ids(
+            "SELECT doc_id, data, format, doc_hash, updated_at FROM documents WHERE doc_id IN ({})",
+            pending,
+        ):
+            node = self._load_node(data, fmt)
+            nodes[doc_id] = node
+            if self._cache is not None:
+                self._cache.put(doc_id, node, (doc_hash, updated_at), len(data))
+        return nodes
+
+    @staticmethod
+    def _write_ref_doc_rows(conn, ref_doc_rows: List[Tuple[str, str, str]]) -> None:
+        """Record node -> source document links and the source documents' metadata."""
+        if not ref_doc_rows:
+            return
+        conn.executemany(
+            "INSERT OR REPLACE INTO ref_doc_nodes (node_id, ref_doc_id) VALUES (?, ?)",
+            [(node_id, ref_doc_id) for ref_doc_id, node_id, _ in ref_doc_rows],
+        )
+        ref_doc_metadata = {ref_doc_id: metadata for ref_doc_id, _, metadata in ref_doc_rows}
+        conn.executemany(
+            """
+            INSERT INTO ref_doc_info (ref_doc_id, node_ids, metadata) VALUES (?, '[]', ?)
+            ON CONFLICT(ref_doc_id) DO UPDATE SET
+                metadata = excluded.metadata, updated_at = CURRENT_TIMESTAMP
+            """,
+            list(ref_doc_metadata.items()),
+        )
+
+    def get_document(self, doc_id: str, raise_error: bool = True) -> Optional[BaseNode]:
+        """Get document by ID."""
+        node = self._fetch_nodes([doc_id]).get(doc_id)
+        if node is None and raise_error:
+            raise ValueError(f"Document {doc_id} not found")
+        return node
     
     def get_node(self, node_id: str, raise_error: bool = True) -> Optional[BaseNode]:
         """Get node by ID (alias for get_document)."""
         return self.get_document(node_id, raise_error)
     
     def get_nodes(self, node_ids: List[str], raise_error: bool = True) -> List[BaseNode]:
-        """Get multiple nodes by IDs."""
-        nodes = []
-        for node_id in node_ids:
-            node = self.get_node(node_id, raise_error=False)
-            if node is not None:
-                nodes.append(node)
-            elif raise_error:
-                raise ValueError(f"Node {node_id} not found")
-        return nodes
+        """Get multiple nodes by IDs in as few queries as possible.
+
+        Ids are looked up in chunks of ``SQLITE_MAX_VARIABLES`` and returned in
+        the requested order. Nodes still valid in the node cache are not re-read.
+        Missing ids are skipped, or reported together in a
+        single ValueError when ``raise_error`` is True.
+        """
+        if not node_ids:
+            return []
+
+        unique_ids = list(dict.fromkeys(node_ids))
+        nodes_by_id = self._fetch_nodes(unique_ids)
+
+        missing = [node_id for node_id in unique_ids if node_id not in nodes_by_id]
+        if missing and raise_error:
+            raise ValueError(f"Nodes not found: {', '.join(missing)}")
+
+        return [nodes_by_id[node_id] for node_id in node_ids if node_id in nodes_by_id]
     
     def delete_document(self, doc_id: str, raise_error: bool = True) -> None:
         """Delete document by ID."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.transaction() as conn:
             cursor = conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
             if cursor.rowcount == 0 and raise_error:
                 raise ValueError(f"Document {doc_id} not found")
-            conn.commit()
+            conn.execute("DELETE FROM ref_doc_nodes WHERE node_id = ?", (doc_id,))
+            self._delete_fts_rows(conn, "?", (doc_id,))
+        if self._cache is not None:
+            self._cache.invalidate([doc_id])
     
     def document_exists(self, doc_id: str) -> bool:
         """Check if document exists."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT 1 FROM documents WHERE doc_id = ? LIMIT 1", (doc_id,))
-            return cursor.fetchone() is not None
+        conn = self._pool.connection()
+        cursor = conn.execute("SELECT 1 FROM documents WHERE doc_id = ? LIMIT 1", (doc_id,))
+        return cursor.fetchone() is not None
     
     def get_all_document_hashes(self) -> Dict[str, str]:
         """Get all document hashes."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT doc_id, doc_hash FROM documents WHERE doc_hash IS NOT NULL")
-            return {row[0]: row[1] for row in cursor.fetchall()}
+        conn = self._pool.connection()
+        cursor = conn.execute("SELECT doc_id, doc_hash FROM documents WHERE doc_hash IS NOT NULL")
+        return {row[0]: row[1] for row in cursor.fetchall()}
     
     def get_document_hash(self, doc_id: str) -> Optional[str]:
         """Get document hash by ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT doc_hash FROM documents WHERE doc_id = ?", (doc_id,))
-            row = cursor.fetchone()
-            return row[0] if row else None
+        conn = self._pool.connection()
+        cursor = conn.execute("SELECT doc_hash FROM documents WHERE doc_id = ?", (doc_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
     
     def set_document_hash(self, doc_id: str, doc_hash: str) -> None:
         """Set document hash."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.transaction() as conn:
             conn.execute("""
                 UPDATE documents SET doc_hash = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE doc_id = ?
             """, (doc_hash, doc_id))
-            conn.commit()
 
     def set_document_hashes(self, doc_hashes: Dict[str, str]) -> None:
         """Set multiple document hashes."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.transaction() as conn:
             for doc_id, doc_hash in doc_hashes.items():
                 conn.execute("""
                     UPDATE documents SET doc_hash = ?, updated_at = CURRENT_TIMESTAMP
                     WHERE doc_id = ?
                 """, (doc_hash, doc_id))
-            conn.commit()
     
-    def get_all_ref_doc_info(self) -> Dict[str, Any]:
-        """Get all reference document info."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT ref_doc_id, node_ids, metadata FROM ref_doc_info")
-            result = {}
-            for row in cursor.fetchall():
-                ref_doc_id, node_ids_json, metadata_json = row
-                result[ref_doc_id] = {
-                    "node_ids": json.loads(node_ids_json),
-                    "metadata": json.loads(metadata_json) if metadata_json else {}
-                }
-            return result
+    @staticmethod
+    def _load_ref_doc_info(node_ids_json: str, metadata_json: Optional[str]) -> Dict[str, Any]:
+        """Build a ref doc info dict from its stored columns."""
+        return {
+            "node_ids": json.loads(node_ids_json),
+            "metadata": json.loads(metadata_json) if metadata_json else {}
+        }
+
+    def get_all_ref_doc_info(self) -> Mapping:  # type: ignore[override]  # lazy view, not a Dict copy
+        """Get all reference document info as a lazy, SQL-backed mapping."""
+        return SQLiteMappingView(
+            self._pool, "ref_doc_info", "ref_doc_id", _REF_DOC_INFO_COLUMNS, self._load_ref_doc_info
+        )
     
     def get_ref_doc_info(self, ref_doc_id: str) -> Optional[Dict[str, Any]]:
         """Get reference document info by ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT node_ids, metadata FROM ref_doc_info WHERE ref_doc_id = ?", 
-                (ref_doc_id,)
+        conn = self._pool.connection()
+        cursor = conn.execute(
+            f"SELECT {_REF_DOC_INFO_COLUMNS} FROM ref_doc_info WHERE ref_doc_id = ?",
+            (ref_doc_id,)
+        )
+        row = cursor.fetchone()
+        if row:
+            return self._load_ref_doc_info(*row)
+        return None
+
+    def get_ref_doc_node_ids(self, ref_doc_id: str) -> List[str]:
+        """Get the ids of all nodes parsed from a source document (indexed lookup)."""
+        cursor = self._pool.connection().execute(
+            "SELECT node_id FROM ref_doc_nodes WHERE ref_doc_id = ? ORDER BY rowid", (ref_doc_id,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_all_ref_doc_hashes(self) -> Dict[str, Optional[str]]:
+        """Get the recorded source document hash of every reference document."""
+        cursor = self._pool.connection().execute("SELECT ref_doc_id, doc_hash FROM ref_doc_info")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+    def set_ref_doc_hashes(self, doc_hashes: Dict[str, str]) -> None:
+        """Record the hashes of source documents whose nodes are now stored."""
+        with self._pool.transaction() as conn:
+            conn.executemany(
+                """
+                INSERT INTO ref_doc_info (ref_doc_id, node_ids, doc_hash) VALUES (?, '[]', ?)
+                ON CONFLICT(ref_doc_id) DO UPDATE SET
+                    doc_hash = excluded.doc_hash, updated_at = CURRENT_TIMESTAMP
+                """,
+                list(doc_hashes.items()),
             )
-            row = cursor.fetchone()
-            if row:
-                node_ids_json, metadata_json = row
-                return {
-                    "node_ids": json.loads(node_ids_json),
-                    "metadata": json.loads(metadata_json) if metadata_json else {}
-                }
-            return None
-    
-    def delete_ref_doc(self, ref_doc_id: str, raise_error: bool = True) -> None:
-        """Delete reference document."""
-        with sqlite3.connect(self.db_path) as conn:
+
+    def clear(self) -> None:
+        """Delete every node and reference document from the store."""
+        with self._pool.transaction() as conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM ref_doc_nodes")
+            conn.execute("DELETE FROM ref_doc_info")
+            conn.execute("DELETE FROM documents_fts")
+            conn.execute("DELETE FROM fts_nodes")
+            conn.execute("DELETE FROM pending_vector_deletes")
+        if self._cache is not None:
+            self._cache.clear()
+
+    def set_ref_doc_info(
+        self, ref_doc_id: str, node_ids: List[str], metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Record the nodes and metadata of a source document, replacing any existing mapping."""
+        metadata_json = json.dumps(metadata or {}, ensure_ascii=False)
+        with self._pool.transaction() as conn:
+            conn.execute("DELETE FROM ref_doc_nodes WHERE ref_doc_id = ?", (ref_doc_id,))
+            self._write_ref_doc_rows(
+                conn, [(ref_doc_id, node_id, metadata_json) for node_id in node_ids]
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO ref_doc_info (ref_doc_id, node_ids, metadata) VALUES (?, '[]', ?)",
+                (ref_doc_id, metadata_json),
+            )
+
+    def delete_ref_doc(
+        self,
+        ref_doc_id: str,
+        raise_error: bool = True,
+        vector_store: Optional[Any] = None,
+    ) -> None:
+        """Delete a source document together with all of its nodes.
+
+        The nodes, their full-text entries, their ref doc links and the ref doc
+        info are removed in a single transaction. The vectors are deleted after
+        it commits; until they are, the document is recorded in
+        ``pending_vector_deletes``, so a failed vector delete is retried by
+        ``delete_pending_vectors`` instead of leaving orphaned vectors behind.
+
+        Args:
+            ref_doc_id: Id of the source document
+            raise_error: Raise ValueError if the source document is unknown
+            vector_store: Optional vector store (e.g. ChromaVectorStore) whose vectors for
+                this source document are deleted too, via ``vector_store.delete(ref_doc_id)``
+        """
+        with self._pool.transaction() as conn:
+            node_ids = [
+                row[0] for row in conn.execute(
+                    "SELECT node_id FROM ref_doc_nodes WHERE ref_doc_id = ?", (ref_doc_id,)
+                )
+            ]
+            conn.execute(
+                "DELETE FROM documents WHERE doc_id IN (SELECT node_id FROM ref_doc_nodes WHERE ref_doc_id = ?)",
+                (ref_doc_id,),
+            )
+            self._delete_fts_rows(conn, "SELECT node_id FROM ref_doc_nodes WHERE ref_doc_id = ?", (ref_doc_id,))
+            conn.execute("DELETE FROM ref_doc_nodes WHERE ref_doc_id = ?", (ref_doc_id,))
             cursor = conn.execute("DELETE FROM ref_doc_info WHERE ref_doc_id = ?", (ref_doc_id,))
-            if cursor.rowcount == 0 and raise_error:
+            if cursor.rowcount == 0 and not node_ids and raise_error:
                 raise ValueError(f"Reference document {ref_doc_id} not found")
-            conn.commit()
+            if vector_store is not None:
+                conn.execute(
+                    "INSERT OR IGNORE INTO pending_vector_deletes (ref_doc_id) VALUES (?)", (ref_doc_id,)
+                )
+        if self._cache is not None:
+            self._cache.invalidate(node_ids)
+        if vector_store is not None:
+            self._delete_vectors(vector_store, ref_doc_id)
+        logger.info(f"Deleted reference document {ref_doc_id} and {len(node_ids)} nodes")
+
+    def _delete_vectors(self, vector_store: Any, ref_doc_id: str) -> None:
+        """Delete the vectors of a source document and clear its pending-delete marker."""
+        vector_store.delete(ref_doc_id)
+        with self._pool.transaction() as conn:
+            conn.execute("DELETE FROM pending_vector_deletes WHERE ref_doc_id = ?", (ref_doc_id,))
+
+    def delete_pending_vectors(self, vector_store: Any) -> int:
+        """Retry the vector deletes of source documents whose earlier delete failed.
+
+        Deleting vectors by ref_doc_id is idempotent, so retrying is always safe.
+        Must run before new vectors are added for the same source documents.
+
+        Args:
+            vector_store: Vector store holding the source documents' vectors
+
+        Returns:
+            Number of source documents whose vectors were deleted
+        """
+        ref_doc_ids = [
+            row[0] for row in self._pool.connection().execute("SELECT ref_doc_id FROM pending_vector_deletes")
+        ]
+        for ref_doc_id in ref_doc_ids:
+            self._delete_vectors(vector_store, ref_doc_id)
+        if ref_doc_ids:
+            logger.info(f"Deleted leftover vectors of {len(ref_doc_ids)} removed reference documents")
+        return len(ref_doc_ids)
     
     def ref_doc_exists(self, ref_doc_id: str) -> bool:
         """Check if reference document exists."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT 1 FROM ref_doc_info WHERE ref_doc_id = ? LIMIT 1", (ref_doc_id,))
-            return cursor.fetchone() is not None
+        conn = self._pool.connection()
+        cursor = conn.execute("SELECT 1 FROM ref_doc_info WHERE ref_doc_id = ? LIMIT 1", (ref_doc_id,))
+        return cursor.fetchone() is not None
     
     @property
-    def docs(self) -> Dict[str, BaseNode]:
-        """Get all documents as a dictionary."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT doc_id, data FROM documents")
-            docs = {}
-            for row in cursor.fetchall():
-                doc_id, doc_data = row
-                docs[doc_id] = self._deserialize_node(json.loads(doc_data))
-            return docs
+    def docs(self) -> Mapping:  # type: ignore[override]  # lazy view, not a Dict copy
+        """Get all documents as a lazy, SQL-backed mapping of doc_id to node.
+
+        Nothing is loaded up front: ``len`` runs a COUNT, lookups fetch a single
+        row and iteration pages through the table in batches.
+        """
+        return SQLiteMappingView(self._pool, "documents", "doc_id", "data, format", self._load_node)
+
+    def iter_documents(self, batch_size: int = DEFAULT_READ_BATCH_SIZE) -> Iterator[BaseNode]:
+        """Yield every stored node, fetching ``batch_size`` rows per query."""
+        view = SQLiteMappingView(
+            self._pool, "documents", "doc_id", "data, format", self._load_node, batch_size=batch_size
+        )
+        for _, node in view.iter_items():
+            yield node
     
     def persist(self, persist_path: str = "", fs: Optional[Any] = None) -> None:
         """Persist the store (no-op for SQLite as it's already persistent)."""
         logger.info(f"SQLite document store is already persistent at {self.db_path}")
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return node cache counters (hits, misses, evictions, size) for monitoring."""
+        if self._cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._cache.stats()}
+
+    def upgrade_storage_format(
+        self,
+        storage_format: str,
+        batch_size: int = DEFAULT_WRITE_BATCH_SIZE,
+        vacuum: bool = True,
+    ) -> int:
+        """Re-encode every stored node in place with the given format.
+
+        Rows are rewritten in batches, each in its own transaction, so readers keep
+        working during the upgrade; rows already in the target format are skipped.
+
+        Args:
+            storage_format: Target format name (see ``node_codec.FORMAT_IDS``)
+            batch_size: Rows rewritten per transaction
+            vacuum: Run VACUUM afterwards to return freed pages to the filesystem
+
+        Returns:
+            Number of rows rewritten
+        """
+        target = node_codec.format_id(storage_format)
+        self._format = self._resolve_format(storage_format)
+        conn = self._pool.connection()
+
+        upgraded = 0
+        last_rowid = 0
+        while True:
+            rows = conn.execute(
+                """
+                SELECT rowid, data, format FROM documents
+                WHERE rowid > ? AND format != ?
+                ORDER BY rowid LIMIT ?
+                """,
+                (last_rowid, target, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            updates = [
+                (node_codec.encode(node_codec.decode(data, fmt), target), target, rowid)
+                for rowid, data, fmt in rows
+            ]
+            with self._pool.transaction() as conn:
+                conn.executemany("UPDATE documents SET data = ?, format = ? WHERE rowid = ?", updates)
+            upgraded += len(rows)
+            last_rowid = rows[-1][0]
+            logger.info(f"Upgraded {upgraded} documents to {storage_format}")
+
+        if vacuum and upgraded:
+            conn.execute("VACUUM")
+        logger.info(f"✅ Storage format of {self.db_path} is now {storage_format} ({upgraded} rows rewritten)")
+        return upgraded
+
+    def close(self) -> None:
+        """Release this store's reference to the shared connection pool.
+
+        The pool's connections are closed once no other store uses the same database.
+        """
+        if not self._closed:
+            self._closed = True
+            release_connection_pool(self._pool)
     
     @classmethod
-    def from_persist_dir(cls, persist_dir: str) -> "SQLiteDocumentStore":
+    def from_persist_dir(cls, persist_dir: str, storage_format: Optional[str] = None) -> "SQLiteDocumentStore":
         """Load from persist directory."""
         import os
         db_path = os.path.join(persist_dir, "docstore.db")
-        return cls(db_path)
+        return cls(db_path, storage_format=storage_format)
 
-    # Async methods (delegating to sync methods for simplicity)
-    async def async_add_documents(self, nodes: List[BaseNode], allow_update: bool = True) -> None:
+    # Async methods (run the sync versions on the dedicated SQLite I/O threads)
+    async def async_add_documents(
+        self,
+        nodes: Iterable[BaseNode],
+        allow_update: bool = True,
+        batch_size: Optional[int] = None,
+        store_text: bool = True,
+    ) -> None:
         """Async version of add_documents."""
-        self.add_documents(nodes, allow_update)
+        await run_in_io_thread(
+            self.add_documents, nodes, allow_update, batch_size=batch_size, store_text=store_text
+        )
 
     async def adelete_document(self, doc_id: str, raise_error: bool = True) -> None:
         """Async version of delete_document."""
-        self.delete_document(doc_id, raise_error)
+        await run_in_io_thread(self.delete_document, doc_id, raise_error)
 
-    async def adelete_ref_doc(self, ref_doc_id: str, raise_error: bool = True) -> None:
+    async def adelete_ref_doc(
+        self, ref_doc_id: str, raise_error: bool = True, vector_store: Optional[Any] = None
+    ) -> None:
         """Async version of delete_ref_doc."""
-        self.delete_ref_doc(ref_doc_id, raise_error)
+        await run_in_io_thread(self.delete_ref_doc, ref_doc_id, raise_error, vector_store)
 
     async def adocument_exists(self, doc_id: str) -> bool:
         """Async version of document_exists."""
-        return self.document_exists(doc_id)
+        return await run_in_io_thread(self.document_exists, doc_id)
 
     async def aget_all_document_hashes(self) -> Dict[str, str]:
         """Async version of get_all_document_hashes."""
-        return self.get_all_document_hashes()
+        return await run_in_io_thread(self.get_all_document_hashes)
 
     async def aget_all_ref_doc_info(self) -> Dict[str, Any]:
         """Async version of get_all_ref_doc_info."""
-        return self.get_all_ref_doc_info()
+        return await run_in_io_thread(lambda: dict(self.get_all_ref_doc_info().items()))
 
     async def aget_document(self, doc_id: str, raise_error: bool = True) -> Optional[BaseNode]:
         """Async version of get_document."""
-        return self.get_document(doc_id, raise_error)
+        return await run_in_io_thread(self.get_document, doc_id, raise_error)
+
+    async def aget_node(self, node_id: str, raise_error: bool = True) -> Optional[BaseNode]:
+        """Async version of get_node."""
+        return await run_in_io_thread(self.get_node, node_id, raise_error)
+
+    async def aget_nodes(self, node_ids: List[str], raise_error: bool = True) -> List[BaseNode]:
+        """Async version of get_nodes."""
+        return await run_in_io_thread(self.get_nodes, node_ids, raise_error)
+
+    async def asearch_text(self, query: str, top_k: int = 10, phrase: bool = False) -> List[Tuple[str, float]]:
+        """Async version of search_text."""
+        return await run_in_io_thread(self.search_text, query, top_k, phrase)
 
     async def aget_document_hash(self, doc_id: str) -> Optional[str]:
         """Async version of get_document_hash."""
-        return self.get_document_hash(doc_id)
+        return await run_in_io_thread(self.get_document_hash, doc_id)
 
     async def aget_ref_doc_info(self, ref_doc_id: str) -> Optional[Dict[str, Any]]:
         """Async version of get_ref_doc_info."""
-        return self.get_ref_doc_info(ref_doc_id)
+        return await run_in_io_thread(self.get_ref_doc_info, ref_doc_id)
 
     async def aset_document_hash(self, doc_id: str, doc_hash: str) -> None:
         """Async version of set_document_hash."""
-        self.set_document_hash(doc_id, doc_hash)
+        await run_in_io_thread(self.set_document_hash, doc_id, doc_hash)
 
     async def aset_document_hashes(self, doc_hashes: Dict[str, str]) -> None:
         """Async version of set_document_hashes."""
-        self.set_document_hashes(doc_hashes)
+        await run_in_io_thread(self.set_document_hashes, doc_hashes)
 
 
 class SQLiteIndexStore(BaseIndexStore):
     """SQLite-based index store for better performance and concurrency."""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, config: Optional[SQLiteConfig] = None):
         """Initialize SQLite index store.
         
         Args:
             db_path: Path to SQLite database file
+            config: Connection pragmas (WAL, cache size, ...) for the shared pool
         """
         self.db_path = db_path
+        self._pool = get_connection_pool(db_path, config)
+        self._closed = False
         self._init_db()
     
     def _init_db(self):
         """Initialize database tables."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.transaction() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS index_structs (
                     index_id TEXT PRIMARY KEY,
@@ -312,7 +1031,6 @@ class SQLiteIndexStore(BaseIndexStore):
 
             # Create index for better performance
             conn.execute("CREATE INDEX IF NOT EXISTS idx_index_updated_at ON index_structs(updated_at)")
-            conn.commit()
 
     def _deserialize_index_struct(self, index_data: dict) -> IndexStruct:
         """Deserialize index structure data back to the correct type."""
@@ -359,7 +1077,7 @@ class SQLiteIndexStore(BaseIndexStore):
     
     def add_index_struct(self, index_struct: IndexStruct) -> None:
         """Add index structure to the store."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.transaction() as conn:
             index_data = index_struct.to_dict()
             index_json = json.dumps(index_data)
             
@@ -367,25 +1085,22 @@ class SQLiteIndexStore(BaseIndexStore):
                 INSERT OR REPLACE INTO index_structs (index_id, data, updated_at)
                 VALUES (?, ?, CURRENT_TIMESTAMP)
             """, (index_struct.index_id, index_json))
-            conn.commit()
     
     def delete_index_struct(self, key: str) -> None:
         """Delete index structure by key."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.transaction() as conn:
             conn.execute("DELETE FROM index_structs WHERE index_id = ?", (key,))
-            conn.commit()
     
     def get_index_struct(self, struct_id: Optional[str] = None) -> Optional[IndexStruct]:
         """Get index structure by ID."""
+        conn = self._pool.connection()
         if struct_id is None:
             # Get the first available index struct
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("SELECT data FROM index_structs LIMIT 1")
-                row = cursor.fetchone()
+            cursor = conn.execute("SELECT data FROM index_structs LIMIT 1")
+            row = cursor.fetchone()
         else:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("SELECT data FROM index_structs WHERE index_id = ?", (struct_id,))
-                row = cursor.fetchone()
+            cursor = conn.execute("SELECT data FROM index_structs WHERE index_id = ?", (struct_id,))
+            row = cursor.fetchone()
 
         if row is None:
             return None
@@ -396,24 +1111,30 @@ class SQLiteIndexStore(BaseIndexStore):
             logger.error(f"Failed to deserialize index struct for struct_id: {struct_id}")
         return result
     
+    def _load_index_struct(self, index_data: str) -> Optional[IndexStruct]:
+        """Deserialize a stored index struct, returning None if it cannot be loaded."""
+        result = self._deserialize_index_struct(json.loads(index_data))
+        if result is None:
+            logger.warning("Skipping index struct due to deserialization failure")
+        return result
+
     @property
-    def index_structs(self) -> Dict[str, IndexStruct]:
-        """Get all index structures."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT index_id, data FROM index_structs")
-            structs = {}
-            for row in cursor.fetchall():
-                index_id, index_data = row
-                result = self._deserialize_index_struct(json.loads(index_data))
-                if result is not None:
-                    structs[index_id] = result
-                else:
-                    logger.warning(f"Skipping index struct {index_id} due to deserialization failure")
-            return structs
+    def index_structs(self) -> Mapping:  # type: ignore[override]  # lazy view, not a List copy
+        """Get all index structures as a lazy, SQL-backed mapping."""
+        return SQLiteMappingView(self._pool, "index_structs", "index_id", "data", self._load_index_struct)
     
     def persist(self, persist_path: str = "", fs: Optional[Any] = None) -> None:
         """Persist the store (no-op for SQLite as it's already persistent)."""
         logger.info(f"SQLite index store is already persistent at {self.db_path}")
+
+    def close(self) -> None:
+        """Release this store's reference to the shared connection pool.
+
+        The pool's connections are closed once no other store uses the same database.
+        """
+        if not self._closed:
+            self._closed = True
+            release_connection_pool(self._pool)
     
     @classmethod
     def from_persist_dir(cls, persist_dir: str) -> "SQLiteIndexStore":
@@ -422,19 +1143,19 @@ class SQLiteIndexStore(BaseIndexStore):
         db_path = os.path.join(persist_dir, "index_store.db")
         return cls(db_path)
 
-    # Async methods (delegating to sync methods for simplicity)
+    # Async methods (run the sync versions on the dedicated SQLite I/O threads)
     async def async_add_index_struct(self, index_struct: IndexStruct) -> None:
         """Async version of add_index_struct."""
-        self.add_index_struct(index_struct)
+        await run_in_io_thread(self.add_index_struct, index_struct)
 
     async def adelete_index_struct(self, key: str) -> None:
         """Async version of delete_index_struct."""
-        self.delete_index_struct(key)
+        await run_in_io_thread(self.delete_index_struct, key)
 
     async def aget_index_struct(self, struct_id: Optional[str] = None) -> Optional[IndexStruct]:
         """Async version of get_index_struct."""
-        return self.get_index_struct(struct_id)
+        return await run_in_io_thread(self.get_index_struct, struct_id)
 
     async def async_index_structs(self) -> Dict[str, IndexStruct]:
         """Async version of index_structs property."""
-        return self.index_structs
+        return await run_in_io_thread(lambda: dict(self.index_structs.items()))
@@ -6,22 +6,75 @@ from llama_index.vector_stores.chroma import ChromaVectorStore
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from app.sqlite_stores import SQLiteDocumentStore, SQLiteIndexStore
+from app.sqlite_pool import SQLiteConfig, close_all_pools
+from app.numpy_vector_store import NumpyVectorStore
 
 logger = logging.getLogger(__name__)
 
-def get_storage_context(storage_dir: str = "storage") -> StorageContext:
+VECTOR_STORE_TYPES = ("chroma", "numpy")
+
+# Directory of the memory-mapped NumPy vector store inside the storage directory
+NUMPY_VECTORS_DIR = "numpy_vectors"
+
+
+def _vector_store_type(vector_store_type: Optional[str]) -> str:
+    """Resolve the vector backend: the argument, else the VECTOR_STORE environment variable, else chroma."""
+    vector_store_type = vector_store_type or os.getenv("VECTOR_STORE", "chroma")
+    if vector_store_type not in VECTOR_STORE_TYPES:
+        raise ValueError(f"Unknown vector store {vector_store_type!r}, expected one of {VECTOR_STORE_TYPES}")
+    return vector_store_type
+
+
+def get_storage_context(
+    storage_dir: str = "storage",
+    sqlite_config: Optional[SQLiteConfig] = None,
+    storage_format: Optional[str] = None,
+    vector_store_type: Optional[str] = None,
+) -> StorageContext:
     """
-    Create a storage context using SQLite for docstore/index store and ChromaDB for vector store.
+    Create a storage context using SQLite for docstore/index store and ChromaDB
+    (or the in-process NumPy store) for vectors.
     
     Args:
         storage_dir: Directory to store the databases
+        sqlite_config: Connection pragmas for the SQLite stores (WAL, cache size, mmap, busy timeout)
+        storage_format: Node encoding for the document store, e.g. "json+zlib". Defaults to the
+            format already recorded in the database, or the DOCSTORE_FORMAT environment variable.
+        vector_store_type: "chroma" or "numpy"; defaults to the VECTOR_STORE environment variable,
+            else "chroma"
         
     Returns:
-        StorageContext configured with SQLite and ChromaDB backends
+        StorageContext configured with SQLite and ChromaDB/NumPy backends
     """
     # Ensure storage directory exists
     os.makedirs(storage_dir, exist_ok=True)
-    
+    vector_store_type = _vector_store_type(vector_store_type)
+
+    # Configure SQLite-based document store
+    docstore_path = os.path.join(storage_dir, "docstore.db")
+    docstore = SQLiteDocumentStore(
+        docstore_path,
+        config=sqlite_config,
+        storage_format=storage_format or os.getenv("DOCSTORE_FORMAT"),
+    )
+
+    # Configure SQLite-based index store
+    index_store_path = os.path.join(storage_dir, "index_store.db")
+    index_store = SQLiteIndexStore(index_store_path, config=sqlite_config)
+
+    if vector_store_type == "numpy":
+        numpy_path = os.path.join(storage_dir, NUMPY_VECTORS_DIR)
+        storage_context = StorageContext.from_defaults(
+            vector_store=NumpyVectorStore(numpy_path, docstore=docstore),
+            docstore=docstore,
+            index_store=index_store
+        )
+        logger.info(f"Storage context created with:")
+        logger.info(f"  - NumPy vector store: {numpy_path}")
+        logger.info(f"  - SQLite document store: {docstore_path}")
+        logger.info(f"  - SQLite index store: {index_store_path}")
+        return storage_context
+
     # Configure ChromaDB client
     chroma_db_path = os.path.join(storage_dir, "chroma_db")
     chroma_client = chromadb.PersistentClient(
@@ -44,14 +97,6 @@ def get_storage_context(storage_dir: str = "storage") -> StorageContext:
     # Create ChromaDB vector store
     vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
     
-    # Configure SQLite-based document store
-    docstore_path = os.path.join(storage_dir, "docstore.db")
-    docstore = SQLiteDocumentStore(docstore_path)
-
-    # Configure SQLite-based index store
-    index_store_path = os.path.join(storage_dir, "index_store.db")
-    index_store = SQLiteIndexStore(index_store_path)
-    
     # Create storage context
     storage_context = StorageContext.from_defaults(
         vector_store=vector_store,
@@ -67,12 +112,19 @@ def get_storage_context(storage_dir: str = "storage") -> StorageContext:
     return storage_context
 
 
-def load_storage_context(storage_dir: str = "storage") -> Optional[StorageContext]:
+def load_storage_context(
+    storage_dir: str = "storage",
+    sqlite_config: Optional[SQLiteConfig] = None,
+    vector_store_type: Optional[str] = None,
+) -> Optional[StorageContext]:
     """
-    Load existing storage context from ChromaDB and SQLite stores.
+    Load existing storage context from ChromaDB (or NumPy) and SQLite stores.
 
     Args:
         storage_dir: Directory containing the databases
+        sqlite_config: Connection pragmas for the SQLite stores
+        vector_store_type: "chroma" or "numpy"; defaults to the VECTOR_STORE environment variable,
+            else "chroma"
 
     Returns:
         StorageContext if databases exist, None otherwise
@@ -82,6 +134,25 @@ def load_storage_context(storage_dir: str = "storage") -> Optional[StorageContex
         logger.info(f"Storage directory {storage_dir} does not exist")
         return None
 
+    if _vector_store_type(vector_store_type) == "numpy":
+        numpy_path = os.path.join(storage_dir, NUMPY_VECTORS_DIR)
+        if not os.path.exists(numpy_path):
+            logger.info(f"NumPy vector store {numpy_path} does not exist")
+            return None
+        try:
+            docstore = SQLiteDocumentStore(os.path.join(storage_dir, "docstore.db"), config=sqlite_config)
+            index_store = SQLiteIndexStore(os.path.join(storage_dir, "index_store.db"), config=sqlite_config)
+            storage_context = StorageContext.from_defaults(
+                vector_store=NumpyVectorStore(numpy_path, docstore=docstore),
+                docstore=docstore,
+                index_store=index_store
+            )
+            logger.info(f"Loaded existing storage context from {storage_dir} (NumPy vectors)")
+            return storage_context
+        except Exception as e:
+            logger.error(f"Failed to load storage context: {e}")
+            return None
+
     # Check if ChromaDB directory exists
     chroma_db_path = os.path.join(storage_dir, "chroma_db")
     if not os.path.exists(chroma_db_path):
@@ -107,8 +178,8 @@ def load_storage_context(storage_dir: str = "storage") -> Optional[StorageContex
         docstore_path = os.path.join(storage_dir, "docstore.db")
         index_store_path = os.path.join(storage_dir, "index_store.db")
 
-        docstore = SQLiteDocumentStore(docstore_path)
-        index_store = SQLiteIndexStore(index_store_path)
+        docstore = SQLiteDocumentStore(docstore_path, config=sqlite_config)
+        index_store = SQLiteIndexStore(index_store_path, config=sqlite_config)
 
         # Create storage context
         storage_context = StorageContext.from_defaults(
@@ -125,6 +196,23 @@ def load_storage_context(storage_dir: str = "storage") -> Optional[StorageContex
         return None
 
 
+def close_storage_context(storage_context: Optional[StorageContext] = None) -> None:
+    """
+    Release SQLite connections held by the storage stores.
+
+    Args:
+        storage_context: Storage context whose stores should be closed. When omitted,
+            every shared SQLite connection pool in the process is closed.
+    """
+    if storage_context is None:
+        close_all_pools()
+        return
+
+    for store in (storage_context.docstore, storage_context.index_store):
+        if isinstance(store, (SQLiteDocumentStore, SQLiteIndexStore)):
+            store.close()
+
+
 def migrate_json_to_sqlite(storage_dir: str = "storage") -> bool:
     """
     Migrate existing JSON storage to SQLite.
@@ -135,8 +223,6 @@ def migrate_json_to_sqlite(storage_dir: str = "storage") -> bool:
     Returns:
         True if migration was successful, False otherwise
     """
-    import json
-    import sqlite3
     from llama_index.core.storage.docstore import SimpleDocumentStore
     from llama_index.core.storage.index_store import SimpleIndexStore
 
@@ -167,15 +253,13 @@ def migrate_json_to_sqlite(storage_dir: str = "storage") -> bool:
             # Migrate ref doc info
             ref_doc_info = json_docstore.get_all_ref_doc_info()
             if ref_doc_info:
-                with sqlite3.connect(docstore_db_path) as conn:
-                    for ref_doc_id, info in ref_doc_info.items():
-                        node_ids_json = json.dumps(info.get("node_ids", []))
-                        metadata_json = json.dumps(info.get("metadata", {}))
-                        conn.execute("""
-                            INSERT OR REPLACE INTO ref_doc_info (ref_doc_id, node_ids, metadata)
-                            VALUES (?, ?, ?)
-                        """, (ref_doc_id, node_ids_json, metadata_json))
-                    conn.commit()
+                for ref_doc_id, info in ref_doc_info.items():
+                    # SimpleDocumentStore returns RefDocInfo objects, older dumps plain dicts
+                    if isinstance(info, dict):
+                        node_ids, metadata = info.get("node_ids", []), info.get("metadata", {})
+                    else:
+                        node_ids, metadata = info.node_ids, info.metadata
+                    sqlite_docstore.set_ref_doc_info(ref_doc_id, node_ids, metadata)
                 logger.info(f"Migrated {len(ref_doc_info)} reference documents to SQLite")
 
         # Migrate index store
@@ -2,25 +2,101 @@
 流式响应处理模块
 使用 sse-starlette 来优化大模型返回信息的处理
 """
+import re
 import json
 import asyncio
 import logging
-from typing import AsyncGenerator, Dict, Any, Optional
+from typing import AsyncGenerator, Callable, Dict, Any, Optional
 from sse_starlette import EventSourceResponse, ServerSentEvent
+from starlette.background import BackgroundTask
+from llama_index.core.agent.workflow import AgentStream, ToolCallResult
+from llama_index.core.workflow.errors import WorkflowCancelledByUser
+from llama_index.core.workflow.handler import WorkflowHandler
+
+from app.admission import Admission, Overloaded
+from app.citations import CitationsEvent, CitedAnswer
 
 logger = logging.getLogger("uvicorn")
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Cache-Control"
+}
+
+
+# 生成过程中检测客户端断开的间隔（秒）
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# 工作流流式请求计数（/api/metrics）
+_stream_stats = {"started": 0, "completed": 0, "cancelled": 0, "failed": 0}
+
+# 正在执行的取消任务，保留引用避免被回收
+_cancel_tasks = set()
+
+
+def stream_stats() -> Dict[str, int]:
+    """返回工作流流式请求的计数"""
+    return dict(_stream_stats)
+
+
+def _cancel_workflow(handler: WorkflowHandler) -> bool:
+    """
+    停止仍在运行的工作流（步骤任务被取消，进行中的 LLM/嵌入请求随之中断）
+
+    只做同步调度，可以在已被取消的任务中调用
+
+    Returns:
+        工作流是否仍在运行并被取消
+    """
+    if handler.done():
+        return False
+    task = asyncio.get_running_loop().create_task(handler.cancel_run())
+    _cancel_tasks.add(task)
+    task.add_done_callback(_cancel_tasks.discard)
+    # 取走工作流的 WorkflowCancelledByUser 异常，避免 "exception was never retrieved"
+    handler.add_done_callback(lambda future: future.cancelled() or future.exception())
+    return True
+
+
+async def _cancel_on_disconnect(handler: WorkflowHandler, request) -> None:
+    """与生成过程并行检测客户端断开，断开后立即取消工作流"""
+    while not handler.done():
+        if await request.is_disconnected():
+            if _cancel_workflow(handler):
+                _stream_stats["cancelled"] += 1
+                logger.info("Client disconnected, cancelled workflow")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """构造一条SSE消息"""
+    return {
+        "data": json.dumps(data, ensure_ascii=False),
+        "event": event
+    }
+
 
 class StreamingResponseProcessor:
     """流式响应处理器"""
     
-    def __init__(self):
+    def __init__(self, annotate_citations: bool = False):
+        """
+        Args:
+            annotate_citations: 是否在服务端将流式文本中的 "Source N:" 标注为引用数字HTML
+        """
         self.citation_data = {}
+        self.source_nodes = []
+        self.annotate_citations = annotate_citations
     
     async def process_streaming_response(
         self, 
         response_text: str, 
-        request=None
+        request=None,
+        citation_data: Optional[Dict[str, Any]] = None,
+        chunk_delay: float = 0.05
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         处理流式响应，将大文本分块发送
@@ -28,14 +104,14 @@ class StreamingResponseProcessor:
         Args:
             response_text: 完整的响应文本
             request: FastAPI请求对象（用于检测客户端断开连接）
+            citation_data: 引用数据（如 CitedAnswer.citations），在文本之前发送
+            chunk_delay: 文本块之间的延迟（秒），模拟流式效果；为 0 时整段文本在一个块中立即发送
         
         Yields:
             包含数据的字典，用于SSE传输
         """
         try:
-            # 解析引用数据
-            citation_data = self._extract_citation_data(response_text)
-            clean_text = self._clean_response_text(response_text)
+            clean_text = response_text.strip()
             
             # 首先发送引用数据
             if citation_data:
@@ -46,10 +122,11 @@ class StreamingResponseProcessor:
                     }, ensure_ascii=False),
                     "event": "citation_data"
                 }
-                await asyncio.sleep(0.01)  # 小延迟确保顺序
+                if chunk_delay:
+                    await asyncio.sleep(0.01)  # 小延迟确保顺序
             
-            # 将文本分块发送
-            chunk_size = 100  # 每块字符数
+            # 将文本分块发送（不模拟流式时整段发送）
+            chunk_size = 100 if chunk_delay else max(len(clean_text), 1)  # 每块字符数
             text_chunks = self._split_text_into_chunks(clean_text, chunk_size)
             
             for i, chunk in enumerate(text_chunks):
@@ -69,7 +146,8 @@ class StreamingResponseProcessor:
                 }
                 
                 # 添加小延迟模拟流式效果
-                await asyncio.sleep(0.05)
+                if chunk_delay:
+                    await asyncio.sleep(chunk_delay)
             
             # 发送完成信号
             yield {
@@ -90,32 +168,167 @@ class StreamingResponseProcessor:
                 "event": "error"
             }
     
-    def _extract_citation_data(self, response_text: str) -> Dict[str, Any]:
-        """从响应文本中提取引用数据"""
-        import re
-        
-        # 查找引用数据注释
-        citation_pattern = r'<!-- CITATION_DATA:\s*(.*?)\s*-->'
-        match = re.search(citation_pattern, response_text, re.DOTALL)
-        
-        if match:
+    async def process_workflow_events(
+        self,
+        handler: WorkflowHandler,
+        request=None,
+        on_answer: Optional[Callable[[CitedAnswer], None]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        边生成边发送：将工作流的 AgentStream 增量转发为 text_chunk，
+        检索完成后（合成回答之前）立即发送工具写入的 CitationsEvent 中的引用数据；
+        工具未写入时退回到工具输出 CitedAnswer 中的引用（无需解析文本）
+
+        客户端断开时（轮询 request.is_disconnected()，或 SSE 任务被取消）
+        取消工作流，不再为无人接收的回答调用 LLM
+
+        Args:
+            handler: workflow.run() 返回的 WorkflowHandler
+            request: FastAPI请求对象（用于检测客户端断开连接）
+            on_answer: 工作流完成后以最终回答（未标注的文本及引用）调用，用于缓存回答
+
+        Yields:
+            包含数据的字典，用于SSE传输
+        """
+        annotator = CitationAnnotator() if self.annotate_citations else None
+        chunk_index = 0
+        text_parts = []
+        # SSE 任务因客户端断开被取消（或生成器被关闭）
+        closed_by_client = False
+        _stream_stats["started"] += 1
+        watcher = asyncio.create_task(_cancel_on_disconnect(handler, request)) if request else None
+        try:
+            async for event in handler.stream_events():
+                citations = None
+                if isinstance(event, CitationsEvent):
+                    citations = event.citations
+                elif isinstance(event, ToolCallResult):
+                    answer = event.tool_output.raw_output
+                    if isinstance(answer, CitedAnswer):
+                        citations = answer.citations
+                        self.source_nodes.extend(answer.source_nodes)
+                if citations:
+                    # 同一批引用已随 CitationsEvent 发送过时，不再重复发送
+                    if not citations.keys() <= self.citation_data.keys():
+                        self.citation_data.update(citations)
+                        if annotator:
+                            annotator.update(self.citation_data)
+                        yield _sse("citation_data", {
+                            "type": "citations",
+                            "citations": self.citation_data
+                        })
+                elif isinstance(event, AgentStream) and event.delta:
+                    text_parts.append(event.delta)
+                    chunk = annotator.feed(event.delta) if annotator else event.delta
+                    if chunk:
+                        yield _sse("text_chunk", {
+                            "type": "text_chunk",
+                            "chunk": chunk,
+                            "chunk_index": chunk_index,
+                            "is_final": False
+                        })
+                        chunk_index += 1
+
+            result = await handler
+            chunk = annotator.flush() if annotator else ""
+            if chunk_index == 0 and not chunk:
+                # LLM 未以流式返回时，退回到最终结果
+                chunk = str(result).strip()
+                text_parts = [chunk]
+                if annotator:
+                    chunk = annotator.feed(chunk) + annotator.flush()
+            yield _sse("text_chunk", {
+                "type": "text_chunk",
+                "chunk": chunk,
+                "chunk_index": chunk_index,
+                "is_final": True
+            })
+
+            yield _sse("complete", {
+                "type": "complete",
+                "message": "Response complete"
+            })
+            _stream_stats["completed"] += 1
+            if on_answer is not None:
+                on_answer(CitedAnswer(
+                    text="".join(text_parts).strip(),
+                    citations=dict(self.citation_data),
+                    source_nodes=list(self.source_nodes),
+                ))
+
+        except WorkflowCancelledByUser:
+            logger.info("Workflow cancelled, stopping stream")
+        except (asyncio.CancelledError, GeneratorExit):
+            closed_by_client = True
+            raise
+        except Exception as e:
+            logger.error(f"Error in streaming response: {e}")
+            _stream_stats["failed"] += 1
+            yield _sse("error", {
+                "type": "error",
+                "error": str(e)
+            })
+        finally:
+            if watcher:
+                watcher.cancel()
+            # 提前退出时工作流可能仍在运行；只有客户端断开导致的取消计入 cancelled
+            if _cancel_workflow(handler) and closed_by_client:
+                _stream_stats["cancelled"] += 1
+                logger.info("Stream closed before the workflow finished, cancelled workflow")
+
+    async def process_queued_workflow(
+        self,
+        run_workflow: Callable[[], WorkflowHandler],
+        admission: Optional[Admission] = None,
+        request=None,
+        on_answer: Optional[Callable[[CitedAnswer], None]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        排队等待执行名额，期间发送 queued 事件（排队位置变化时），
+        获得名额后启动工作流并转发其事件，结束或客户端断开时归还名额
+
+        Args:
+            run_workflow: 启动工作流并返回 WorkflowHandler 的函数
+            admission: AdmissionController.enter() 返回的名额（None 表示不限流）
+            request: FastAPI请求对象（用于检测客户端断开连接）
+            on_answer: 工作流完成后以最终回答调用
+
+        Yields:
+            包含数据的字典，用于SSE传输
+        """
+        try:
+            if admission is not None:
+                try:
+                    async for position in admission.wait():
+                        yield _sse("queued", {
+                            "type": "queued",
+                            "position": position
+                        })
+                except Overloaded as e:
+                    logger.warning(f"Request shed while queued: {e}")
+                    yield _sse("error", {
+                        "type": "error",
+                        "error": str(e),
+                        "retry_after": e.retry_after
+                    })
+                    return
+
             try:
-                citation_json_str = match.group(1)
-                return json.loads(citation_json_str)
-            except json.JSONDecodeError as e:
-                logger.warning(f"Failed to parse citation data: {e}")
-                return {}
-        
-        return {}
-    
-    def _clean_response_text(self, response_text: str) -> str:
-        """清理响应文本，移除引用数据注释"""
-        import re
-        
-        # 移除引用数据注释
-        clean_text = re.sub(r'<!-- CITATION_DATA:.*?-->', '', response_text, flags=re.DOTALL)
-        return clean_text.strip()
-    
+                handler = run_workflow()
+            except Exception as e:
+                logger.error(f"Error starting workflow: {e}")
+                yield _sse("error", {
+                    "type": "error",
+                    "error": str(e)
+                })
+                return
+
+            async for data in self.process_workflow_events(handler, request, on_answer):
+                yield data
+        finally:
+            if admission is not None:
+                admission.release()
+
     def _split_text_into_chunks(self, text: str, chunk_size: int) -> list:
         """将文本分割成指定大小的块"""
         chunks = []
@@ -126,7 +339,9 @@ class StreamingResponseProcessor:
 
 async def create_streaming_response(
     response_text: str, 
-    request=None
+    request=None,
+    citation_data: Optional[Dict[str, Any]] = None,
+    chunk_delay: float = 0.05
 ) -> EventSourceResponse:
     """
     创建流式SSE响应
@@ -134,6 +349,8 @@ async def create_streaming_response(
     Args:
         response_text: 完整的响应文本
         request: FastAPI请求对象
+        citation_data: 随响应发送的引用数据
+        chunk_delay: 文本块之间的延迟（秒），为 0 时整段文本立即发送（如缓存的回答）
     
     Returns:
         EventSourceResponse对象
@@ -141,7 +358,7 @@ async def create_streaming_response(
     processor = StreamingResponseProcessor()
     
     async def event_generator():
-        async for data in processor.process_streaming_response(response_text, request):
+        async for data in processor.process_streaming_response(response_text, request, citation_data, chunk_delay):
             yield ServerSentEvent(
                 data=data["data"],
                 event=data["event"]
@@ -150,52 +367,127 @@ async def create_streaming_response(
     return EventSourceResponse(
         event_generator(),
         ping=15,  # 每15秒发送ping
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Cache-Control"
-        }
+        headers=SSE_HEADERS
     )
 
 
-def process_citation_text(text: str, citations: Dict[str, Any]) -> str:
+async def create_workflow_streaming_response(
+    run_workflow: Callable[[], WorkflowHandler],
+    request=None,
+    annotate_citations: bool = False,
+    admission: Optional[Admission] = None,
+    on_answer: Optional[Callable[[CitedAnswer], None]] = None
+) -> EventSourceResponse:
     """
-    处理文本中的引用标记，替换为带有排名的引用数字
-    
+    创建随LLM生成实时推送的SSE响应
+
     Args:
-        text: 原始文本
-        citations: 引用数据字典
-    
+        run_workflow: 启动工作流并返回 WorkflowHandler 的函数（获得执行名额后调用）
+        request: FastAPI请求对象
+        annotate_citations: 是否发送已标注引用数字的HTML文本块
+        admission: 执行名额，排队时先发送 queued 事件
+        on_answer: 工作流完成后以最终回答调用（用于缓存回答）
+
     Returns:
-        处理后的HTML文本
+        EventSourceResponse对象
     """
-    import re
-    
-    # 创建引用映射（按排名排序）
-    citation_map = {}
+    processor = StreamingResponseProcessor(annotate_citations)
+
+    async def event_generator():
+        async for data in processor.process_queued_workflow(run_workflow, admission, request, on_answer):
+            yield ServerSentEvent(
+                data=data["data"],
+                event=data["event"]
+            )
+
+    return EventSourceResponse(
+        event_generator(),
+        ping=15,  # 每15秒发送ping
+        headers=SSE_HEADERS,
+        # 生成器未启动客户端就已断开时，也要归还名额（release 可重复调用）
+        background=BackgroundTask(admission.release) if admission else None
+    )
+
+
+# "Source N:" 引用标记
+_SOURCE_PATTERN = re.compile(r'Source (\d+):')
+
+# 文本末尾可能是未完成引用标记的部分（"S" ... "Source 12"）
+_PARTIAL_SOURCE = re.compile(r'(?:Source \d*|S(?:o(?:u(?:r(?:c(?:e)?)?)?)?)?)\Z')
+
+
+def _citation_map(citations: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """按排名建立引用映射"""
+    citation_map: Dict[int, Dict[str, Any]] = {}
     for node_id, data in citations.items():
         rank = data.get("rank", 1)
         citation_map[rank] = {
             "node_id": node_id,
             "filename": data.get("filename", "未知文档"),
-            "content": data.get("content", ""),
+            "snippet": data.get("snippet", ""),
             "similarity_score": data.get("similarity_score", 0.0)
         }
-    
-    # 查找所有的Source引用模式
-    source_pattern = r'Source (\d+):'
-    
-    def replace_source(match):
+    return citation_map
+
+
+class CitationAnnotator:
+    """
+    增量引用标注器：逐段接收流式文本，将 "Source N:" 替换为带排名的引用数字
+
+    标记可能被拆分在两个文本块之间，因此只保留可能是未完成标记的最短后缀，
+    其余文本立即输出。每段文本只扫描一次，总耗时与文本长度成线性。
+    """
+
+    def __init__(self, citations: Optional[Dict[str, Any]] = None):
+        self._buffer = ""
+        self._citation_map: Dict[int, Dict[str, Any]] = {}
+        self.update(citations or {})
+
+    def update(self, citations: Dict[str, Any]) -> None:
+        """更新引用数据（之后输出的标记按新数据替换）"""
+        self._citation_map = _citation_map(citations)
+
+    def feed(self, text: str) -> str:
+        """
+        接收一段文本，返回可以确定的已标注文本
+
+        Args:
+            text: 新的文本增量
+
+        Returns:
+            标注后的HTML文本（可能为空）
+        """
+        self._buffer += text
+        pending = _PARTIAL_SOURCE.search(self._buffer)
+        cut = pending.start() if pending else len(self._buffer)
+        ready, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return _SOURCE_PATTERN.sub(self._replace_source, ready)
+
+    def flush(self) -> str:
+        """文本结束时输出保留的后缀"""
+        text, self._buffer = self._buffer, ""
+        return _SOURCE_PATTERN.sub(self._replace_source, text)
+
+    def _replace_source(self, match: re.Match) -> str:
         source_num = int(match.group(1))
-        if source_num in citation_map:
-            citation_info = citation_map[source_num]
+        if source_num in self._citation_map:
+            citation_info = self._citation_map[source_num]
             # 创建引用HTML
             citation_data = json.dumps(citation_info).replace('"', '&quot;')
             return f'<span class="citation-number" data-rank="{source_num}" data-citation="{citation_data}">{source_num}</span>'
         return match.group(0)
+
+
+def process_citation_text(text: str, citations: Dict[str, Any]) -> str:
+    """
+    处理文本中的引用标记，替换为带有排名的引用数字
     
-    # 替换所有Source引用
-    processed_text = re.sub(source_pattern, replace_source, text)
+    Args:
+        text: 原始文本
+        citations: 引用数据字典
     
-    return processed_text
+    Returns:
+        处理后的HTML文本
+    """
+    annotator = CitationAnnotator(citations)
+    return annotator.feed(text) + annotator.flush()
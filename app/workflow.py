@@ -1,91 +1,170 @@
-from typing import Optional
-import json
-
-from app.index import get_index
+from typing import Any, List, Optional, Tuple
+import os
+import threading
+
+from app.answer_cache import get_answer_cache
+from app.citations import CitationsEvent, CitedAnswer, citations_from_nodes
+from app.hybrid_retriever import HybridRetriever
+from app.sqlite_stores import SQLiteDocumentStore
+from app.index import aget_index, get_index, get_index_version
 from llama_index.core.agent.workflow import AgentWorkflow
 from llama_index.core.settings import Settings
 from llama_index.server.api.models import ChatRequest
 from llama_index.core.query_engine import CitationQueryEngine
+from llama_index.core.schema import QueryBundle
 from llama_index.core.tools import FunctionTool
+from llama_index.core.workflow import Context
+
+
+# Workflow built for the currently loaded index, shared by all requests.
+# AgentWorkflow keeps per-run state in the Context created by each run() call,
+# and the query engine and tool hold no request data, so one instance is reused.
+_workflow: Optional[AgentWorkflow] = None
+_workflow_index = None
+_workflow_lock = threading.Lock()
 
 
 def create_workflow(chat_request: Optional[ChatRequest] = None) -> AgentWorkflow:
-    index = get_index(chat_request=chat_request)
+    return _workflow_for_index(get_index(chat_request=chat_request))
+
+
+async def acreate_workflow(chat_request: Optional[ChatRequest] = None) -> AgentWorkflow:
+    """Async version of create_workflow that reloads a changed index off the event loop."""
+    return _workflow_for_index(await aget_index(chat_request=chat_request))
+
+
+def _workflow_for_index(index) -> AgentWorkflow:
+    global _workflow, _workflow_index
+
     if index is None:
         raise RuntimeError(
             "Index not found! Please run `uv run generate` to index the data first."
         )
 
+    # Rebuild only when the index was (re)loaded
+    if _workflow is not None and _workflow_index is index:
+        return _workflow
+    with _workflow_lock:
+        if _workflow is None or _workflow_index is not index:
+            _workflow, _workflow_index = build_workflow(index), index
+        return _workflow
+
+
+# (question embedding, index version) an answer is cached under
+AnswerKey = Tuple[List[float], Any]
+
+
+async def alookup_answer(question: str) -> Tuple[Optional[CitedAnswer], Optional[AnswerKey]]:
+    """Look up a cached answer before running the agent, skipping its LLM calls on a hit.
+
+    Args:
+        question: The user's message
+
+    Returns:
+        ``(answer, key)``: the cached answer or None, and the key to cache the
+        new answer under with ``cache_answer`` (None if caching is disabled)
+    """
+    answer_cache = get_answer_cache()
+    if answer_cache is None:
+        return None, None
+    key = (await Settings.embed_model.aget_query_embedding(question), get_index_version())
+    return answer_cache.get(*key), key
+
+
+def cache_answer(key: AnswerKey, answer: CitedAnswer) -> None:
+    """Cache the agent's final answer to a question looked up with ``alookup_answer``."""
+    answer_cache = get_answer_cache()
+    if answer_cache is not None and answer.citations:
+        answer_cache.put(key[0], key[1], answer)
+
+
+def build_workflow(index) -> AgentWorkflow:
+    """Build the agent workflow, citation query engine and tool for an index."""
+    # Fuse vector search with the docstore's full-text index (RETRIEVAL_MODE=vector disables it)
+    retriever = None
+    if os.getenv("RETRIEVAL_MODE", "hybrid") == "hybrid" and isinstance(index.docstore, SQLiteDocumentStore):
+        retriever = HybridRetriever(index, index.docstore, similarity_top_k=3)
+
     # Create a CitationQueryEngine that generates single responses with citations
     citation_query_engine = CitationQueryEngine.from_args(
         index,
+        retriever=retriever,
         similarity_top_k=3,  # Retrieve top 3 relevant chunks
         citation_chunk_size=1024,  # Larger chunks for better context
     )
 
-    # Create a custom tool function that uses the citation query engine
-    def query_with_citations(input: str) -> str:
+    # Answers are reused for near-identical questions until the index changes
+    answer_cache = get_answer_cache()
+    index_version = get_index_version()
+
+    # Create a custom tool function that uses the citation query engine.
+    # The LLM sees only the answer text; citations reach the SSE layer as soon
+    # as retrieval completes, through a CitationsEvent written to the workflow
+    # stream, and again in the tool output's raw_output (see app/citations.py).
+    def to_answer(response, query_embedding) -> CitedAnswer:
+        source_nodes = response.source_nodes or []
+        answer = CitedAnswer(
+            text=str(response),
+            citations=citations_from_nodes(source_nodes),
+            source_nodes=source_nodes,
+        )
+        if answer.citations and answer_cache is not None:
+            answer_cache.put(query_embedding, index_version, answer)
+        return answer
+
+    def send_citations(ctx: Context, citations) -> None:
+        if citations:
+            ctx.write_event_to_stream(CitationsEvent(citations=citations))
+
+    # CitationQueryEngine.query split at the point where the citation chunks are
+    # known, so their citations are sent before the synthesis LLM call.
+    def retrieve_and_synthesize(ctx: Context, query_bundle: QueryBundle):
+        nodes = citation_query_engine._create_citation_nodes(citation_query_engine.retrieve(query_bundle))
+        send_citations(ctx, citations_from_nodes(nodes))
+        return citation_query_engine._response_synthesizer.synthesize(query=query_bundle, nodes=nodes)
+
+    async def aretrieve_and_synthesize(ctx: Context, query_bundle: QueryBundle):
+        nodes = citation_query_engine._create_citation_nodes(await citation_query_engine.aretrieve(query_bundle))
+        send_citations(ctx, citations_from_nodes(nodes))
+        return await citation_query_engine._response_synthesizer.asynthesize(query=query_bundle, nodes=nodes)
+
+    # Callers that cannot look up the answer before running the agent (e.g.
+    # /api/chat) still skip retrieval and synthesis on a hit here.
+    def query_with_citations(ctx: Context, input: str) -> CitedAnswer:
         """Query the knowledge base and return an answer with citations."""
-        response = citation_query_engine.query(input)
-
-        # Extract citation information from source nodes
-        citation_data = {}
-        if hasattr(response, 'source_nodes') and response.source_nodes:
-            for i, node in enumerate(response.source_nodes):
-                # Get node ID for citation mapping
-                node_id = node.node_id if hasattr(node, 'node_id') else str(i)
-
-                # Extract filename from metadata
-                filename = "未知文档"
-                if hasattr(node, 'metadata') and node.metadata:
-                    filename = node.metadata.get('file_name',
-                              node.metadata.get('filename',
-                              node.metadata.get('source', '未知文档')))
-
-                # Get similarity score
-                similarity_score = 0.0
-                if hasattr(node, 'score') and node.score is not None:
-                    similarity_score = float(node.score)
-
-                # Get document content (保留完整内容)
-                content = ""
-                if hasattr(node, 'text') and node.text:
-                    content = node.text
-                elif hasattr(node, 'get_content') and callable(node.get_content):
-                    content = node.get_content()
-
-                citation_data[node_id] = {
-                    "rank": i + 1,
-                    "filename": filename,
-                    "content": content,
-                    "similarity_score": similarity_score
-                }
-
-        # Convert response to string and append citation metadata
-        response_text = str(response)
-
-        # Add citation metadata as a JSON comment at the end
-        if citation_data:
-            # Clean the content to avoid JSON parsing issues (保留完整内容)
-            cleaned_citation_data = {}
-            for node_id, data in citation_data.items():
-                # 保留完整内容，只清理特殊字符
-                clean_content = data["content"].replace('\r', '').replace('\n', ' ').replace('"', '\\"')
-                cleaned_citation_data[node_id] = {
-                    "rank": data["rank"],
-                    "filename": data["filename"],
-                    "content": clean_content,
-                    "similarity_score": data["similarity_score"]
-                }
-
-            citation_json = json.dumps(cleaned_citation_data, ensure_ascii=False, indent=2)
-            response_text += f"\n\n<!-- CITATION_DATA: {citation_json} -->"
-
-        return response_text
+        query_embedding = None
+        if answer_cache is not None:
+            query_embedding = Settings.embed_model.get_query_embedding(input)
+            cached_answer = answer_cache.get(query_embedding, index_version)
+            if cached_answer is not None:
+                send_citations(ctx, cached_answer.citations)
+                return cached_answer
+
+        # Retrieval reuses the lookup's embedding; without the cache it embeds
+        # only when needed (the hybrid retriever's lexical fast path does not)
+        query_bundle = QueryBundle(input, embedding=query_embedding)
+        return to_answer(retrieve_and_synthesize(ctx, query_bundle), query_embedding)
+
+    # Used by the agent workflow. Runs on the event loop, so cancelling the
+    # workflow (e.g. when the SSE client disconnects) also cancels the
+    # embedding and LLM requests in flight.
+    async def aquery_with_citations(ctx: Context, input: str) -> CitedAnswer:
+        """Query the knowledge base and return an answer with citations."""
+        query_embedding = None
+        if answer_cache is not None:
+            query_embedding = await Settings.embed_model.aget_query_embedding(input)
+            cached_answer = answer_cache.get(query_embedding, index_version)
+            if cached_answer is not None:
+                send_citations(ctx, cached_answer.citations)
+                return cached_answer
+
+        query_bundle = QueryBundle(input, embedding=query_embedding)
+        return to_answer(await aretrieve_and_synthesize(ctx, query_bundle), query_embedding)
 
     # Create a function tool from our custom function
     query_tool = FunctionTool.from_defaults(
         fn=query_with_citations,
+        async_fn=aquery_with_citations,
         name="query_index",
         description="Query the knowledge base to answer questions about financial topics with citations."
     )
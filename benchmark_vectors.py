@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Recall / latency / memory report for the NumPy vector store precisions.
+
+Builds a temporary store per configuration (float32, float16, int8, with and
+without full-precision rescoring, and searching a Matryoshka prefix of the
+vectors) from the same vectors and compares its top-k against exact float32
+search. Vectors come from an existing store
+(storage/numpy_vectors) when present, otherwise from synthetic clustered data.
+No API calls are made.
+
+Usage: uv run python benchmark_vectors.py [--rows N] [--dim N] [--prefix N] [--queries N] [--k N] [--store DIR]
+"""
+import os
+import time
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+from app.numpy_vector_store import FULL_FILE, VECTORS_FILE, NumpyVectorStore, normalize_rows
+
+# (dtype, rescore factor, search on the --prefix dimensions)
+CONFIGS = (
+    ("float32", 0, False),
+    ("float16", 0, False),
+    ("float16", 4, False),
+    ("int8", 0, False),
+    ("int8", 4, False),
+    ("float32", 0, True),
+    ("float32", 10, True),
+    ("int8", 10, True),
+)
+
+
+def _load_vectors(store_dir: str, rows: int, dim: int, seed: int) -> np.ndarray:
+    for name in (FULL_FILE, VECTORS_FILE):
+        path = os.path.join(store_dir, name)
+        if os.path.exists(path):
+            vectors = np.load(path, mmap_mode="r")
+            if vectors.dtype == np.float32:
+                print(f"Using {min(rows, len(vectors))} vectors from {path}")
+                return normalize_rows(np.asarray(vectors[:rows]))
+
+    # Clustered data resembles real embeddings better than uniform noise. Variance
+    # decays along the dimensions, as in Matryoshka-trained embeddings whose
+    # leading dimensions carry most of the information.
+    print(f"Using {rows} synthetic vectors of dimension {dim}")
+    rng = np.random.default_rng(seed)
+    spectrum = (1.0 / np.sqrt(1.0 + np.arange(dim) / 64.0)).astype(np.float32)
+    centers = rng.standard_normal((max(rows // 50, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), rows)]
+    vectors += 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return normalize_rows(vectors * spectrum)
+
+
+def benchmark_vectors():
+    parser = argparse.ArgumentParser(prog="benchmark_vectors")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--prefix", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--store", default=os.path.join("storage", "numpy_vectors"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = _load_vectors(args.store, args.rows, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    # Queries near stored vectors, like questions close to a chunk
+    picks = rng.integers(0, len(vectors), args.queries)
+    queries = normalize_rows(vectors[picks] + 0.05 * rng.standard_normal((args.queries, vectors.shape[1])))
+    queries = queries.astype(np.float32)
+    exact = [set(np.argsort(-(vectors @ query))[:args.k]) for query in queries]
+    ids = [str(i) for i in range(len(vectors))]
+
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {args.queries} queries, recall@{args.k}")
+    print(f"{'config':<28}{'search MB':>10}{'rescore MB':>12}{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for dtype, rescore_factor, prefix in CONFIGS:
+        prefix_dims = args.prefix if prefix else 0
+        with tempfile.TemporaryDirectory() as tmp:
+            store = NumpyVectorStore(
+                tmp, docstore=None, dtype=dtype, rescore_factor=rescore_factor, prefix_dims=prefix_dims
+            )
+            for start in range(0, len(vectors), 4096):
+                end = start + 4096
+                store.add_vectors(ids[start:end], [""] * len(ids[start:end]), vectors[start:end])
+
+            hits, timings = 0, []
+            store.search(queries[0], args.k)  # map the files
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                results = store.search(query, args.k)
+                timings.append((time.perf_counter() - start) * 1000)
+                hits += len(expected & {int(node_id) for node_id, _ in results})
+
+            stats = store.memory_stats()
+            timings.sort()
+            label = dtype + (f"/{prefix_dims}d" if prefix_dims else "")
+            label += f" +rescore x{rescore_factor}" if rescore_factor else ""
+            print(
+                f"{label:<28}{stats['search_bytes'] / 2**20:>10.1f}{stats['rescore_bytes'] / 2**20:>12.1f}"
+                f"{hits / (args.k * args.queries):>8.3f}{statistics.median(timings):>9.2f}"
+                f"{timings[int(len(timings) * 0.95) - 1]:>9.2f}"
+            )
+    print("search MB is resident per worker (shared page cache); rescore MB stays on disk, "
+          "only k x factor rows are read per query")
+
+
+if __name__ == "__main__":
+    benchmark_vectors()
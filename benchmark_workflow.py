@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of per-request workflow construction.
+
+Compares building the citation query engine, tool and AgentWorkflow for every
+request (previous behaviour) with reusing the cached workflow. No LLM or
+embedding calls are made; requires an index generated with `uv run generate`.
+
+Usage: uv run python benchmark_workflow.py [iterations]
+"""
+import sys
+import time
+import logging
+import statistics
+
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def _time_calls(fn, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(label: str, timings: list) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+    print(f"{label:<32} p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def benchmark_workflow(iterations: int = 200):
+    load_dotenv()
+
+    from app.settings import init_settings
+    init_settings()
+
+    from app import index as index_module
+    from app.workflow import build_workflow, create_workflow
+
+    # Cold start: load the index and build the workflow once
+    start = time.perf_counter()
+    create_workflow()
+    print(f"Initial index load + workflow build: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    index = index_module.get_index()
+    if index is None:
+        raise RuntimeError("Index not found! Please run `uv run generate` first.")
+
+    rebuild = _time_calls(lambda: build_workflow(index), iterations)
+    reload_all = _time_calls(
+        lambda: build_workflow(index_module._load_index()), max(iterations // 10, 5)
+    )
+    cached = _time_calls(create_workflow, iterations)
+
+    print(f"Per-request construction overhead ({iterations} iterations):")
+    _report("before: load index + build", reload_all)
+    _report("build workflow only", rebuild)
+    _report("after: cached workflow", cached)
+
+
+if __name__ == "__main__":
+    benchmark_workflow(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
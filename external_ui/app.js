@@ -122,7 +122,7 @@ const ChatApp = {
                                         {{ formatFilename(citation.filename) }}
                                     </div>
                                     <div class="text-xs text-gray-600 line-clamp-3">
-                                        {{ citation.content.replace(/^Source \d+: /, '').substring(0, 150) }}...
+                                        {{ citation.snippet }}...
                                     </div>
                                 </div>
                             </div>
@@ -372,6 +372,25 @@ const ChatApp = {
           }
         });
 
+        // 服务器繁忙时请求先排队，显示排队位置，开始生成后被正文替换
+        eventSource.addEventListener("queued", (event) => {
+          try {
+            const data = JSON.parse(event.data);
+            if (currentBotMessage) {
+              const messageIndex = messages.value.findIndex(
+                (m) => m.id === currentBotMessage.id
+              );
+              if (messageIndex !== -1) {
+                messages.value[messageIndex].content = `排队中，前面还有 ${
+                  data.position - 1
+                } 个请求…`;
+              }
+            }
+          } catch (e) {
+            console.error("解析排队信息失败:", e);
+          }
+        });
+
         eventSource.addEventListener("text_chunk", (event) => {
           try {
             const data = JSON.parse(event.data);
@@ -553,7 +572,13 @@ const ChatApp = {
       tooltip.similarity = window.citationProcessor.formatSimilarityScore(
         citation.similarity_score
       );
-      tooltip.content = citation.content.replace(/^Source \d+: /, "");
+      // SSE 只包含摘要，完整内容按需从 /api/citations 获取
+      tooltip.content = citation.snippet + "...";
+      window.citationProcessor.fetchCitationContent(citation).then((content) => {
+        if (tooltip.show && tooltip.rank === rank) {
+          tooltip.content = content;
+        }
+      });
     };
 
     const hideCitationTooltip = () => {
@@ -4,6 +4,37 @@
 class CitationProcessor {
   constructor() {
     this.citationData = {};
+    // 完整引用内容缓存（node_id -> Promise<string>）
+    this.contentCache = new Map();
+  }
+
+  /**
+   * 按需获取引用块的完整内容（SSE 只包含摘要）
+   * @param {object} citation - 引用数据（含 node_id 和 snippet）
+   * @returns {Promise<string>} 完整内容，请求失败时退回摘要
+   */
+  fetchCitationContent(citation) {
+    const nodeId = citation.node_id;
+    if (!nodeId) {
+      return Promise.resolve(citation.snippet || "");
+    }
+    if (!this.contentCache.has(nodeId)) {
+      const request = fetch(`/api/citations/${encodeURIComponent(nodeId)}`)
+        .then((response) => {
+          if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+          }
+          return response.json();
+        })
+        .then((data) => data.content)
+        .catch((error) => {
+          console.warn("获取引用内容失败:", error);
+          this.contentCache.delete(nodeId);
+          return citation.snippet || "";
+        });
+      this.contentCache.set(nodeId, request);
+    }
+    return this.contentCache.get(nodeId);
   }
 
   /**
@@ -279,13 +310,21 @@ window.showCitationTooltip = function (event, rank) {
     citation.similarity_score
   );
 
-  // 设置悬浮框内容
+  // 设置悬浮框内容（先显示摘要，完整内容加载后替换）
   tooltip.innerHTML = `
     <div class="citation-header">引用 #${rank}</div>
     <div class="citation-filename">文档: ${formattedFilename}</div>
     <div class="citation-similarity">相似度: ${formattedSimilarity}</div>
-    <div class="citation-content">${citation.content}</div>
+    <div class="citation-content"></div>
   `;
+  const contentDiv = tooltip.querySelector(".citation-content");
+  contentDiv.textContent = citation.snippet + "...";
+  tooltip.dataset.rank = rank;
+  window.citationProcessor.fetchCitationContent(citation).then((content) => {
+    if (tooltip.dataset.rank === String(rank)) {
+      contentDiv.textContent = content;
+    }
+  });
 
   // 计算位置
   const rect = event.target.getBoundingClientRect();
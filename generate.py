@@ -10,52 +10,147 @@ logger = logging.getLogger()
 
 def generate_index():
     """
-    Index the documents in the data directory using SQLite and ChromaDB.
+    Index the documents in the data directory using SQLite and the vector store
+    selected by VECTOR_STORE (ChromaDB by default, or the numpy store).
+
+    Indexing is incremental: source documents whose hash matches the one recorded
+    in the docstore are skipped, changed documents are re-split and re-embedded,
+    and documents whose files were removed are deleted from the docstore and vector store.
+
+    Files are streamed through read+split -> embed -> write with at most
+    ``--max-in-flight`` files being read and split ahead of the writer by a
+    single pool of ``--workers`` processes, so memory stays flat regardless of
+    corpus size. Unchanged documents are not split.
+
+    Usage: uv run generate [--workers N] [--batch-size N] [--max-in-flight N]
     """
-    from app.index import STORAGE_DIR
+    import argparse
+
+    from app import ingestion
+    from app.index import STORAGE_DIR, mark_index_updated
     from app.settings import init_settings
+    from app.sqlite_stores import SQLiteDocumentStore
     from app.storage_config import get_storage_context
     from llama_index.core.indices import (
         VectorStoreIndex,
     )
-    from llama_index.core.readers import SimpleDirectoryReader
+
+    parser = argparse.ArgumentParser(prog="generate")
+    parser.add_argument(
+        "--workers", type=int, default=ingestion.default_workers(),
+        help="processes used to read and split files (default: INGEST_WORKERS or 1)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=256,
+        help="nodes written to the docstore and embedded per batch",
+    )
+    parser.add_argument(
+        "--max-in-flight", type=int, default=None,
+        help="files read and split ahead of the writer (default: 2 * workers)",
+    )
+    args = parser.parse_args()
 
     load_dotenv()
     init_settings()
 
-    logger.info("Creating new index with SQLite and ChromaDB storage")
-
-    # Create storage context with SQLite and ChromaDB
+    # Create storage context with SQLite and the configured vector store
     storage_context = get_storage_context(STORAGE_DIR)
+    docstore = storage_context.docstore
+    assert isinstance(docstore, SQLiteDocumentStore)
+    vector_store = storage_context.vector_store
+    backend = type(vector_store).__name__
+    logger.info(f"Updating index with SQLite and {backend} storage")
+
+    known_hashes = docstore.get_all_ref_doc_hashes()
+    if not known_hashes and len(docstore.docs) > 0:
+        # Built before documents were tracked: nodes cannot be matched to files
+        logger.info("Existing index has no document tracking, rebuilding it from scratch")
+        vector_store.clear()
+        docstore.clear()
+    # Finish vector deletes an interrupted run committed to the docstore only
+    docstore.delete_pending_vectors(vector_store)
+
+    # file-based document ids keep documents comparable across runs
+    file_paths = ingestion.list_data_files(os.environ.get("DATA_DIR", "data"))
+    logger.info(f"Indexing {len(file_paths)} files with {args.workers} worker(s)")
+
+    added, changed, seen_ids = [], [], set()
+
+    def documents_to_index():
+        """Yield new and changed documents, dropping stale nodes and vectors of changed ones."""
+        for document in ingestion.iter_documents(file_paths, args.workers, args.max_in_flight, known_hashes):
+            doc_id, _, nodes = document
+            seen_ids.add(doc_id)
+            if nodes is None:
+                continue
+            if doc_id not in known_hashes:
+                added.append(doc_id)
+            else:
+                changed.append(doc_id)
+                docstore.delete_ref_doc(doc_id, raise_error=False, vector_store=vector_store)
+            yield document
+
+    index = VectorStoreIndex.from_vector_store(vector_store, storage_context=storage_context)
+
+    # Embed and write node batches as they come out of the splitter
+    node_count = 0
+    for nodes, completed in ingestion.iter_node_batches(documents_to_index(), args.batch_size):
+        if nodes:
+            docstore.add_documents(nodes)
+            index.insert_nodes(nodes)
+            node_count += len(nodes)
+            logger.info(f"Indexed {node_count} nodes")
+        # Only documents whose nodes are all stored are recorded as up to date
+        docstore.set_ref_doc_hashes({doc_id: doc_hash for doc_id, doc_hash, _ in completed})
+
+    removed_ids = [ref_doc_id for ref_doc_id in known_hashes if ref_doc_id not in seen_ids]
+    for ref_doc_id in removed_ids:
+        docstore.delete_ref_doc(ref_doc_id, raise_error=False, vector_store=vector_store)
+
+    # Persist the storage context (SQLite and the vector store)
+    storage_context.persist(STORAGE_DIR)
+    # Tell running server workers to reload the index
+    mark_index_updated(STORAGE_DIR)
 
-    # load the documents and create the index
-    reader = SimpleDirectoryReader(
-        os.environ.get("DATA_DIR", "data"),
-        recursive=True,
+    unchanged = len(seen_ids) - len(added) - len(changed)
+    print(
+        f"Index update summary: {len(added)} added, {len(changed)} changed, "
+        f"{len(removed_ids)} removed, {unchanged} unchanged"
     )
-    documents = reader.load_data()
+    print(f"  {node_count} nodes embedded and stored")
+    for label, ids in (("added", added), ("changed", changed), ("removed", removed_ids)):
+        for doc_id in ids:
+            print(f"  {label}: {doc_id}")
+    logger.info(f"Finished updating index. Stored in {STORAGE_DIR} using SQLite and {backend}")
 
-    # Parse documents into nodes
-    from llama_index.core.node_parser import SentenceSplitter
-    parser = SentenceSplitter()
-    nodes = parser.get_nodes_from_documents(documents)
 
-    logger.info(f"Parsed {len(documents)} documents into {len(nodes)} nodes")
-
-    # Add nodes to docstore manually
-    storage_context.docstore.add_documents(nodes)
+def upgrade_docstore():
+    """
+    Re-encode the nodes in the document store with a new storage format.
 
-    # Create index with custom storage context
-    index = VectorStoreIndex(
-        nodes,
-        storage_context=storage_context,
-        show_progress=True,
+    Usage: uv run upgrade_docstore [json|json+zlib|msgpack+zlib]
+    """
+    import sys
+
+    from app.index import STORAGE_DIR, mark_index_updated
+    from app.sqlite_stores import SQLiteDocumentStore
+
+    storage_format = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("DOCSTORE_FORMAT", "json+zlib")
+    docstore_path = os.path.join(STORAGE_DIR, "docstore.db")
+    if not os.path.exists(docstore_path):
+        raise RuntimeError(f"Document store {docstore_path} not found. Run `uv run generate` first.")
+
+    size_before = os.path.getsize(docstore_path)
+    docstore = SQLiteDocumentStore(docstore_path)
+    upgraded = docstore.upgrade_storage_format(storage_format)
+    docstore.close()
+    mark_index_updated(STORAGE_DIR)
+    size_after = os.path.getsize(docstore_path)
+    logger.info(
+        f"Upgraded {upgraded} nodes to {storage_format}: "
+        f"{size_before / 1024:.0f} KiB -> {size_after / 1024:.0f} KiB"
     )
 
-    # Persist the storage context (this will save to SQLite and ChromaDB)
-    storage_context.persist(STORAGE_DIR)
-    logger.info(f"Finished creating new index. Stored in {STORAGE_DIR} using SQLite and ChromaDB")
-
 
 def generate_ui_for_workflow():
     """
@@ -1,21 +1,42 @@
+import asyncio
 import logging
 import json
+import os
 
 from app.settings import init_settings
-from app.workflow import create_workflow
-from app.streaming import create_streaming_response
+from app.workflow import acreate_workflow, alookup_answer, cache_answer, create_workflow
+from app.streaming import (
+    create_streaming_response,
+    create_workflow_streaming_response,
+    process_citation_text,
+    stream_stats,
+)
+from app.storage_config import close_storage_context
+from app.index import aget_index, get_index, watch_index
+from app.node_cache import node_cache_stats
+from app.answer_cache import get_answer_cache
+from app.admission import AdmissionMiddleware, Overloaded, get_admission_controller
+from app.citations import citation_content
+from app.embedding_cache import CachedEmbedding
 from dotenv import load_dotenv
 from llama_index.server import LlamaIndexServer, UIConfig
 from llama_index.server.api.models import ChatRequest
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi import HTTPException, Request
+from llama_index.core.settings import Settings
 
 logger = logging.getLogger("uvicorn")
 
 # A path to a directory where the customized UI code is stored
 COMPONENT_DIR = "components"
 
+# 引用内容的浏览器缓存时间（秒），过期后用 ETag 重新验证
+CITATION_MAX_AGE = 3600
+
+# 后台检查索引版本的间隔（秒），0 表示只在请求时检查
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "5"))
+
 
 def create_app():
     app = LlamaIndexServer(
@@ -42,12 +63,71 @@ def create_app():
     async def test_page():
         return FileResponse("test_frontend_streaming.html")
 
+    # 限制每个 worker 同时执行的工作流数量，超出时排队，队列满或超时返回 503
+    admission_controller = get_admission_controller()
+    if admission_controller is not None:
+        app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
+    # 启动时加载索引，之后每个 worker 复用同一个索引
+    app.add_event_handler("startup", get_index)
+
+    # 后台定期检查索引版本，在 I/O 线程中重新加载，避免在请求路径上阻塞事件循环
+    # （/api/chat 的工作流工厂只能同步调用 get_index）
+    reload_tasks = []
+
+    async def start_index_watcher():
+        if INDEX_RELOAD_INTERVAL > 0:
+            reload_tasks.append(asyncio.create_task(watch_index(INDEX_RELOAD_INTERVAL)))
+
+    async def stop_index_watcher():
+        for task in reload_tasks:
+            task.cancel()
+
+    app.add_event_handler("startup", start_index_watcher)
+    app.add_event_handler("shutdown", stop_index_watcher)
+
+    # 关闭时释放 SQLite 连接池
+    app.add_event_handler("shutdown", close_storage_context)
+
     # 保留原有的健康检查路由
     app.add_api_route("/api/health", lambda: {"message": "OK"}, status_code=200)
 
+    # 运行指标（文档缓存、向量缓存命中率等）
+    def metrics():
+        embed_model = Settings.embed_model
+        return {
+            "node_cache": node_cache_stats(),
+            "embedding_cache": embed_model.cache_stats() if isinstance(embed_model, CachedEmbedding) else None,
+            "answer_cache": answer_cache.stats() if (answer_cache := get_answer_cache()) else None,
+            "streams": stream_stats(),
+            "admission": admission_controller.stats() if admission_controller else None,
+        }
+
+    app.add_api_route("/api/metrics", metrics, methods=["GET"])
+
+    # 引用原文按需加载：SSE 只发送摘要，悬浮显示时再取完整内容
+    async def get_citation(request: Request, node_id: str):
+        """返回引用块的完整内容，带 ETag 以便浏览器缓存"""
+        index = await aget_index()
+        node = await index.docstore.aget_document(node_id, raise_error=False) if index is not None else None
+        if node is None:
+            raise HTTPException(status_code=404, detail=f"Citation {node_id} not found")
+
+        # 节点哈希随内容变化，可直接作为 ETag
+        headers = {
+            "ETag": f'"{node.hash}"',
+            "Cache-Control": f"public, max-age={CITATION_MAX_AGE}",
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        if headers["ETag"] in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(citation_content(node), headers=headers)
+
+    app.add_api_route("/api/citations/{node_id}", get_citation, methods=["GET"])
+
     # 定义流式聊天API端点函数
-    async def stream_chat(request: Request, data: str):
-        """流式聊天API端点"""
+    async def stream_chat(request: Request, data: str, annotate_citations: bool = False):
+        """流式聊天API端点（annotate_citations=true 时文本块中的引用标记由服务端标注）"""
         try:
             # 解析请求数据
             import json
@@ -58,38 +138,46 @@ def create_app():
             chat_request = ChatRequest(**chat_data)
 
             # 创建工作流
-            workflow = create_workflow(chat_request)
+            workflow = await acreate_workflow(chat_request)
 
             # 获取最后一条用户消息
             user_message = ""
             if chat_request.messages:
                 user_message = chat_request.messages[-1].content
 
-            # 运行工作流获取响应
-            response = await workflow.run(user_msg=user_message)
-
-            # 从AgentWorkflow响应中提取文本内容
-            response_text = ""
-            if hasattr(response, 'response') and hasattr(response.response, 'blocks'):
-                # 从blocks中提取文本
-                for block in response.response.blocks:
-                    if hasattr(block, 'text'):
-                        response_text += block.text
-            else:
-                response_text = str(response)
-
-            # 检查是否有工具调用结果包含引用数据
-            if hasattr(response, 'tool_calls') and response.tool_calls:
-                for tool_call in response.tool_calls:
-                    if hasattr(tool_call, 'tool_output') and hasattr(tool_call.tool_output, 'content'):
-                        tool_content = tool_call.tool_output.content
-                        # 如果工具输出包含引用数据，使用它
-                        if "CITATION_DATA:" in tool_content:
-                            response_text = tool_content
-                            break
-
-            # 返回流式响应
-            return await create_streaming_response(response_text, request)
+            # 单轮问题先查回答缓存：命中时直接推送缓存的回答和引用，不运行工作流、不占执行名额
+            # （多轮对话的问题依赖上下文，只在工具内按改写后的查询查缓存）
+            answer_key = None
+            if len(chat_request.messages) == 1:
+                cached_answer, answer_key = await alookup_answer(user_message)
+                if cached_answer is not None:
+                    text = cached_answer.text
+                    if annotate_citations:
+                        text = process_citation_text(text, cached_answer.citations)
+                    # 回答已完整，不模拟逐块生成的延迟
+                    return await create_streaming_response(text, request, cached_answer.citations, chunk_delay=0)
+
+            # 获取执行名额：队列已满时直接返回 503，排队时在 SSE 中推送排队位置
+            admission = None
+            if admission_controller is not None:
+                try:
+                    admission = admission_controller.enter()
+                except Overloaded as e:
+                    logger.warning(f"Rejected stream chat: {e}")
+                    return JSONResponse(
+                        {"detail": str(e)},
+                        status_code=503,
+                        headers={"Retry-After": str(e.retry_after)},
+                    )
+
+            # 获得名额后启动工作流，边生成边推送 LLM 输出
+            return await create_workflow_streaming_response(
+                lambda: workflow.run(user_msg=user_message),
+                request,
+                annotate_citations,
+                admission,
+                on_answer=(lambda answer: cache_answer(answer_key, answer)) if answer_key else None,
+            )
 
         except Exception as e:
             logger.error(f"Error in stream chat: {e}")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+准入控制测试：FIFO 排队、队列满拒绝、排队超时，以及中间件返回 503 + Retry-After
+
+运行: uv run python -m pytest -q test_admission.py
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionMiddleware, Overloaded
+
+
+def test_waiters_are_admitted_in_fifo_order():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=3, queue_timeout=5)
+        running = controller.enter()
+        assert running.admitted
+
+        order = []
+
+        async def request(name):
+            admission = controller.enter()
+            await admission.acquire()
+            order.append(name)
+            await asyncio.sleep(0)
+            admission.release()
+
+        tasks = [asyncio.create_task(request(name)) for name in ("a", "b", "c")]
+        await asyncio.sleep(0)
+        assert [waiter.position for waiter in controller._waiters] == [1, 2, 3]
+        assert controller.stats()["queued"] == 3
+
+        running.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "c"]
+        stats = controller.stats()
+        assert (stats["active"], stats["queued"], stats["admitted"]) == (0, 0, 4)
+
+    asyncio.run(scenario())
+
+
+def test_wait_reports_position_changes():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=5)
+        running = controller.enter()
+        first, second = controller.enter(), controller.enter()
+
+        positions = []
+
+        async def watch():
+            async for position in second.wait():
+                positions.append(position)
+
+        task = asyncio.create_task(watch())
+        await asyncio.sleep(0.01)
+        first.release()  # 排在前面的请求放弃排队
+        await asyncio.sleep(0.01)
+        running.release()
+        await task
+        assert positions == [2, 1]
+        assert second.admitted and second.position == 0
+        second.release()
+        second.release()  # 可重复调用
+        assert controller.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, retry_after=7)
+        controller.enter()
+        controller.enter()
+        with pytest.raises(Overloaded) as error:
+            controller.enter()
+        assert error.value.retry_after == 7
+        assert controller.stats()["rejected"] == 1
+
+        # max_queue=0：没有空闲名额时直接拒绝
+        no_queue = AdmissionController(max_concurrent=1, max_queue=0)
+        no_queue.enter()
+        with pytest.raises(Overloaded):
+            no_queue.enter()
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_raises_overloaded():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=0.05, retry_after=3)
+        running = controller.enter()
+        waiting = controller.enter()
+        with pytest.raises(Overloaded) as error:
+            await waiting.acquire()
+        assert error.value.retry_after == 3
+        stats = controller.stats()
+        assert (stats["timed_out"], stats["queued"], stats["active"]) == (1, 0, 1)
+
+        # 超时的请求已离开队列，后来的请求可以正常获得名额
+        running.release()
+        assert controller.enter().admitted
+
+    asyncio.run(scenario())
+
+
+async def _call(middleware, method="POST", path="/api/chat"):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware({"type": "http", "method": method, "path": path}, receive, send)
+    return messages
+
+
+def test_middleware_sheds_with_503_and_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=0, retry_after=12)
+        release = asyncio.Event()
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append(scope["path"])
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        middleware = AdmissionMiddleware(app, controller)
+        first = asyncio.create_task(_call(middleware))
+        await asyncio.sleep(0)
+        assert controller.stats()["active"] == 1
+
+        shed = await _call(middleware)
+        start, body = shed
+        assert start["status"] == 503
+        headers = dict(start["headers"])
+        assert headers[b"retry-after"] == b"12"
+        assert headers[b"content-type"] == b"application/json"
+        assert "Server busy" in json.loads(body["body"])["detail"]
+
+        # 其他方法和路径不受限制
+        release.set()
+        assert (await _call(middleware, method="GET"))[0]["status"] == 200
+        assert (await first)[0]["status"] == 200
+        assert calls == ["/api/chat", "/api/chat"]
+        assert controller.stats()["active"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+语义回答缓存测试：相似度阈值、过期时间、索引版本失效，以及聊天流在运行工作流前查缓存
+
+运行: OPENAI_API_KEY=sk-test uv run python -m pytest -q test_answer_cache.py
+"""
+import asyncio
+import json
+
+import pytest
+
+from app import answer_cache as answer_cache_module
+from app import workflow as app_workflow
+from app.answer_cache import SemanticAnswerCache
+from app.citations import CitedAnswer
+
+CITATIONS = {"node-a": {"node_id": "node-a", "rank": 1, "filename": "a.txt", "similarity_score": 0.9, "snippet": "甲"}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def _answer(text="答案 Source 1:"):
+    return CitedAnswer(text=text, citations=dict(CITATIONS))
+
+
+def test_threshold_picks_most_similar_question():
+    cache = SemanticAnswerCache(threshold=0.9)
+    first, second = _answer("first"), _answer("second")
+    cache.put([1.0, 0.0, 0.0], "v1", first)
+    cache.put([0.0, 1.0, 0.0], "v1", second)
+
+    assert cache.get([2.0, 0.1, 0.0], "v1") is first  # 与长度无关，只看余弦相似度
+    assert cache.get([0.1, 1.0, 0.0], "v1") is second
+    assert cache.get([1.0, 1.0, 0.0], "v1") is None  # 相似度 0.71 < 0.9
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(answer_cache_module, "time", clock)
+    cache = SemanticAnswerCache(ttl=60)
+    cache.put([1.0, 0.0], "v1", _answer())
+
+    clock.now += 59
+    assert cache.get([1.0, 0.0], "v1") is not None
+    clock.now += 2
+    assert cache.get([1.0, 0.0], "v1") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_new_index_version_drops_every_answer():
+    cache = SemanticAnswerCache()
+    cache.put([1.0, 0.0], "v1", _answer())
+    cache.put([0.0, 1.0], "v1", _answer())
+
+    assert cache.get([1.0, 0.0], "v2") is None
+    assert cache.stats()["invalidations"] == 2
+    # 旧版本的回答不会再出现
+    assert cache.get([1.0, 0.0], "v1") is None
+
+
+def test_answers_from_an_older_index_are_not_stored():
+    cache = SemanticAnswerCache()
+    cache.put([1.0, 0.0], "v1", _answer())
+    assert cache.get([0.0, 1.0], "v2") is None
+
+    # 旧索引上仍在运行的请求写入的回答被丢弃，不会使当前版本的缓存失效
+    cache.put([1.0, 0.0], "v1", _answer("旧"))
+    cache.put([0.0, 1.0], "v2", _answer("新"))
+    assert cache.get([1.0, 0.0], "v2") is None
+    assert cache.get([0.0, 1.0], "v2").text == "新"
+    assert cache.stats()["stale_puts"] == 1
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_full_cache_evicts_least_recently_used():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.put([1.0, 0.0, 0.0], "v1", _answer("a"))
+    cache.put([0.0, 1.0, 0.0], "v1", _answer("b"))
+    assert cache.get([1.0, 0.0, 0.0], "v1").text == "a"  # a 变为最近使用
+
+    cache.put([0.0, 0.0, 1.0], "v1", _answer("c"))
+    assert cache.get([0.0, 1.0, 0.0], "v1") is None
+    assert cache.get([1.0, 0.0, 0.0], "v1").text == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lookup_before_workflow_run(monkeypatch):
+    from llama_index.core import Settings
+    from llama_index.core.embeddings import MockEmbedding
+
+    cache = SemanticAnswerCache()
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=4))
+    monkeypatch.setattr(app_workflow, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(app_workflow, "get_index_version", lambda: "v1")
+
+    answer, key = asyncio.run(app_workflow.alookup_answer("发票怎么查重？"))
+    assert answer is None and key[1] == "v1"
+    app_workflow.cache_answer(key, _answer())
+    # 没有引用的回答不缓存
+    app_workflow.cache_answer(key, CitedAnswer(text="无引用"))
+
+    answer, _ = asyncio.run(app_workflow.alookup_answer("发票怎么查重？"))
+    assert answer is not None and answer.citations == CITATIONS
+
+
+def test_stream_chat_serves_cache_hit_without_running_workflow(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    # 避免导入 main 时在 storage/ 下创建嵌入缓存文件
+    monkeypatch.setenv("EMBEDDING_CACHE", "false")
+    main = pytest.importorskip("main")
+    from fastapi.testclient import TestClient
+
+    class NoRunWorkflow:
+        def run(self, **kwargs):
+            raise AssertionError("workflow must not run on a cache hit")
+
+    async def alookup_answer(question):
+        return _answer(), (None, "v1")
+
+    async def acreate_workflow(chat_request=None):
+        return NoRunWorkflow()
+
+    monkeypatch.setattr(main, "acreate_workflow", acreate_workflow)
+    monkeypatch.setattr(main, "alookup_answer", alookup_answer)
+    app = main.create_app()
+
+    data = json.dumps({"id": "chat-1", "messages": [{"role": "user", "content": "发票怎么查重？"}]})
+    # 不触发启动事件（加载 storage/ 中的索引）
+    response = TestClient(app).get("/api/chat/stream", params={"data": data, "annotate_citations": "true"})
+    events = [line[len("event: "):].strip() for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events[0] == "citation_data"
+    assert events[-1] == "complete"
+    assert events.count("text_chunk") == 1  # 缓存的回答整段立即发送
+    assert 'class=\\"citation-number\\"' in response.text
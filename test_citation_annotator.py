@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+测试增量引用标注器：任意位置拆分的流式文本与整段处理结果一致
+"""
+import re
+import json
+from itertools import combinations
+
+from app.streaming import CitationAnnotator, process_citation_text
+
+CITATIONS = {
+    "node-a": {"rank": 1, "filename": "a.txt", "snippet": "甲", "similarity_score": 0.9},
+    "node-b": {"rank": 2, "filename": "b.txt", "snippet": "乙", "similarity_score": 0.8},
+    "node-c": {"rank": 12, "filename": "c.txt", "snippet": "丙", "similarity_score": 0.7},
+}
+
+TEXT = (
+    "Source 1:\n电子发票需要查重。SSource 2: 红冲后重新开具 Source 12:。"
+    "Source 3: 不存在的引用保持原样，Sources 1: 也不是标记，Source 1\n也不是。Source 2:"
+)
+
+
+def reference(text, citations):
+    """整段文本的参考实现：与原先的正则替换相同"""
+    ranks = {data["rank"]: (node_id, data) for node_id, data in citations.items()}
+
+    def replace(match):
+        rank = int(match.group(1))
+        if rank not in ranks:
+            return match.group(0)
+        node_id, data = ranks[rank]
+        info = {
+            "node_id": node_id,
+            "filename": data["filename"],
+            "snippet": data["snippet"],
+            "similarity_score": data["similarity_score"],
+        }
+        citation_data = json.dumps(info).replace('"', '&quot;')
+        return f'<span class="citation-number" data-rank="{rank}" data-citation="{citation_data}">{rank}</span>'
+
+    return re.sub(r'Source (\d+):', replace, text)
+
+
+def stream(chunks, citations=CITATIONS):
+    annotator = CitationAnnotator(citations)
+    return "".join(annotator.feed(chunk) for chunk in chunks) + annotator.flush()
+
+
+def test_whole_text_matches_reference():
+    expected = reference(TEXT, CITATIONS)
+    assert expected.count('class="citation-number"') == 4
+    assert process_citation_text(TEXT, CITATIONS) == expected
+    assert stream([TEXT]) == expected
+
+
+def test_split_at_every_offset():
+    expected = reference(TEXT, CITATIONS)
+    for i in range(len(TEXT) + 1):
+        assert stream([TEXT[:i], TEXT[i:]]) == expected, f"split at {i}"
+
+
+def test_split_at_every_pair_of_offsets():
+    text = "前Source 12:中Source 1:后"
+    expected = reference(text, CITATIONS)
+    for i, j in combinations(range(len(text) + 1), 2):
+        assert stream([text[:i], text[i:j], text[j:]]) == expected, f"split at {i}, {j}"
+
+
+def test_one_character_at_a_time():
+    assert stream(list(TEXT)) == reference(TEXT, CITATIONS)
+
+
+def test_holds_back_only_ambiguous_suffix():
+    annotator = CitationAnnotator(CITATIONS)
+    assert annotator.feed("答案见 Sou") == "答案见 "
+    assert annotator.feed("rce 1") == ""
+    assert annotator.feed("2") == ""
+    assert annotator.feed(": 结束") == reference("Source 12: 结束", CITATIONS)
+    # 不可能成为标记的后缀立即输出
+    assert annotator.feed("Source 1\n") == "Source 1\n"
+    assert annotator.feed("Source x") == "Source x"
+    assert annotator.flush() == ""
+
+
+def test_flush_emits_unfinished_marker():
+    annotator = CitationAnnotator(CITATIONS)
+    assert annotator.feed("最后 Source 2") == "最后 "
+    assert annotator.flush() == "Source 2"
+
+
+def test_citations_arriving_mid_stream():
+    annotator = CitationAnnotator()
+    assert annotator.feed("Source 1: 无引用数据 Sour") == "Source 1: 无引用数据 "
+    annotator.update(CITATIONS)
+    assert annotator.feed("ce 1:") == reference("Source 1:", CITATIONS)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
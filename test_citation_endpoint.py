@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+引用内容接口测试：返回完整内容和 ETag，If-None-Match 命中时返回 304，未知节点返回 404
+
+运行: OPENAI_API_KEY=sk-test uv run python -m pytest -q test_citation_endpoint.py
+"""
+import os
+import types
+
+import pytest
+from llama_index.core.schema import TextNode
+
+from app.sqlite_stores import SQLiteDocumentStore
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    # 避免导入 main 时在 storage/ 下创建嵌入缓存文件
+    monkeypatch.setenv("EMBEDDING_CACHE", "false")
+    main = pytest.importorskip("main")
+    from fastapi.testclient import TestClient
+
+    docstore = SQLiteDocumentStore(os.path.join(tmp_path, "docstore.db"), use_cache=False)
+    docstore.add_documents([TextNode(id_="node-a", text="电子发票需要查重。", metadata={"file_name": "a.txt"})])
+    index = types.SimpleNamespace(docstore=docstore)
+
+    async def aget_index(chat_request=None):
+        return index
+
+    monkeypatch.setattr(main, "aget_index", aget_index)
+    # 不触发启动事件（加载 storage/ 中的索引）
+    yield TestClient(main.create_app()), docstore
+    docstore.close()
+
+
+def test_citation_content_with_etag(client):
+    client, docstore = client
+    response = client.get("/api/citations/node-a")
+    assert response.status_code == 200
+    assert response.json() == {"node_id": "node-a", "filename": "a.txt", "content": "电子发票需要查重。"}
+    assert response.headers["etag"] == f'"{docstore.get_node("node-a").hash}"'
+    assert "max-age=" in response.headers["cache-control"]
+
+    # 内容未变：304 且不带正文
+    cached = client.get("/api/citations/node-a", headers={"If-None-Match": f'"other", {response.headers["etag"]}'})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == response.headers["etag"]
+
+    assert client.get("/api/citations/node-a", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_unknown_citation_is_404(client):
+    client, _ = client
+    assert client.get("/api/citations/missing").status_code == 404
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+嵌入缓存测试：命中、去重与按大小的 LRU 淘汰（不需要 API Key）
+
+运行: uv run python -m pytest -q test_embedding_cache.py
+"""
+import os
+
+from llama_index.core.embeddings import MockEmbedding
+
+from app.embedding_cache import CachedEmbedding, EmbeddingCache
+
+DIM = 8
+VECTOR_BYTES = DIM * 4
+
+
+class CountingEmbedding(MockEmbedding):
+    """记录发送给模型的文本"""
+
+    texts: list = []
+
+    def _get_text_embeddings(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text))] * DIM for text in texts]
+
+    def _get_query_embedding(self, query):
+        self.texts.append(query)
+        return [float(len(query))] * DIM
+
+
+def test_cached_embedding_only_embeds_misses(tmp_path):
+    cache = EmbeddingCache(os.path.join(tmp_path, "embedding_cache.db"))
+    inner = CountingEmbedding(embed_dim=DIM, texts=[])
+    embed_model = CachedEmbedding(inner, cache)
+
+    first = embed_model.get_text_embedding_batch(["a", "bb", "a"])
+    assert inner.texts == ["a", "bb"]  # 同一批内的重复文本只嵌入一次
+    second = embed_model.get_text_embedding_batch(["bb", "ccc", "a"])
+    assert inner.texts == ["a", "bb", "ccc"]
+    assert second == [first[1], [3.0] * DIM, first[0]]
+
+    # 查询与文本共用缓存条目
+    assert embed_model.get_query_embedding("ccc") == [3.0] * DIM
+    assert inner.texts == ["a", "bb", "ccc"]
+    stats = embed_model.cache_stats()
+    assert (stats["hits"], stats["misses"]) == (3, 4)  # 按请求的键计数
+    assert stats["bytes"] == 3 * VECTOR_BYTES
+
+    # 缓存持久化，重新打开后仍命中
+    reopened = EmbeddingCache(os.path.join(tmp_path, "embedding_cache.db"))
+    key = EmbeddingCache.make_key(inner.model_name, None, "a")
+    assert reopened.get_many([key]) == {key: [1.0] * DIM}
+    assert reopened.stats()["bytes"] == 3 * VECTOR_BYTES
+
+
+def test_make_key_separates_models_and_dimensions():
+    keys = {
+        EmbeddingCache.make_key("m1", None, "text"),
+        EmbeddingCache.make_key("m2", None, "text"),
+        EmbeddingCache.make_key("m1", 256, "text"),
+        EmbeddingCache.make_key("m1", None, "other"),
+    }
+    assert len(keys) == 4
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = EmbeddingCache(os.path.join(tmp_path, "embedding_cache.db"), max_bytes=3 * VECTOR_BYTES + 4)
+    for i, key in enumerate(["k0", "k1", "k2"]):
+        cache.put_many("m", None, {key: [float(i)] * DIM})
+    # 显式设定使用时间：k1 最旧，k0 次之，k2 最新
+    with cache._pool.transaction() as conn:
+        conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE key = ?", [(2.0, "k0"), (1.0, "k1"), (3.0, "k2")]
+        )
+    assert cache.stats()["evictions"] == 0
+
+    cache.put_many("m", None, {"k3": [3.0] * DIM})
+
+    remaining = cache.get_many(["k0", "k1", "k2", "k3"])
+    assert sorted(remaining) == ["k2", "k3"]
+    stats = cache.stats()
+    assert stats["evictions"] == 2
+    assert stats["bytes"] == 2 * VECTOR_BYTES <= cache.max_bytes
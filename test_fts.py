@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+全文检索测试：中文二元分词、单字查询、短语匹配，以及混合检索的分数（不需要 API Key）
+
+运行: uv run python -m pytest -q test_fts.py
+"""
+import os
+import tempfile
+
+import pytest
+from llama_index.core import Settings, StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+
+from app import fts
+from app.citations import citations_from_nodes
+from app.hybrid_retriever import RETRIEVAL_SCORE_KEY, HybridRetriever, bm25_similarity
+from app.sqlite_stores import SQLiteDocumentStore
+
+TEXTS = {
+    "income": "个人所得税申报流程",
+    "tax": "按月缴纳个税",
+    "invoice": "电子发票查重 Invoice-2024",
+    "red": "红冲后重新开具发票",
+}
+
+
+@pytest.fixture
+def docstore():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteDocumentStore(os.path.join(tmp, "docstore.db"), use_cache=False)
+        store.add_documents([TextNode(id_=node_id, text=text) for node_id, text in TEXTS.items()])
+        yield store
+        store.close()
+
+
+def _ids(results):
+    return {node_id for node_id, _ in results}
+
+
+def test_terms_are_cjk_bigrams():
+    assert fts.to_terms("电子发票").split() == ["电子", "子发", "发票"]
+    assert fts.to_terms("税").split() == ["税"]
+    assert fts.query_terms("Invoice-2024 红冲，") == ["Invoice-2024", "红冲"]
+    # 索引文本额外列出每段中文的末字
+    assert fts.index_terms("缴纳个税 发票").split() == ["缴纳", "纳个", "个税", "发票", "税", "票"]
+    assert fts.match_any("") is None and fts.match_phrase("，。") is None
+
+
+def test_search_text_matches_substrings(docstore):
+    assert _ids(docstore.search_text("发票")) == {"invoice", "red"}
+    assert _ids(docstore.search_text("所得税")) == {"income"}
+    assert _ids(docstore.search_text("invoice")) == {"invoice"}  # 不区分大小写
+    # 任一词匹配即可；短语模式要求原文连续出现
+    assert _ids(docstore.search_text("查重发票")) == {"invoice", "red"}
+    assert docstore.search_text("查重发票", phrase=True) == []
+    assert _ids(docstore.search_text("电子发票查重", phrase=True)) == {"invoice"}
+
+
+def test_single_character_query(docstore):
+    # "税" 既出现在词中（所得税申报）也出现在末尾（缴纳个税）
+    assert _ids(docstore.search_text("税")) == {"income", "tax"}
+    assert _ids(docstore.search_text("税", phrase=True)) == {"income", "tax"}
+    assert _ids(docstore.search_text("票")) == {"invoice", "red"}
+    assert docstore.search_text("猫") == []
+
+
+def test_results_are_ranked_best_first(docstore):
+    results = docstore.search_text("发票 红冲")
+    assert results[0][0] == "red"
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    assert len(docstore.search_text("发票", top_k=1)) == 1
+
+
+def test_outdated_index_is_rebuilt_on_open():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "docstore.db")
+        store = SQLiteDocumentStore(path, use_cache=False)
+        store.add_documents([TextNode(id_="tax", text="按月缴纳个税")])
+        # 模拟旧版本索引：没有末字，也没有版本记录
+        with store._pool.transaction() as conn:
+            conn.execute("UPDATE documents_fts SET terms = ?", (fts.to_terms("按月缴纳个税"),))
+            conn.execute("DELETE FROM store_meta WHERE key = 'fts_terms_version'")
+        assert store.search_text("税") == []
+        store.close()
+
+        reopened = SQLiteDocumentStore(path, use_cache=False)
+        assert _ids(reopened.search_text("税")) == {"tax"}
+        reopened.close()
+
+
+def test_hybrid_results_keep_vector_similarity(docstore, monkeypatch):
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=8))
+    nodes = docstore.get_nodes(list(TEXTS))
+    index = VectorStoreIndex(nodes, storage_context=StorageContext.from_defaults(docstore=docstore))
+    retriever = HybridRetriever(index, docstore, similarity_top_k=2)
+
+    # 短关键词走全文检索快速路径：没有向量相似度，分数由 BM25 映射到 [0, 1)
+    fast = retriever.retrieve("红冲")
+    assert [result.node.node_id for result in fast] == ["red"]
+    bm25 = fast[0].node.metadata[RETRIEVAL_SCORE_KEY]
+    assert bm25 > 0.5
+    assert fast[0].score == pytest.approx(bm25_similarity(bm25)) and 0 < fast[0].score < 1
+    assert citations_from_nodes(fast)["red"]["similarity_score"] == pytest.approx(fast[0].score)
+
+    # 出现在一半节点中的常见词 BM25 很低，不走快速路径
+    assert retriever._lexical_fast_path("发票") == []
+    common = retriever.retrieve("发票")
+    assert all(result.score == pytest.approx(1.0) for result in common)
+
+    fused = retriever.retrieve("电子发票查重以及红冲之后重新开具的详细流程说明")
+    assert len(fused) == 2
+    for result in fused:
+        assert result.score == pytest.approx(1.0)  # MockEmbedding 的余弦相似度，而非 RRF 分数
+        assert 0 < result.node.metadata[RETRIEVAL_SCORE_KEY] < 0.05
+        assert RETRIEVAL_SCORE_KEY not in result.node.get_content(metadata_mode=MetadataMode.LLM)
+    ranking = [result.node.metadata[RETRIEVAL_SCORE_KEY] for result in fused]
+    assert ranking == sorted(ranking, reverse=True)
+
+
+class FixedRetriever:
+    """总是返回同一批节点对象的向量检索替身"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def retrieve(self, query_bundle):
+        return self.results
+
+
+def test_hybrid_results_do_not_modify_retrieved_nodes(docstore, monkeypatch):
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=8))
+    nodes = docstore.get_nodes(list(TEXTS))
+    index = VectorStoreIndex(nodes, storage_context=StorageContext.from_defaults(docstore=docstore))
+    retriever = HybridRetriever(index, docstore, similarity_top_k=2)
+    vector_results = [NodeWithScore(node=node, score=0.8) for node in nodes]
+    retriever._vector_retriever = FixedRetriever(vector_results)
+
+    results = retriever.retrieve("电子发票查重以及红冲之后重新开具的详细流程说明")
+    assert all(RETRIEVAL_SCORE_KEY in result.node.metadata for result in results)
+    assert all(result.score == 0.8 for result in results)
+    # 分数只写在结果节点的副本上，向量检索返回的共享节点保持不变
+    for node in nodes:
+        assert RETRIEVAL_SCORE_KEY not in node.metadata
+        assert RETRIEVAL_SCORE_KEY not in node.excluded_llm_metadata_keys
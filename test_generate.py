@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+增量索引测试：未变化的文档跳过，变化的重新切分，删除的文件从索引中移除（不需要 API Key）
+
+运行: uv run python -m pytest -q test_generate.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from llama_index.core import Settings
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+
+import generate
+from app import ingestion
+from app import index as app_index
+from app import settings as app_settings
+from app.storage_config import get_storage_context
+
+
+class CountingEmbedding(MockEmbedding):
+    """记录被嵌入的文本数量"""
+
+    calls: int = 0
+
+    def _get_text_embeddings(self, texts):
+        self.calls += len(texts)
+        return super()._get_text_embeddings(texts)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    data_dir, storage_dir = tmp_path / "data", tmp_path / "storage"
+    data_dir.mkdir()
+    embed_model = CountingEmbedding(embed_dim=8)
+
+    def init_settings():
+        Settings.llm = MockLLM()
+        Settings.embed_model = embed_model
+
+    monkeypatch.setattr(app_settings, "init_settings", init_settings)
+    monkeypatch.setattr(app_index, "STORAGE_DIR", str(storage_dir))
+    monkeypatch.setattr(sys, "argv", ["generate", "--batch-size", "4"])
+    monkeypatch.setenv("DATA_DIR", str(data_dir))
+    monkeypatch.setenv("VECTOR_STORE", "numpy")
+    return data_dir, storage_dir, embed_model
+
+
+def _index_state(storage_dir):
+    storage_context = get_storage_context(str(storage_dir))
+    docstore, vector_store = storage_context.docstore, storage_context.vector_store
+    state = {
+        os.path.basename(ref_doc_id): doc_hash
+        for ref_doc_id, doc_hash in docstore.get_all_ref_doc_hashes().items()
+    }
+    node_count, vector_count = len(docstore.docs), vector_store.vector_count()
+    docstore.close()
+    storage_context.index_store.close()
+    return state, node_count, vector_count
+
+
+def test_generate_index_is_incremental(workspace, capsys):
+    data_dir, storage_dir, embed_model = workspace
+    (data_dir / "a.txt").write_text("电子发票需要查重。" * 20, encoding="utf-8")
+    (data_dir / "b.txt").write_text("红冲后重新开具发票。" * 20, encoding="utf-8")
+    (data_dir / "c.txt").write_text("报销流程说明。" * 20, encoding="utf-8")
+
+    generate.generate_index()
+    hashes, node_count, vector_count = _index_state(storage_dir)
+    assert sorted(hashes) == ["a.txt", "b.txt", "c.txt"]
+    assert node_count == vector_count == embed_model.calls > 0
+    assert "3 added, 0 changed, 0 removed, 0 unchanged" in capsys.readouterr().out
+
+    # 未变化时不再嵌入任何文本
+    embed_model.calls = 0
+    generate.generate_index()
+    assert embed_model.calls == 0
+    assert _index_state(storage_dir) == (hashes, node_count, vector_count)
+    assert "0 added, 0 changed, 0 removed, 3 unchanged" in capsys.readouterr().out
+
+    # 修改 b、删除 c：只重新嵌入 b，c 的节点和向量被移除
+    (data_dir / "b.txt").write_text("红冲后重新开具发票，需要审批。", encoding="utf-8")
+    (data_dir / "c.txt").unlink()
+    generate.generate_index()
+    new_hashes, new_node_count, new_vector_count = _index_state(storage_dir)
+    assert "0 added, 1 changed, 1 removed, 1 unchanged" in capsys.readouterr().out
+    assert sorted(new_hashes) == ["a.txt", "b.txt"]
+    assert new_hashes["a.txt"] == hashes["a.txt"] and new_hashes["b.txt"] != hashes["b.txt"]
+    assert embed_model.calls == 1
+    assert new_node_count == new_vector_count
+
+
+def test_iter_documents_in_worker_processes_matches_inline(tmp_path):
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text(f"{name} 的内容。" * 200, encoding="utf-8")
+    file_paths = ingestion.list_data_files(str(tmp_path))
+
+    inline = list(ingestion.iter_documents(file_paths))
+    pooled = list(ingestion.iter_documents(file_paths, workers=2, max_in_flight=2))
+    assert [(doc_id, doc_hash) for doc_id, doc_hash, _ in pooled] == [(d, h) for d, h, _ in inline]
+    assert [[node.node_id for node in nodes] for _, _, nodes in pooled] == [
+        [node.node_id for node in nodes] for _, _, nodes in inline
+    ]
+
+    # 已知哈希未变的文档不切分
+    known = {inline[0][0]: inline[0][1], inline[1][0]: "stale"}
+    skipped = list(ingestion.iter_documents(file_paths, workers=2, known_hashes=known))
+    assert skipped[0][2] is None and skipped[1][2] and skipped[2][2]
+
+    batches = list(ingestion.iter_node_batches(skipped, batch_size=3))
+    assert all(len(nodes) <= 3 for nodes, _ in batches)
+    assert [doc_id for _, completed in batches for doc_id, _, _ in completed] == [d for d, _, _ in inline]
+
+
+def test_index_reloads_after_generate(workspace, monkeypatch):
+    data_dir, storage_dir, _ = workspace
+    monkeypatch.setattr(app_index, "_index", None)
+    monkeypatch.setattr(app_index, "_index_version", None)
+    try:
+        (data_dir / "a.txt").write_text("电子发票需要查重。" * 20, encoding="utf-8")
+        generate.generate_index()
+        index = asyncio.run(app_index.aget_index())
+        assert index is not None and asyncio.run(app_index.aget_index()) is index
+
+        # generate 更新版本文件后，下一次请求在 I/O 线程中加载新索引并释放旧存储
+        (data_dir / "b.txt").write_text("红冲后重新开具发票。" * 20, encoding="utf-8")
+        generate.generate_index()
+        version_file = storage_dir / app_index.INDEX_VERSION_FILE
+        stat = version_file.stat()
+        os.utime(version_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        reloaded = asyncio.run(app_index.aget_index())
+        assert reloaded is not index
+        assert app_index.get_index_version() == version_file.stat().st_mtime_ns
+        assert index.docstore._closed and index.storage_context.index_store._closed
+        assert not reloaded.docstore._closed
+        assert len(reloaded.docstore.get_all_ref_doc_hashes()) == 2
+        assert len(reloaded.as_retriever(similarity_top_k=2).retrieve("发票")) == 2
+        assert app_index.get_index() is reloaded
+    finally:
+        if app_index._index is not None:
+            app_index.close_storage_context(app_index._index.storage_context)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+NumPy 向量库测试：增删、压缩、元数据过滤，以及与暴力检索对比的召回率（不需要 API Key）
+
+运行: uv run python -m pytest -q test_numpy_vector_store.py
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import (
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+from app.numpy_vector_store import IDS_FILE, NumpyVectorStore, normalize_rows
+from app.sqlite_stores import SQLiteDocumentStore
+
+DIM = 16
+
+
+def _nodes(vectors, ref_doc_id="doc", prefix="n", start=0):
+    nodes = []
+    for i, vector in enumerate(vectors, start=start):
+        node = TextNode(
+            id_=f"{prefix}{i}",
+            text=f"text {prefix}{i}",
+            embedding=[float(x) for x in vector],
+            metadata={"file_name": f"{ref_doc_id}.txt", "page": i % 3, "tags": ["even" if i % 2 == 0 else "odd"]},
+        )
+        node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=ref_doc_id)
+        nodes.append(node)
+    return nodes
+
+
+@pytest.fixture
+def stores(tmp_path):
+    docstore = SQLiteDocumentStore(os.path.join(tmp_path, "docstore.db"), use_cache=False)
+    opened = []
+
+    def open_store(**kwargs):
+        store = NumpyVectorStore(os.path.join(tmp_path, "vectors"), docstore=docstore, **kwargs)
+        opened.append(store)
+        return store
+
+    yield docstore, open_store
+    docstore.close()
+
+
+def _add(docstore, store, nodes):
+    docstore.add_documents(nodes)
+    store.add(nodes)
+
+
+def _query(store, vector, k, **kwargs):
+    result = store.query(VectorStoreQuery(query_embedding=[float(x) for x in vector], similarity_top_k=k, **kwargs))
+    return result.ids
+
+
+def test_add_query_delete_and_reopen(stores):
+    docstore, open_store = stores
+    store = open_store()
+    vectors = np.eye(DIM, dtype=np.float32)[:6]
+    _add(docstore, store, _nodes(vectors[:3], "doc-a") + _nodes(vectors[3:], "doc-b", start=3))
+    assert store.vector_count() == 6
+
+    result = store.query(VectorStoreQuery(query_embedding=list(map(float, vectors[4])), similarity_top_k=2))
+    assert result.ids[0] == "n4"
+    assert result.similarities[0] == pytest.approx(1.0)
+    assert result.nodes[0].text == "text n4"
+
+    store.delete("doc-a")
+    store.delete("missing")  # 未知文档不报错
+    assert store.vector_count() == 3
+    assert "n0" not in _query(store, vectors[0], 6)
+
+    # 重复 id 替换旧向量
+    _add(docstore, store, _nodes([vectors[0]], "doc-b", start=5))
+    assert _query(store, vectors[0], 1) == ["n5"]
+    assert store.vector_count() == 3
+
+    reopened = open_store()
+    assert reopened.vector_count() == 3
+    assert _query(reopened, vectors[0], 1) == ["n5"]
+    reopened.delete("doc-b")
+    assert reopened.vector_count() == 0
+
+
+def test_compact_drops_deleted_rows(stores):
+    docstore, open_store = stores
+    store = open_store()
+    rng = np.random.default_rng(0)
+    vectors = normalize_rows(rng.standard_normal((20, DIM)).astype(np.float32))
+    _add(docstore, store, _nodes(vectors[:10], "doc-a") + _nodes(vectors[10:], "doc-b", start=10))
+    store.delete("doc-a")
+    before = {i: _query(store, vectors[i], 3) for i in range(10, 20)}
+
+    assert store.compact() == 10
+    assert store.compact() == 0
+    with open(os.path.join(store.persist_dir, IDS_FILE), encoding="utf-8") as f:
+        assert sum(1 for _ in f) == 10
+    assert {i: _query(store, vectors[i], 3) for i in range(10, 20)} == before
+
+    reopened = open_store()
+    assert reopened.vector_count() == 10
+    assert {i: _query(reopened, vectors[i], 3) for i in range(10, 20)} == before
+    # 压缩后按文档删除仍然有效
+    reopened.delete("doc-b")
+    assert reopened.vector_count() == 0
+
+
+@pytest.mark.parametrize("dtype,prefix_dims,min_recall", [
+    ("float32", 0, 1.0),
+    ("float16", 0, 0.95),
+    ("int8", 0, 0.95),
+    ("float32", 8, 0.9),
+])
+def test_recall_against_brute_force(stores, dtype, prefix_dims, min_recall):
+    docstore, open_store = stores
+    store = open_store(dtype=dtype, prefix_dims=prefix_dims)
+    rng = np.random.default_rng(1)
+    # 方差随维度递减，与 Matryoshka 嵌入一样信息集中在前几维；2500 行跨越多个查询块
+    vectors = (rng.standard_normal((2500, DIM)) * np.linspace(2.0, 0.1, DIM)).astype(np.float32)
+    _add(docstore, store, _nodes(vectors))
+    normalized = normalize_rows(vectors)
+
+    k, hits = 10, 0
+    queries = (rng.standard_normal((20, DIM)) * np.linspace(2.0, 0.1, DIM)).astype(np.float32)
+    for query in queries:
+        scores = normalized @ (query / np.linalg.norm(query))
+        expected = {f"n{i}" for i in np.argsort(-scores)[:k]}
+        hits += len(expected & set(_query(store, query, k)))
+    assert hits / (k * len(queries)) >= min_recall
+
+
+def test_metadata_filters(stores):
+    docstore, open_store = stores
+    store = open_store()
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((12, DIM)).astype(np.float32)
+    _add(docstore, store, _nodes(vectors[:6], "doc-a") + _nodes(vectors[6:], "doc-b", start=6))
+
+    def matching(*filters, condition=FilterCondition.AND):
+        ids = _query(store, vectors[0], 12, filters=MetadataFilters(filters=list(filters), condition=condition))
+        return sorted(ids, key=lambda node_id: int(node_id[1:]))
+
+    assert matching(MetadataFilter(key="file_name", value="doc-b.txt")) == ["n6", "n7", "n8", "n9", "n10", "n11"]
+    assert matching(MetadataFilter(key="page", value=[0, 2], operator=FilterOperator.IN)) == [
+        "n0", "n2", "n3", "n5", "n6", "n8", "n9", "n11"
+    ]
+    assert matching(
+        MetadataFilter(key="file_name", value="doc-a.txt"),
+        MetadataFilter(key="page", value=1, operator=FilterOperator.GTE),
+    ) == ["n1", "n2", "n4", "n5"]
+    assert matching(
+        MetadataFilter(key="page", value=0),
+        MetadataFilter(key="tags", value="odd", operator=FilterOperator.CONTAINS),
+        condition=FilterCondition.OR,
+    ) == ["n0", "n1", "n3", "n5", "n6", "n7", "n9", "n11"]
+    assert matching(MetadataFilter(key="missing", value="x")) == []
+
+    # 与 doc_ids 同时使用时取交集
+    filters = MetadataFilters(filters=[MetadataFilter(key="page", value=0)])
+    assert sorted(_query(store, vectors[0], 12, filters=filters, doc_ids=["doc-b"])) == ["n6", "n9"]
+
+    store.delete_nodes(filters=filters)
+    assert store.vector_count() == 8
+    assert matching(MetadataFilter(key="page", value=0)) == []
+
+
+def test_store_without_metadata_column_still_loads(stores):
+    docstore, open_store = stores
+    store = open_store()
+    vectors = np.eye(DIM, dtype=np.float32)[:2]
+    _add(docstore, store, _nodes(vectors))
+    # 旧格式：每行只有 [node_id, ref_doc_id]
+    path = os.path.join(store.persist_dir, IDS_FILE)
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line)[:2] for line in f]
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(row) + "\n" for row in rows)
+
+    reopened = open_store()
+    assert _query(reopened, vectors[1], 1) == ["n1"]
+    filters = MetadataFilters(filters=[MetadataFilter(key="page", value=0)])
+    assert _query(reopened, vectors[1], 2, filters=filters) == []
+    reopened.delete("doc")
+    assert reopened.vector_count() == 0
+
+
+def test_uncommitted_ids_are_ignored_by_readers_and_cut_by_the_writer(stores):
+    docstore, open_store = stores
+    store = open_store()
+    vectors = np.eye(DIM, dtype=np.float32)[:3]
+    _add(docstore, store, _nodes(vectors[:2]))
+    # 模拟另一个进程正在追加：ids 已写入，矩阵行数尚未提交
+    path = os.path.join(store.persist_dir, IDS_FILE)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(["pending", "doc", {}]) + "\n")
+
+    reader = open_store()
+    assert reader.vector_count() == 2
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 3  # 读取方不改写文件
+
+    _add(docstore, reader, _nodes(vectors[2:], start=2))
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)[0] for line in f] == ["n0", "n1", "n2"]
+    reopened = open_store()
+    assert reopened.vector_count() == 3
+    assert _query(reopened, vectors[2], 1) == ["n2"]
@@ -32,8 +32,8 @@ def test_regular_api():
         print(response.text)
         print("=" * 50)
         
-        # 检查是否包含引用数据
-        if "CITATION_DATA:" in response.text:
+        # 检查是否包含引用数据（工具输出的来源节点以 sources 注解返回）
+        if '"sources"' in response.text:
             print("✅ 发现引用数据!")
         else:
             print("❌ 未发现引用数据")
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+SQLite 文档存储的单元测试（不需要 API Key）
+
+运行: uv run python -m pytest -q test_sqlite_docstore.py
+"""
+import os
+import asyncio
+import tempfile
+import threading
+
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+
+from app import node_codec
+from app.sqlite_pool import SQLITE_MAX_VARIABLES, run_in_io_thread
+from app.sqlite_stores import SQLiteDocumentStore, SQLiteIndexStore, SQLiteMappingView
+
+
+def _db_path(tmp: str) -> str:
+    return os.path.join(tmp, "docstore.db")
+
+
+def test_close_keeps_shared_pool_open_for_other_stores():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        second = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        first.add_documents([TextNode(id_="n0", text="hello")])
+
+        first.close()
+        first.close()  # idempotent
+        assert second.get_node("n0").text == "hello"
+
+        second.close()
+        third = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        assert third.document_exists("n0")
+        third.close()
+
+
+def test_index_store_close_releases_its_reference_only():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index_store.db")
+        first, second = SQLiteIndexStore(path), SQLiteIndexStore(path)
+        first.close()
+        assert len(second.index_structs) == 0
+        second.close()
+
+
+def _nodes(count: int, prefix: str = "n", ref_doc_id: str = None):
+    nodes = []
+    for i in range(count):
+        node = TextNode(id_=f"{prefix}{i}", text=f"text {prefix}{i}")
+        if ref_doc_id is not None:
+            node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=ref_doc_id)
+        nodes.append(node)
+    return nodes
+
+
+def test_get_nodes_keeps_order_and_duplicates():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        docstore.add_documents(_nodes(5))
+
+        ids = ["n3", "n0", "n3", "n4", "n1"]
+        assert [node.node_id for node in docstore.get_nodes(ids)] == ids
+        assert docstore.get_nodes([]) == []
+        docstore.close()
+
+
+def test_get_nodes_across_query_chunks():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        docstore.add_documents(_nodes(SQLITE_MAX_VARIABLES + 50))
+
+        ids = [f"n{i}" for i in reversed(range(SQLITE_MAX_VARIABLES + 50))]
+        assert [node.node_id for node in docstore.get_nodes(ids)] == ids
+        docstore.close()
+
+
+def test_get_nodes_reports_all_missing_ids_together():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        docstore.add_documents(_nodes(2))
+
+        with pytest.raises(ValueError) as error:
+            docstore.get_nodes(["n0", "missing-a", "n1", "missing-b", "missing-a"])
+        assert "missing-a" in str(error.value) and "missing-b" in str(error.value)
+        assert str(error.value).count("missing-a") == 1
+
+        nodes = docstore.get_nodes(["missing-a", "n1", "n0"], raise_error=False)
+        assert [node.node_id for node in nodes] == ["n1", "n0"]
+        docstore.close()
+
+
+def test_add_documents_reports_progress_per_batch():
+    for num_workers in (0, 2):
+        with tempfile.TemporaryDirectory() as tmp:
+            docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+            progress = []
+            # 生成器输入：按批惰性消费
+            docstore.add_documents(
+                (node for node in _nodes(25)),
+                batch_size=10,
+                num_workers=num_workers,
+                progress_callback=progress.append,
+            )
+
+            assert progress == [10, 20, 25]
+            assert len(docstore.docs) == 25
+            assert docstore.get_node("n24").text == "text n24"
+            docstore.close()
+
+
+def test_add_documents_allow_update():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        docstore.add_documents([TextNode(id_="n0", text="old")])
+
+        docstore.add_documents([TextNode(id_="n0", text="ignored")], allow_update=False)
+        assert docstore.get_node("n0").text == "old"
+
+        docstore.add_documents([TextNode(id_="n0", text="new")], batch_size=1)
+        assert docstore.get_node("n0").text == "new"
+        docstore.close()
+
+
+@pytest.mark.parametrize("name", list(node_codec.FORMAT_IDS))
+def test_node_codec_round_trip(name):
+    if node_codec.FORMAT_IDS[name] == node_codec.FORMAT_MSGPACK_ZLIB and node_codec.msgpack is None:
+        pytest.skip("msgpack not installed")
+    fmt = node_codec.format_id(name)
+    data = TextNode(id_="n0", text="电子发票 invoice", metadata={"file_name": "a.txt", "page": 3}).to_dict()
+    assert node_codec.decode(node_codec.encode(data, fmt), fmt) == data
+
+
+def test_node_codec_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        node_codec.format_id("yaml")
+    with pytest.raises(ValueError):
+        node_codec.decode(b"", 99)
+
+
+def test_upgrade_storage_format_rewrites_old_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False, storage_format="json")
+        docstore.add_documents(_nodes(7))
+
+        assert docstore.upgrade_storage_format("json+zlib", batch_size=3, vacuum=False) == 7
+        assert docstore.storage_format == "json+zlib"
+        formats = docstore._pool.connection().execute("SELECT DISTINCT format FROM documents").fetchall()
+        assert formats == [(node_codec.FORMAT_JSON_ZLIB,)]
+        assert [node.text for node in docstore.get_nodes(["n6", "n0"])] == ["text n6", "text n0"]
+
+        # 已是目标格式的行会被跳过
+        assert docstore.upgrade_storage_format("json+zlib", vacuum=False) == 0
+        docstore.close()
+
+        # 格式记录在库中，重新打开后沿用
+        reopened = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        assert reopened.storage_format == "json+zlib"
+        reopened.close()
+
+
+def test_mapping_view_len_contains_and_iteration():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        docstore.add_documents(_nodes(7))
+        # 小批量分页，覆盖跨页迭代
+        view = SQLiteMappingView(docstore._pool, "documents", "doc_id", "data, format", docstore._load_node, batch_size=3)
+
+        assert len(view) == 7
+        assert "n3" in view and "missing" not in view
+        assert view["n3"].text == "text n3"
+        with pytest.raises(KeyError):
+            view["missing"]
+        assert view.get("missing") is None
+        assert list(view) == [f"n{i}" for i in range(7)]
+        assert [(key, node.node_id) for key, node in view.items()] == [(f"n{i}", f"n{i}") for i in range(7)]
+        assert [node.text for node in view.values()] == [f"text n{i}" for i in range(7)]
+        assert len(docstore.docs) == 7
+        docstore.close()
+
+
+def test_ref_doc_info_view():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        docstore.add_documents(_nodes(2, prefix="a", ref_doc_id="doc-a") + _nodes(1, prefix="b", ref_doc_id="doc-b"))
+
+        infos = docstore.get_all_ref_doc_info()
+        assert len(infos) == 2
+        assert sorted(infos) == ["doc-a", "doc-b"]
+        assert sorted(infos["doc-a"]["node_ids"]) == ["a0", "a1"]
+        docstore.close()
+
+
+def test_cached_nodes_are_isolated_from_caller_mutations():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp))
+        docstore.add_documents([TextNode(id_="n0", text="hello", metadata={"tags": ["a"]})])
+
+        first = docstore.get_node("n0")  # 未命中，写入缓存
+        first.metadata["tags"].append("b")
+        first.metadata["extra"] = 1
+        second = docstore.get_node("n0")  # 命中缓存
+        second.metadata["tags"].append("c")
+
+        assert docstore.get_node("n0").metadata == {"tags": ["a"]}
+        assert docstore.cache_stats()["hits"] >= 2
+        docstore.close()
+
+
+class _FlakyVectorStore:
+    """记录删除调用；fail=True 时模拟向量库删除失败"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.deleted = []
+
+    def delete(self, ref_doc_id: str) -> None:
+        if self.fail:
+            raise ConnectionError("vector store unavailable")
+        self.deleted.append(ref_doc_id)
+
+
+def _fts_row_count(docstore) -> int:
+    conn = docstore._pool.connection()
+    return conn.execute("SELECT COUNT(*) FROM documents_fts").fetchone()[0] + conn.execute(
+        "SELECT COUNT(*) FROM fts_nodes"
+    ).fetchone()[0]
+
+
+def test_delete_ref_doc_cascades_to_nodes_links_and_fts():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp))
+        docstore.add_documents(_nodes(3, prefix="a", ref_doc_id="doc-a") + _nodes(2, prefix="b", ref_doc_id="doc-b"))
+        docstore.get_node("a0")  # 进入缓存
+        assert _fts_row_count(docstore) == 10
+
+        vector_store = _FlakyVectorStore()
+        docstore.delete_ref_doc("doc-a", vector_store=vector_store)
+
+        assert vector_store.deleted == ["doc-a"]
+        assert not docstore.ref_doc_exists("doc-a")
+        assert docstore.get_node("a0", raise_error=False) is None
+        assert sorted(docstore.docs) == ["b0", "b1"]
+        assert _fts_row_count(docstore) == 4
+        assert {node_id for node_id, _ in docstore.search_text("text", top_k=10)} == {"b0", "b1"}
+        conn = docstore._pool.connection()
+        assert conn.execute("SELECT COUNT(*) FROM ref_doc_nodes WHERE ref_doc_id = 'doc-a'").fetchone()[0] == 0
+        assert docstore.delete_pending_vectors(vector_store) == 0
+
+        with pytest.raises(ValueError):
+            docstore.delete_ref_doc("doc-a")
+        docstore.delete_ref_doc("doc-a", raise_error=False)
+        docstore.close()
+
+
+def test_failed_vector_delete_is_retried():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        docstore.add_documents(_nodes(2, prefix="a", ref_doc_id="doc-a"))
+
+        vector_store = _FlakyVectorStore(fail=True)
+        with pytest.raises(ConnectionError):
+            docstore.delete_ref_doc("doc-a", vector_store=vector_store)
+        # SQL 删除已提交，向量删除记为待重试
+        assert not docstore.ref_doc_exists("doc-a")
+        assert len(docstore.docs) == 0
+
+        vector_store.fail = False
+        assert docstore.delete_pending_vectors(vector_store) == 1
+        assert vector_store.deleted == ["doc-a"]
+        assert docstore.delete_pending_vectors(vector_store) == 0
+        docstore.close()
+
+
+def test_add_documents_without_update_keeps_existing_links():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp), use_cache=False)
+        docstore.add_documents(_nodes(2, prefix="a", ref_doc_id="doc-a"))
+
+        # a0 已存在且属于 doc-a：跳过时不应改写其 ref doc 关联和全文索引
+        moved = _nodes(2, prefix="a", ref_doc_id="doc-b")
+        moved[0].text = "replacement"
+        docstore.add_documents(moved + _nodes(1, prefix="c", ref_doc_id="doc-b"), allow_update=False)
+
+        assert sorted(docstore.get_ref_doc_info("doc-a")["node_ids"]) == ["a0", "a1"]
+        assert docstore.get_ref_doc_info("doc-b")["node_ids"] == ["c0"]
+        assert docstore.get_node("a0").text == "text a0"
+        assert docstore.search_text("replacement") == []
+        docstore.close()
+
+
+def test_async_round_trip_runs_on_io_threads():
+    with tempfile.TemporaryDirectory() as tmp:
+        docstore = SQLiteDocumentStore(_db_path(tmp))
+
+        async def scenario():
+            loop_thread = threading.get_ident()
+            await docstore.async_add_documents(_nodes(3, ref_doc_id="doc"))
+            # 并发读取，均在 I/O 线程执行
+            nodes, single, missing, exists = await asyncio.gather(
+                docstore.aget_nodes(["n2", "n0"]),
+                docstore.aget_document("n1"),
+                docstore.aget_document("missing", raise_error=False),
+                docstore.adocument_exists("n1"),
+            )
+            assert [node.node_id for node in nodes] == ["n2", "n0"]
+            assert single.text == "text n1"
+            assert missing is None and exists
+            assert [node_id for node_id, _ in await docstore.asearch_text("n1")] == ["n1"]
+            assert sorted((await docstore.aget_all_ref_doc_info())["doc"]["node_ids"]) == ["n0", "n1", "n2"]
+
+            io_threads = await asyncio.gather(*(run_in_io_thread(threading.get_ident) for _ in range(4)))
+            assert loop_thread not in io_threads
+
+            await docstore.adelete_ref_doc("doc")
+            assert await docstore.aget_nodes(["n0"], raise_error=False) == []
+
+        asyncio.run(scenario())
+        docstore.close()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+工作流复用测试：同一索引的请求共用一个工作流实例，索引重新加载后才重建（不需要 API Key）
+
+运行: uv run python -m pytest -q test_workflow.py
+"""
+import asyncio
+
+import pytest
+
+from app import workflow as app_workflow
+
+
+@pytest.fixture
+def indexes(monkeypatch):
+    """可切换的假索引，记录 build_workflow 的调用次数"""
+    state = {"index": object(), "builds": []}
+
+    def build_workflow(index):
+        state["builds"].append(index)
+        return object()
+
+    async def aget_index(chat_request=None):
+        return state["index"]
+
+    monkeypatch.setattr(app_workflow, "get_index", lambda chat_request=None: state["index"])
+    monkeypatch.setattr(app_workflow, "aget_index", aget_index)
+    monkeypatch.setattr(app_workflow, "build_workflow", build_workflow)
+    monkeypatch.setattr(app_workflow, "_workflow", None)
+    monkeypatch.setattr(app_workflow, "_workflow_index", None)
+    return state
+
+
+def test_workflow_is_reused_until_index_changes(indexes):
+    first = app_workflow.create_workflow()
+    assert app_workflow.create_workflow() is first
+    assert asyncio.run(app_workflow.acreate_workflow()) is first
+    assert indexes["builds"] == [indexes["index"]]
+
+    # 索引重新加载后换成新实例，之后的请求复用新实例
+    indexes["index"] = object()
+    second = asyncio.run(app_workflow.acreate_workflow())
+    assert second is not first
+    assert app_workflow.create_workflow() is second
+    assert len(indexes["builds"]) == 2 and indexes["builds"][-1] is indexes["index"]
+
+
+def test_missing_index_raises(indexes):
+    indexes["index"] = None
+    with pytest.raises(RuntimeError, match="uv run generate"):
+        app_workflow.create_workflow()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+工作流事件转发测试：AgentStream 增量、检索完成即发送引用、非流式结果退回、客户端断开时取消（不需要 API Key）
+
+运行: uv run python -m pytest -q test_workflow_events.py
+"""
+import asyncio
+import json
+
+import pytest
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.agent.workflow import AgentStream, ToolCallResult
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import CompletionResponse, MockLLM
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.tools import ToolOutput
+from llama_index.core.workflow.errors import WorkflowCancelledByUser
+
+from app import streaming
+from app import workflow as app_workflow
+from app.answer_cache import SemanticAnswerCache
+from app.citations import CitationsEvent, CitedAnswer
+from app.streaming import StreamingResponseProcessor
+
+CITATIONS = {"node-a": {"node_id": "node-a", "rank": 1, "filename": "a.txt", "similarity_score": 0.9, "snippet": "甲"}}
+
+
+class FakeHandler:
+    """按顺序产出给定事件的 WorkflowHandler 替身"""
+
+    def __init__(self, events, result=""):
+        self.events = events
+        self.result = result
+        self.cancelled = False
+        self._done = False
+
+    async def stream_events(self):
+        for event in self.events:
+            await asyncio.sleep(0)
+            yield event
+        self._done = True
+
+    def done(self):
+        return self._done
+
+    async def cancel_run(self):
+        self.cancelled = True
+
+    def add_done_callback(self, callback):
+        pass
+
+    def __await__(self):
+        async def result():
+            return self.result
+        return result().__await__()
+
+
+def _agent_stream(delta):
+    return AgentStream(delta=delta, response="", current_agent_name="Agent", tool_calls=[], raw=None)
+
+
+def _tool_result(answer):
+    return ToolCallResult(
+        tool_name="query_index",
+        tool_kwargs={"input": "发票"},
+        tool_id="call-1",
+        tool_output=ToolOutput(content=str(answer), tool_name="query_index", raw_input={}, raw_output=answer),
+        return_direct=False,
+    )
+
+
+def _collect(handler, **kwargs):
+    answers = []
+
+    async def run():
+        processor = StreamingResponseProcessor(**kwargs)
+        return [message async for message in processor.process_workflow_events(handler, on_answer=answers.append)]
+
+    messages = asyncio.run(run())
+    return [(m["event"], json.loads(m["data"])) for m in messages], answers
+
+
+def test_deltas_are_forwarded_and_citations_sent_once():
+    source = NodeWithScore(node=TextNode(id_="node-a", text="甲"), score=0.9)
+    answer = CitedAnswer(text="答案 Source 1:", citations=dict(CITATIONS), source_nodes=[source])
+    handler = FakeHandler([
+        CitationsEvent(citations=dict(CITATIONS)),
+        _tool_result(answer),
+        _agent_stream("发票"),
+        _agent_stream("需要查重"),
+    ])
+    messages, answers = _collect(handler)
+
+    assert [event for event, _ in messages] == ["citation_data", "text_chunk", "text_chunk", "text_chunk", "complete"]
+    assert messages[0][1]["citations"] == CITATIONS
+    assert [data["chunk"] for event, data in messages if event == "text_chunk"] == ["发票", "需要查重", ""]
+    assert messages[-2][1]["is_final"]
+    assert answers[0].text == "发票需要查重" and answers[0].citations == CITATIONS
+    # 缓存的回答带上来源节点，/api/chat 命中时仍有 sources
+    assert answers[0].source_nodes == [source]
+
+
+def test_tool_result_citations_used_without_citations_event():
+    handler = FakeHandler([_tool_result(CitedAnswer(text="答案", citations=dict(CITATIONS))), _agent_stream("答案")])
+    messages, _ = _collect(handler)
+    assert [event for event, _ in messages][:2] == ["citation_data", "text_chunk"]
+
+
+def test_non_streaming_result_falls_back_to_final_text():
+    handler = FakeHandler([CitationsEvent(citations=dict(CITATIONS))], result="最终回答 Source 1:")
+    messages, answers = _collect(handler, annotate_citations=True)
+
+    chunks = [data for event, data in messages if event == "text_chunk"]
+    assert len(chunks) == 1 and chunks[0]["is_final"]
+    assert chunks[0]["chunk"].startswith("最终回答") and "citation-number" in chunks[0]["chunk"]
+    assert answers[0].text == "最终回答 Source 1:"
+
+
+class RecordingContext:
+    """记录工具写入工作流事件流的事件"""
+
+    def __init__(self):
+        self.events = []
+
+    def write_event_to_stream(self, event):
+        self.events.append(event)
+
+
+def _recording_llm(ctx):
+    """合成回答时记录已写入的事件数量的 LLM"""
+
+    class RecordingLLM(MockLLM):
+        async def acomplete(self, prompt, formatted=False, **kwargs):
+            return CompletionResponse(text=f"events={len(ctx.events)}")
+
+    return RecordingLLM()
+
+
+class CountingEmbedding(MockEmbedding):
+    """记录查询嵌入次数"""
+
+    query_calls: int = 0
+
+    def _get_query_embedding(self, query):
+        self.query_calls += 1
+        return super()._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query):
+        self.query_calls += 1
+        return await super()._aget_query_embedding(query)
+
+
+@pytest.fixture
+def embed_model(monkeypatch):
+    embed_model = CountingEmbedding(embed_dim=8)
+    monkeypatch.setattr(Settings, "_embed_model", embed_model)
+    return embed_model
+
+
+def _build_tool(monkeypatch):
+    """在内存向量索引上构建工作流，返回其检索工具和记录事件的上下文"""
+    monkeypatch.setenv("RETRIEVAL_MODE", "vector")
+    ctx = RecordingContext()
+    monkeypatch.setattr(Settings, "_llm", _recording_llm(ctx))
+    nodes = [TextNode(text=f"发票第 {i} 条", metadata={"file_name": f"{i}.txt"}) for i in range(3)]
+    workflow = app_workflow.build_workflow(VectorStoreIndex(nodes))
+    agent = next(iter(workflow.agents.values()))
+    return agent.tools[0], ctx
+
+
+def test_citations_are_written_before_synthesis(monkeypatch, embed_model):
+    monkeypatch.setattr(app_workflow, "get_answer_cache", lambda: None)
+    query_tool, ctx = _build_tool(monkeypatch)
+    output = asyncio.run(query_tool.acall(ctx=ctx, input="发票"))
+    answer = output.raw_output
+
+    assert [type(event) for event in ctx.events] == [CitationsEvent]
+    assert ctx.events[0].citations == answer.citations and len(answer.citations) == 3
+    # 合成回答的 LLM 调用发生时，引用事件已经写入
+    assert answer.text == "events=1"
+
+
+def test_query_is_embedded_once_with_answer_cache(monkeypatch, embed_model):
+    cache = SemanticAnswerCache()
+    monkeypatch.setattr(app_workflow, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(app_workflow, "get_index_version", lambda: "v1")
+    query_tool, ctx = _build_tool(monkeypatch)
+
+    answer = asyncio.run(query_tool.acall(ctx=ctx, input="发票")).raw_output
+    # 查缓存时计算的嵌入直接用于检索，不再嵌入第二次
+    assert embed_model.query_calls == 1
+    assert cache.get(embed_model.get_query_embedding("发票"), "v1") is answer
+
+
+class HangingHandler(FakeHandler):
+    """一直运行直到被取消的工作流"""
+
+    def __init__(self, error=None):
+        super().__init__([])
+        self.error = error
+        self._cancelled = asyncio.Event()
+
+    async def stream_events(self):
+        if self.error is not None:
+            raise self.error
+        await self._cancelled.wait()
+        raise WorkflowCancelledByUser()
+        yield  # 异步生成器
+
+    def done(self):
+        return self._cancelled.is_set()
+
+    async def cancel_run(self):
+        self.cancelled = True
+        self._cancelled.set()
+
+
+class DisconnectingRequest:
+    """第 n 次检查时报告客户端已断开"""
+
+    def __init__(self, after=1):
+        self.after = after
+        self.checks = 0
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.checks >= self.after
+
+
+def _run_events(handler, request):
+    async def run():
+        processor = StreamingResponseProcessor()
+        return [message async for message in processor.process_workflow_events(handler, request)]
+    return asyncio.run(run())
+
+
+def test_disconnect_cancels_workflow(monkeypatch):
+    monkeypatch.setattr(streaming, "DISCONNECT_POLL_INTERVAL", 0.01)
+    before = streaming.stream_stats()
+    handler = HangingHandler()
+
+    messages = _run_events(handler, DisconnectingRequest(after=2))
+    assert handler.cancelled
+    assert messages == []
+    stats = streaming.stream_stats()
+    assert stats["cancelled"] == before["cancelled"] + 1
+    assert stats["completed"] == before["completed"]
+
+
+def test_failure_is_not_counted_as_cancelled(monkeypatch):
+    before = streaming.stream_stats()
+    handler = HangingHandler(error=RuntimeError("LLM 出错"))
+
+    messages = _run_events(handler, DisconnectingRequest(after=1000))
+    assert [message["event"] for message in messages] == ["error"]
+    # 仍在运行的工作流被停止，但不计为客户端取消
+    assert handler.cancelled
+    stats = streaming.stream_stats()
+    assert stats["failed"] == before["failed"] + 1
+    assert stats["cancelled"] == before["cancelled"]
+
+
+def test_cancelled_stream_task_cancels_workflow():
+    before = streaming.stream_stats()
+    handler = HangingHandler()
+
+    async def run():
+        processor = StreamingResponseProcessor()
+        # SSE 任务被取消（客户端断开）时没有 request 可轮询
+        task = asyncio.create_task(anext(processor.process_workflow_events(handler), None))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert handler.cancelled
+    assert streaming.stream_stats()["cancelled"] == before["cancelled"] + 1